@@ -9,6 +9,10 @@ import pyautogui
 from Xlib import display, X
 import subprocess
 
+from calibration import calibrate_insets, gtk_frame_extents, window_class
+from screens import CoordinateSpace
+from vision import ImageProcessor
+
 # ====================================================================
 # AUTO-CLICKER FUNCTION (Linux version)
 # ====================================================================
@@ -83,32 +87,44 @@ class WindowCapture:
         except Exception as e:
             raise Exception("Error getting window geometry: {}".format(e))
 
+        self.window_rect = (self.cropped_x, self.cropped_y, self.w, self.h)
+        # Only the part of the window on its monitor is captured
+        self.space = CoordinateSpace(self.window_rect)
+
+    def apply_insets(self, insets):
+        """Shrink the capture region to the client area inside the given insets"""
+        x, y, w, h = self.window_rect
+        self.cropped_x = x + insets["left"]
+        self.cropped_y = y + insets["top"]
+        self.w = w - insets["left"] - insets["right"]
+        self.h = h - insets["top"] - insets["bottom"]
+        self.space.update((self.cropped_x, self.cropped_y, self.w, self.h))
+
+    def calibrate(self):
+        """Strip title bars/borders drawn inside the window (cached per window class)"""
+        def grab(insets):
+            self.apply_insets(insets)
+            return self.get_screenshot()
+
+        key = window_class(self.window_id) or self.window_id
+        self.apply_insets(calibrate_insets(key, grab, gtk_frame_extents(self.window_id)))
+
     def get_screenshot(self):
-        """Capture window using pure Python/pyautogui approach"""
+        """Capture only the window's client area"""
         try:
-            # Capture the entire screen
-            screenshot = pyautogui.screenshot()
-            img = cv.cvtColor(np.array(screenshot), cv.COLOR_RGB2BGR)
-            
-            # Crop to the window region
-            if (self.cropped_x >= 0 and self.cropped_y >= 0 and 
-                self.cropped_x + self.w <= img.shape[1] and 
-                self.cropped_y + self.h <= img.shape[0]):
-                img = img[self.cropped_y:self.cropped_y + self.h, 
-                         self.cropped_x:self.cropped_x + self.w]
-            else:
-                print(f"Warning: Window coordinates out of bounds. Using full screenshot.")
-                
-            return img
+            screenshot = np.asarray(pyautogui.screenshot(region=self.space.capture))
+            self.space.check_frame(screenshot)
+            return cv.cvtColor(screenshot, cv.COLOR_RGB2BGR)
             
         except Exception as e:
             print(f"Screenshot error: {e}")
             # Fallback: return black image
-            return np.zeros((self.h, self.w, 3), dtype=np.uint8)
+            return np.zeros((self.space.detector_size[1], self.space.detector_size[0], 3), dtype=np.uint8)
 
     def get_screen_position(self, pos):
-        """Translate a pixel position from the client area to absolute screen coordinates."""
-        return (self.cropped_x + pos[0], self.cropped_y + pos[1])
+        """Translate a pixel position from the captured area to absolute screen coordinates."""
+        x, y = self.space.detector_to_root(pos)
+        return (int(x), int(y))
 
     def generate_image_dataset(self):
         if not os.path.exists("images"):
@@ -120,116 +136,7 @@ class WindowCapture:
             sleep(1)
 
     def get_window_size(self):
-        return (self.w, self.h)
-
-
-class ImageProcessor:
-    W = 0
-    H = 0
-    net = None
-    ln = None
-    classes = {}
-    colors = []
-
-    def __init__(self, img_size, cfg_file, weights_file):
-        np.random.seed(42)
-        self.net = cv.dnn.readNetFromDarknet(cfg_file, weights_file)
-        self.net.setPreferableBackend(cv.dnn.DNN_BACKEND_OPENCV)
-        self.ln = self.net.getLayerNames()
-        self.ln = [self.ln[i - 1] for i in self.net.getUnconnectedOutLayers()]
-        self.W = img_size[0]
-        self.H = img_size[1]
-
-        with open("yolov4-tiny/obj.names", "r") as file:
-            lines = file.readlines()
-        for i, line in enumerate(lines):
-            self.classes[i] = line.strip()
-
-        self.colors = [
-            (0, 0, 255),
-            (0, 255, 0),
-            (255, 0, 0),
-            (255, 255, 0),
-            (255, 0, 255),
-            (0, 255, 255),
-        ]
-
-    def proccess_image(self, img):
-        # Resize image to expected size if needed
-        if img.shape[1] != self.W or img.shape[0] != self.H:
-            img = cv.resize(img, (self.W, self.H))
-            
-        blob = cv.dnn.blobFromImage(img, 1 / 255.0, (416, 416), swapRB=True, crop=False)
-        self.net.setInput(blob)
-        outputs = self.net.forward(self.ln)
-        outputs = np.vstack(outputs)
-
-        coordinates = self.get_coordinates(outputs, 0.5)
-
-        self.draw_identified_objects(img, coordinates)
-
-        return coordinates
-
-    def get_coordinates(self, outputs, conf):
-        boxes = []
-        confidences = []
-        classIDs = []
-
-        for output in outputs:
-            scores = output[5:]
-
-            classID = np.argmax(scores)
-            confidence = scores[classID]
-            if confidence > conf:
-                x, y, w, h = output[:4] * np.array([self.W, self.H, self.W, self.H])
-                p0 = int(x - w // 2), int(y - h // 2)
-                boxes.append([*p0, int(w), int(h)])
-                confidences.append(float(confidence))
-                classIDs.append(classID)
-
-        indices = cv.dnn.NMSBoxes(boxes, confidences, conf, conf - 0.1)
-
-        if len(indices) == 0:
-            return []
-
-        coordinates = []
-        for i in indices.flatten():
-            (x, y) = (boxes[i][0], boxes[i][1])
-            (w, h) = (boxes[i][2], boxes[i][3])
-
-            coordinates.append(
-                {
-                    "x": x,
-                    "y": y,
-                    "w": w,
-                    "h": h,
-                    "class": classIDs[i],
-                    "class_name": self.classes[classIDs[i]],
-                }
-            )
-        return coordinates
-
-    def draw_identified_objects(self, img, coordinates):
-        for coordinate in coordinates:
-            x = coordinate["x"]
-            y = coordinate["y"]
-            w = coordinate["w"]
-            h = coordinate["h"]
-            classID = coordinate["class"]
-
-            color = self.colors[classID]
-
-            cv.rectangle(img, (x, y), (x + w, y + h), color, 2)
-            cv.putText(
-                img,
-                self.classes[classID],
-                (x, y - 10),
-                cv.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                color,
-                2,
-            )
-        cv.imshow("window", img)
+        return self.space.detector_size
 
 
 # ====================================================================
@@ -242,7 +149,8 @@ weights_file_name = "yolov4-tiny-custom_last.weights"
 
 try:
     wincap = WindowCapture(window_name)
-    print(f"Window found: {wincap.w}x{wincap.h} at ({wincap.cropped_x}, {wincap.cropped_y})")
+    wincap.calibrate()
+    print(f"Window found: {wincap.w}x{wincap.h} at ({wincap.cropped_x}, {wincap.cropped_y}), {wincap.space.describe()}")
     
     improc = ImageProcessor(wincap.get_window_size(), cfg_file_name, weights_file_name)
 
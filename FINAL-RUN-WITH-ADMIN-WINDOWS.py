@@ -10,6 +10,13 @@ import win32gui
 import win32ui
 from PIL import Image
 
+from calibration import calibrate_insets, windows_client_insets
+from screens import CoordinateSpace, enable_dpi_awareness, windows_monitors
+from vision import ImageProcessor
+
+# Physical pixels for window rects, BitBlt and the cursor, on scaled monitors too
+enable_dpi_awareness()
+
 
 # ====================================================================
 # AUTO-CLICKER FUNCTION
@@ -44,57 +51,80 @@ class WindowCapture:
         if not self.hwnd:
             raise Exception("Window not found: {}".format(window_name))
 
+        self.monitors = windows_monitors()
+        self.space = None
+        self.calibrate()
+
+    def calibrate(self):
+        """Border and title bar sizes from the real client rectangle (they vary
+        with DPI scaling and Windows version), plus any chrome the game draws
+        inside it; measured once per window class and cached"""
+        def grab(insets):
+            self.apply_insets(insets)
+            return self.get_screenshot(raw=True)
+
+        key = win32gui.GetClassName(self.hwnd)
+        self.apply_insets(calibrate_insets(key, grab, windows_client_insets(self.hwnd)))
+
+    def apply_insets(self, insets):
         window_rect = win32gui.GetWindowRect(self.hwnd)
-        self.w = window_rect[2] - window_rect[0]
-        self.h = window_rect[3] - window_rect[1]
-
-        # Calculate border and title bar to get client area coordinates
-        border_pixels = 8
-        titlebar_pixels = 30
-        self.w = self.w - (border_pixels * 2)
-        self.h = self.h - titlebar_pixels - border_pixels
-        self.cropped_x = border_pixels
-        self.cropped_y = titlebar_pixels
-
-    def get_screenshot(self):
+        self.w = window_rect[2] - window_rect[0] - insets["left"] - insets["right"]
+        self.h = window_rect[3] - window_rect[1] - insets["top"] - insets["bottom"]
+        self.cropped_x = insets["left"]
+        self.cropped_y = insets["top"]
+
+        # Only the part of the client area on its monitor is captured
+        client_rect = (window_rect[0] + self.cropped_x, window_rect[1] + self.cropped_y, self.w, self.h)
+        if self.space is None:
+            self.space = CoordinateSpace(client_rect, self.monitors)
+        else:
+            self.space.update(client_rect)
+
+    def get_screenshot(self, raw=False):
+        """Capture the visible client area (raw=True returns the BGRA bitmap without copying)"""
+        w, h = self.space.capture[2:]
         wDC = win32gui.GetWindowDC(self.hwnd)
         dcObj = win32ui.CreateDCFromHandle(wDC)
         cDC = dcObj.CreateCompatibleDC()
         dataBitMap = win32ui.CreateBitmap()
-        dataBitMap.CreateCompatibleBitmap(dcObj, self.w, self.h)
+        dataBitMap.CreateCompatibleBitmap(dcObj, w, h)
         cDC.SelectObject(dataBitMap)
         cDC.BitBlt(
             (0, 0),
-            (self.w, self.h),
+            (w, h),
             dcObj,
-            (self.cropped_x, self.cropped_y),
+            (self.cropped_x + self.space.offset_x, self.cropped_y + self.space.offset_y),
             win32con.SRCCOPY,
         )
 
         signedIntsArray = dataBitMap.GetBitmapBits(True)
         img = np.frombuffer(signedIntsArray, dtype="uint8")
-        img.shape = (self.h, self.w, 4)
+        img.shape = (h, w, 4)
 
         dcObj.DeleteDC()
         cDC.DeleteDC()
         win32gui.ReleaseDC(self.hwnd, wDC)
         win32gui.DeleteObject(dataBitMap.GetHandle())
 
+        if raw:
+            return img
+
         img = img[..., :3]
         img = np.ascontiguousarray(img)
 
         return img
 
     def get_screen_position(self, pos):
-        """Translate a pixel position from the client area (captured area) to
+        """Translate a pixel position from the captured area to
         absolute screen coordinates required for win32api."""
         # Get the screen position of the window's top-left corner
         window_rect = win32gui.GetWindowRect(self.hwnd)
         x_on_screen = window_rect[0] + self.cropped_x
         y_on_screen = window_rect[1] + self.cropped_y
 
-        # Add the relative position (pos) to the screen position
-        return (x_on_screen + pos[0], y_on_screen + pos[1])
+        # Add the position inside the client area to the screen position
+        x, y = self.space.detector_to_window(pos)
+        return (int(x_on_screen + x), int(y_on_screen + y))
 
     def generate_image_dataset(self):
         if not os.path.exists("images"):
@@ -106,113 +136,7 @@ class WindowCapture:
             sleep(1)
 
     def get_window_size(self):
-        return (self.w, self.h)
-
-
-class ImageProcessor:
-    W = 0
-    H = 0
-    net = None
-    ln = None
-    classes = {}
-    colors = []
-
-    def __init__(self, img_size, cfg_file, weights_file):
-        np.random.seed(42)
-        self.net = cv.dnn.readNetFromDarknet(cfg_file, weights_file)
-        self.net.setPreferableBackend(cv.dnn.DNN_BACKEND_OPENCV)
-        self.ln = self.net.getLayerNames()
-        self.ln = [self.ln[i - 1] for i in self.net.getUnconnectedOutLayers()]
-        self.W = img_size[0]
-        self.H = img_size[1]
-
-        with open("yolov4-tiny/obj.names", "r") as file:
-            lines = file.readlines()
-        for i, line in enumerate(lines):
-            self.classes[i] = line.strip()
-
-        # If you plan to utilize more than six classes, please include additional colors in this list.
-        self.colors = [
-            (0, 0, 255),
-            (0, 255, 0),
-            (255, 0, 0),
-            (255, 255, 0),
-            (255, 0, 255),
-            (0, 255, 255),
-        ]
-
-    def proccess_image(self, img):
-        blob = cv.dnn.blobFromImage(img, 1 / 255.0, (416, 416), swapRB=True, crop=False)
-        self.net.setInput(blob)
-        outputs = self.net.forward(self.ln)
-        outputs = np.vstack(outputs)
-
-        coordinates = self.get_coordinates(outputs, 0.5)
-
-        self.draw_identified_objects(img, coordinates)
-
-        return coordinates
-
-    def get_coordinates(self, outputs, conf):
-        boxes = []
-        confidences = []
-        classIDs = []
-
-        for output in outputs:
-            scores = output[5:]
-
-            classID = np.argmax(scores)
-            confidence = scores[classID]
-            if confidence > conf:
-                x, y, w, h = output[:4] * np.array([self.W, self.H, self.W, self.H])
-                p0 = int(x - w // 2), int(y - h // 2)
-                boxes.append([*p0, int(w), int(h)])
-                confidences.append(float(confidence))
-                classIDs.append(classID)
-
-        indices = cv.dnn.NMSBoxes(boxes, confidences, conf, conf - 0.1)
-
-        if len(indices) == 0:
-            return []
-
-        coordinates = []
-        for i in indices.flatten():
-            (x, y) = (boxes[i][0], boxes[i][1])
-            (w, h) = (boxes[i][2], boxes[i][3])
-
-            coordinates.append(
-                {
-                    "x": x,
-                    "y": y,
-                    "w": w,
-                    "h": h,
-                    "class": classIDs[i],
-                    "class_name": self.classes[classIDs[i]],
-                }
-            )
-        return coordinates
-
-    def draw_identified_objects(self, img, coordinates):
-        for coordinate in coordinates:
-            x = coordinate["x"]
-            y = coordinate["y"]
-            w = coordinate["w"]
-            h = coordinate["h"]
-            classID = coordinate["class"]
-
-            color = self.colors[classID]
-
-            cv.rectangle(img, (x, y), (x + w, y + h), color, 2)
-            cv.putText(
-                img,
-                self.classes[classID],
-                (x, y - 10),
-                cv.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                color,
-                2,
-            )
-        cv.imshow("window", img)
+        return self.space.detector_size
 
 
 # ====================================================================
@@ -227,13 +151,13 @@ wincap = WindowCapture(window_name)
 improc = ImageProcessor(wincap.get_window_size(), cfg_file_name, weights_file_name)
 
 while True:
-    ss = wincap.get_screenshot()
+    ss = wincap.get_screenshot(raw=True)
 
     if cv.waitKey(1) == ord("q"):
         cv.destroyAllWindows()
         break
 
-    coordinates = improc.proccess_image(ss)
+    coordinates = improc.proccess_image(ss, "BGRA")
 
     for coordinate in coordinates:
         print(f"Detected: {coordinate}")
@@ -0,0 +1,157 @@
+import argparse
+import glob
+import os
+import re
+
+import numpy as np
+
+CFG_FILES = ("./yolov4-tiny/yolov4-tiny-custom.cfg", "./yolov4-tiny/yolov4-tiny-custom_template.cfg")
+
+
+# ====================================================================
+# LABELS AND CFG
+# ====================================================================
+def load_label_sizes(labels_dir="obj"):
+    """Read every Darknet label (class cx cy w h, normalized) and return the (w, h) pairs"""
+    sizes = []
+    for path in glob.glob(os.path.join(labels_dir, "*.txt")):
+        with open(path, "r") as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) == 5:
+                    sizes.append((float(parts[3]), float(parts[4])))
+    if not sizes:
+        raise Exception(f"No labels found in {labels_dir}/")
+    return np.array(sizes, dtype=np.float64)
+
+
+def read_cfg_value(cfg_content, key):
+    match = re.search(rf"^\s*{key}\s*=\s*(.+)$", cfg_content, re.MULTILINE)
+    return match.group(1).strip() if match else None
+
+
+def read_anchors(cfg_content):
+    values = [int(v) for v in read_cfg_value(cfg_content, "anchors").split(",")]
+    return np.array(values, dtype=np.float64).reshape(-1, 2)
+
+
+def format_anchors(anchors):
+    return ",  ".join(f"{int(round(w))},{int(round(h))}" for w, h in anchors)
+
+
+def write_anchors(cfg_file, anchors, size=None):
+    """Replace the anchors of every [yolo] layer (and optionally the input size) in a cfg"""
+    with open(cfg_file, "r") as file:
+        cfg_content = file.read()
+
+    cfg_content = re.sub(r"^anchors\s*=.*$", f"anchors = {format_anchors(anchors)}",
+                         cfg_content, flags=re.MULTILINE)
+    if size is not None:
+        cfg_content = re.sub(r"^width\s*=.*$", f"width={size[0]}", cfg_content, flags=re.MULTILINE)
+        cfg_content = re.sub(r"^height\s*=.*$", f"height={size[1]}", cfg_content, flags=re.MULTILINE)
+
+    with open(cfg_file, "w") as file:
+        file.write(cfg_content)
+
+
+# ====================================================================
+# K-MEANS (IoU DISTANCE)
+# ====================================================================
+def wh_iou(boxes, anchors):
+    """IoU between (N, 2) box sizes and (K, 2) anchor sizes, both centered at the origin"""
+    inter = np.minimum(boxes[:, None, 0], anchors[None, :, 0]) * np.minimum(boxes[:, None, 1], anchors[None, :, 1])
+    union = (boxes[:, 0] * boxes[:, 1])[:, None] + (anchors[:, 0] * anchors[:, 1])[None, :] - inter
+    return inter / union
+
+
+def kmeans_anchors(boxes, k=6, iterations=300, restarts=10, seed=0):
+    """Fit k anchors with k-means on 1 - IoU; returns anchors sorted by area and their mean IoU"""
+    rng = np.random.default_rng(seed)
+    best_anchors, best_fitness = None, -1.0
+
+    for _ in range(restarts):
+        # k-means++ style seeding: favour boxes that fit the chosen anchors badly
+        anchors = boxes[[rng.integers(len(boxes))]]
+        while len(anchors) < k:
+            distance = 1 - wh_iou(boxes, anchors).max(axis=1)
+            weights = distance ** 2
+            total = weights.sum()
+            pick = rng.choice(len(boxes), p=weights / total) if total > 0 else rng.integers(len(boxes))
+            anchors = np.vstack([anchors, boxes[pick]])
+
+        assignment = None
+        for _ in range(iterations):
+            new_assignment = wh_iou(boxes, anchors).argmax(axis=1)
+            if assignment is not None and np.array_equal(new_assignment, assignment):
+                break
+            assignment = new_assignment
+            for i in range(k):
+                members = boxes[assignment == i]
+                if len(members):
+                    anchors[i] = np.median(members, axis=0)
+
+        fitness = wh_iou(boxes, anchors).max(axis=1).mean()
+        if fitness > best_fitness:
+            best_anchors, best_fitness = anchors.copy(), fitness
+
+    order = np.argsort(best_anchors[:, 0] * best_anchors[:, 1])
+    return best_anchors[order], best_fitness
+
+
+def anchor_fit(boxes, anchors, iou_threshold=0.5):
+    """Mean best-anchor IoU, and best possible recall: the share of boxes
+    whose best anchor overlaps them by more than iou_threshold"""
+    best = wh_iou(boxes, anchors).max(axis=1)
+    return best.mean(), (best > iou_threshold).mean()
+
+
+def suggest_input_size(sizes, min_pixels=16, percentile=5, stride=32):
+    """Smallest input size (multiple of stride) at which the smallest objects
+    (the given percentile of label widths/heights) stay above min_pixels"""
+    small_w = np.percentile(sizes[:, 0], percentile)
+    small_h = np.percentile(sizes[:, 1], percentile)
+    width = int(np.ceil(min_pixels / small_w / stride) * stride)
+    height = int(np.ceil(min_pixels / small_h / stride) * stride)
+    return max(width, stride), max(height, stride)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit YOLO anchors to the labeled dataset and write them into the cfg")
+    parser.add_argument("--labels", default="obj", help="folder with the Darknet .txt labels")
+    parser.add_argument("--cfg", nargs="+", default=list(CFG_FILES))
+    parser.add_argument("--anchors", type=int, default=6)
+    parser.add_argument("--iou-threshold", type=float, default=0.5, help="IoU used for the recall estimate")
+    parser.add_argument("--min-pixels", type=int, default=16, help="smallest acceptable object size in network pixels")
+    parser.add_argument("--write", action="store_true", help="write the anchors into the cfg files")
+    parser.add_argument("--write-size", action="store_true", help="also write the suggested width/height")
+    args = parser.parse_args()
+
+    with open(args.cfg[0], "r") as file:
+        cfg_content = file.read()
+    net_w = int(read_cfg_value(cfg_content, "width"))
+    net_h = int(read_cfg_value(cfg_content, "height"))
+    current = read_anchors(cfg_content)
+
+    sizes = load_label_sizes(args.labels)
+    boxes = sizes * np.array([net_w, net_h])
+    anchors, _ = kmeans_anchors(boxes, args.anchors)
+
+    old_iou, old_recall = anchor_fit(boxes, current, args.iou_threshold)
+    new_iou, new_recall = anchor_fit(boxes, anchors, args.iou_threshold)
+    print(f"{len(boxes)} labeled boxes, network input {net_w}x{net_h}")
+    print(f"Current anchors: {format_anchors(current)}")
+    print(f"    mean IoU {old_iou:.3f} | recall@{args.iou_threshold} {old_recall:.1%}")
+    print(f"Fitted anchors:  {format_anchors(anchors)}")
+    print(f"    mean IoU {new_iou:.3f} | recall@{args.iou_threshold} {new_recall:.1%} "
+          f"({new_recall - old_recall:+.1%})")
+
+    size = suggest_input_size(sizes, args.min_pixels)
+    print(f"Smallest input keeping 95% of objects >= {args.min_pixels}px: {size[0]}x{size[1]}")
+
+    if args.write or args.write_size:
+        if args.write_size and size != (net_w, net_h):
+            # Anchors are in network pixels, so they follow the input size
+            anchors = anchors * np.array([size[0] / net_w, size[1] / net_h])
+        for cfg_file in args.cfg:
+            write_anchors(cfg_file, anchors, size if args.write_size else None)
+            print(f"Updated {cfg_file}")
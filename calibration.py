@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import subprocess
+from time import sleep
+
+import numpy as np
+
+CACHE_FILE = "calibration.json"
+SIDES = ("left", "top", "right", "bottom")
+
+
+def no_insets():
+    return {side: 0 for side in SIDES}
+
+
+def add_insets(a, b):
+    return {side: a[side] + b[side] for side in SIDES}
+
+
+# ====================================================================
+# WINDOW MANAGER HINTS
+# ====================================================================
+def _xprop_cardinals(window_id, prop):
+    try:
+        result = subprocess.run(['xprop', '-id', window_id, prop], capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    match = re.search(r'=\s*([\d,\s]+)$', result.stdout.strip())
+    if result.returncode != 0 or not match:
+        return None
+    return [int(v) for v in match.group(1).split(',')]
+
+
+def frame_extents(window_id):
+    """WM decoration sizes around the client window, from _NET_FRAME_EXTENTS"""
+    values = _xprop_cardinals(window_id, '_NET_FRAME_EXTENTS')
+    if not values or len(values) != 4:
+        return None
+    left, right, top, bottom = values
+    return {"left": left, "top": top, "right": right, "bottom": bottom}
+
+
+def gtk_frame_extents(window_id):
+    """Client-side decorations/shadows drawn *inside* the X window, from _GTK_FRAME_EXTENTS"""
+    values = _xprop_cardinals(window_id, '_GTK_FRAME_EXTENTS')
+    if not values or len(values) != 4:
+        return None
+    left, right, top, bottom = values
+    return {"left": left, "top": top, "right": right, "bottom": bottom}
+
+
+def window_class(window_id):
+    try:
+        result = subprocess.run(['xprop', '-id', window_id, 'WM_CLASS'], capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    names = re.findall(r'"([^"]*)"', result.stdout)
+    return names[-1] if names else None
+
+
+def windows_client_insets(hwnd):
+    """Border and title bar sizes of a Windows window, from its real client rectangle"""
+    import win32gui
+
+    left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+    _, _, client_w, client_h = win32gui.GetClientRect(hwnd)
+    client_x, client_y = win32gui.ClientToScreen(hwnd, (0, 0))
+    return {
+        "left": client_x - left,
+        "top": client_y - top,
+        "right": right - client_x - client_w,
+        "bottom": bottom - client_y - client_h,
+    }
+
+
+# ====================================================================
+# CONTENT BORDER DETECTION
+# ====================================================================
+def _is_chrome(lines, tolerance, coverage):
+    """A row/column (one per frame) is chrome when, in every frame, most of it
+    is a single colour, and it does not change from frame to frame"""
+    lines = lines.astype(np.int16)
+    if np.abs(lines - lines[0]).max() > tolerance:
+        return False
+    median = np.median(lines[0], axis=0)
+    close = (np.abs(lines[0] - median).max(axis=1) <= tolerance).mean()
+    return close >= coverage
+
+
+def _scan(get_line, limit, tolerance, coverage):
+    inset = 0
+    while inset < limit and _is_chrome(get_line(inset), tolerance, coverage):
+        inset += 1
+    return inset
+
+
+def detect_content_insets(frames, max_top=64, max_side=16, tolerance=12, coverage=0.8):
+    """Find title bars and borders drawn inside the captured area.
+
+    Works on several frames of the same window so that game content which
+    happens to be uniform for a moment (a dark loading screen) is not
+    mistaken for chrome. Returns None when the frames are all the same.
+    """
+    stack = np.stack([frame[..., :3] for frame in frames])
+    _, h, w, _ = stack.shape
+    center = stack[:, h // 4:h - h // 4, w // 4:w - w // 4]
+    if not (center != center[0]).any():
+        # Nothing moved (or capture failed): chrome cannot be told apart from content
+        return None
+    return {
+        "top": _scan(lambda i: stack[:, i], min(max_top, h // 4), tolerance, coverage),
+        "bottom": _scan(lambda i: stack[:, h - 1 - i], min(max_side, h // 4), tolerance, coverage),
+        "left": _scan(lambda i: stack[:, :, i], min(max_side, w // 4), tolerance, coverage),
+        "right": _scan(lambda i: stack[:, :, w - 1 - i], min(max_side, w // 4), tolerance, coverage),
+    }
+
+
+# ====================================================================
+# PER-WINDOW-CLASS CACHE
+# ====================================================================
+class ChromeCache:
+    """Calibrated insets per window class, kept in a small JSON file"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self.entries = json.load(file)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, insets):
+        self.entries[key] = insets
+        with open(self.path, "w") as file:
+            json.dump(self.entries, file, indent=2)
+
+
+def calibrate_insets(key, grab, base=None, cache_file=CACHE_FILE, frames=3, refresh=False):
+    """Client-area insets for a window class, from the cache or measured now.
+
+    base - insets already known from the window system (title bar, borders)
+    grab - callable(insets) returning one frame captured inside those insets
+    """
+    cache = ChromeCache(cache_file)
+    insets = None if refresh else cache.get(key)
+    if insets is None:
+        base = base or no_insets()
+        samples = []
+        for _ in range(frames):
+            samples.append(grab(base))
+            sleep(0.2)
+        found = detect_content_insets(samples)
+        if found is None:
+            print(f"Window '{key}' showed no motion, using window system insets only (not cached)")
+            return base
+        insets = add_insets(base, found)
+        cache.set(key, insets)
+        print(f"Calibrated '{key}': {insets}")
+    return insets
@@ -0,0 +1,259 @@
+import random
+import subprocess
+from time import sleep
+
+import cv2 as cv
+import numpy as np
+import psutil
+import pyautogui
+
+from calibration import calibrate_insets, frame_extents, gtk_frame_extents, no_insets, window_class
+from screens import CoordinateSpace
+
+# ====================================================================
+# WINDOW FINDER UTILITIES
+# ====================================================================
+def find_window_by_pid(pid):
+    """Find window by process ID"""
+    try:
+        result = subprocess.run(['wmctrl', '-lp'], capture_output=True, text=True)
+        if result.returncode == 0:
+            lines = result.stdout.strip().split('\n')
+            for line in lines:
+                parts = line.split()
+                if len(parts) >= 5:
+                    window_id, desktop, window_pid, host = parts[0:4]
+                    title = ' '.join(parts[4:])
+                    
+                    if int(window_pid) == pid:
+                        return {
+                            'window_id': window_id,
+                            'pid': pid,
+                            'title': title,
+                            'process_name': psutil.Process(pid).name()
+                        }
+    except:
+        pass
+    return None
+
+def find_window_by_process_name(process_name):
+    """Find windows by process name"""
+    windows = []
+    try:
+        result = subprocess.run(['wmctrl', '-lp'], capture_output=True, text=True)
+        if result.returncode == 0:
+            lines = result.stdout.strip().split('\n')
+            for line in lines:
+                parts = line.split()
+                if len(parts) >= 5:
+                    window_id, desktop, pid, host = parts[0:4]
+                    title = ' '.join(parts[4:])
+                    
+                    try:
+                        process = psutil.Process(int(pid))
+                        proc_name = process.name()
+                        if process_name.lower() in proc_name.lower():
+                            windows.append({
+                                'window_id': window_id,
+                                'pid': pid,
+                                'title': title,
+                                'process_name': proc_name
+                            })
+                    except:
+                        continue
+    except:
+        pass
+    return windows
+
+def find_windows_by_title(title):
+    """Find windows whose title contains the given text"""
+    windows = []
+    try:
+        result = subprocess.run(['wmctrl', '-lp'], capture_output=True, text=True)
+        if result.returncode == 0:
+            lines = result.stdout.strip().split('\n')
+            for line in lines:
+                parts = line.split()
+                if len(parts) >= 5:
+                    window_id, desktop, pid, host = parts[0:4]
+                    window_title = ' '.join(parts[4:])
+
+                    if title.lower() in window_title.lower():
+                        windows.append({
+                            'window_id': window_id,
+                            'pid': pid,
+                            'title': window_title,
+                        })
+    except:
+        pass
+    return windows
+
+def list_all_windows():
+    """List all available windows"""
+    print("Available Windows:")
+    print("-" * 50)
+    try:
+        result = subprocess.run(['wmctrl', '-lp'], capture_output=True, text=True)
+        if result.returncode == 0:
+            lines = result.stdout.strip().split('\n')
+            for line in lines:
+                parts = line.split()
+                if len(parts) >= 5:
+                    window_id, desktop, pid, host = parts[0:4]
+                    title = ' '.join(parts[4:])
+                    
+                    try:
+                        process_name = psutil.Process(int(pid)).name()
+                    except:
+                        process_name = "Unknown"
+                    
+                    print(f"PID: {pid} | Process: {process_name} | Title: {title}")
+    except FileNotFoundError:
+        print("wmctrl not installed. Install with: sudo apt install wmctrl")
+
+# ====================================================================
+# AUTO-CLICKER FUNCTION
+# ====================================================================
+def click_at_coordinate(x, y):
+    """Performs a left mouse click at the specified screen coordinates."""
+    x = int(x)
+    y = int(y)
+    
+    pyautogui.moveTo(x, y)
+    sleep(random.uniform(0.01, 0.05))
+    pyautogui.click(x, y)
+
+# ====================================================================
+# WINDOW CAPTURE (PID-BASED)
+# ====================================================================
+class WindowCapture:
+    def __init__(self, window_name=None, process_name=None, pid=None, window_id=None):
+        self.x = 0
+        self.y = 0
+        self.w = 0
+        self.h = 0
+        self.window_title = ""
+        self.insets = no_insets()
+        
+        # Priority 0: Use an already discovered window ID
+        if window_id:
+            self.window_id = window_id
+            self.window_title = window_name or window_id
+
+        # Priority 1: Use PID if provided
+        elif pid:
+            window_info = find_window_by_pid(pid)
+            if window_info:
+                self.window_title = window_info['title']
+                self.window_id = window_info['window_id']
+                print(f"Found window by PID {pid}: '{self.window_title}'")
+            else:
+                raise Exception(f"No window found for PID: {pid}")
+        
+        # Priority 2: Use process name if provided
+        elif process_name:
+            windows = find_window_by_process_name(process_name)
+            if windows:
+                self.window_title = windows[0]['title']
+                self.window_id = windows[0]['window_id']
+                print(f"Found window by process '{process_name}': '{self.window_title}'")
+            else:
+                raise Exception(f"No window found for process: {process_name}")
+        
+        # Priority 3: Use window title
+        elif window_name:
+            self.window_title = window_name
+            try:
+                result = subprocess.run(['xdotool', 'search', '--name', window_name], 
+                                      capture_output=True, text=True)
+                if result.returncode == 0 and result.stdout.strip():
+                    self.window_id = result.stdout.strip().split('\n')[0]
+                    print(f"Found window by title: '{window_name}'")
+                else:
+                    raise Exception(f"Window not found: {window_name}")
+            except Exception as e:
+                raise Exception(f"Error finding window: {e}")
+        
+        else:
+            raise Exception("No window identifier provided")
+        
+        # Get window geometry
+        self._get_window_geometry()
+
+    def _get_window_geometry(self):
+        """Get window position and size"""
+        try:
+            geom = subprocess.run(['xwininfo', '-id', self.window_id], 
+                                capture_output=True, text=True)
+            if geom.returncode == 0:
+                lines = geom.stdout.split('\n')
+                for line in lines:
+                    if 'Absolute upper-left X:' in line:
+                        self.x = int(line.split(':')[1].strip())
+                    elif 'Absolute upper-left Y:' in line:
+                        self.y = int(line.split(':')[1].strip())
+                    elif 'Width:' in line:
+                        self.w = int(line.split(':')[1].strip())
+                    elif 'Height:' in line:
+                        self.h = int(line.split(':')[1].strip())
+                
+                self.window_rect = (self.x, self.y, self.w, self.h)
+                self.space = CoordinateSpace(self.window_rect)
+                print(f"Window geometry: {self.w}x{self.h} at ({self.x}, {self.y})")
+            else:
+                raise Exception("Failed to get window geometry")
+                
+        except Exception as e:
+            raise Exception(f"Error getting window geometry: {e}")
+
+    def apply_insets(self, insets):
+        """Shrink the capture region to the client area inside the given insets"""
+        x, y, w, h = self.window_rect
+        self.insets = insets
+        self.x = x + insets["left"]
+        self.y = y + insets["top"]
+        self.w = w - insets["left"] - insets["right"]
+        self.h = h - insets["top"] - insets["bottom"]
+        self.space.update((self.x, self.y, self.w, self.h))
+
+    def calibrate(self, cache_file="calibration.json", frames=3, refresh=False):
+        """Find the real client area once per window class and capture only that.
+
+        xwininfo already reports the client window without the WM frame
+        (_NET_FRAME_EXTENTS); what is left is client-side decoration
+        (_GTK_FRAME_EXTENTS) and chrome drawn by the game itself, such as a
+        Wine title bar, which is found from the frame content.
+        """
+        def grab(insets):
+            self.apply_insets(insets)
+            return self.get_screenshot(raw=True)
+
+        key = window_class(self.window_id) or self.window_title
+        insets = calibrate_insets(key, grab, gtk_frame_extents(self.window_id), cache_file, frames, refresh)
+        print(f"WM frame around the client window: {frame_extents(self.window_id)}")
+        self.apply_insets(insets)
+        print(f"Client area: {self.w}x{self.h} at ({self.x}, {self.y}), {self.space.describe()}")
+        return insets
+
+    def get_screenshot(self, raw=False):
+        """Capture the visible part of the game window (raw=True skips the BGR conversion and returns RGB)"""
+        try:
+            screenshot = pyautogui.screenshot(region=self.space.capture)
+            img = np.asarray(screenshot)
+            if self.space.check_frame(img):
+                print(f"Frames arrive at another size than the capture region: {self.space.describe()}")
+            if raw:
+                return img
+            return cv.cvtColor(img, cv.COLOR_RGB2BGR)
+        except Exception as e:
+            print(f"Screenshot error: {e}")
+            return np.zeros((self.space.detector_size[1], self.space.detector_size[0], 3), dtype=np.uint8)
+
+    def get_screen_position(self, pos):
+        """Convert detector coordinates to root window coordinates"""
+        x, y = self.space.detector_to_root(pos)
+        return (int(x), int(y))
+
+    def get_window_size(self):
+        """Size of the captured frames (the window clipped to its monitor, in frame pixels)"""
+        return self.space.detector_size
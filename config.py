@@ -0,0 +1,413 @@
+import argparse
+import copy
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+CONFIG_FILE = "petstar.toml"
+
+# ====================================================================
+# SCHEMA
+# ====================================================================
+# section -> key -> (type, default, description); "size" is [w, h], "rect" is
+# [x, y, w, h] as fractions of the window, "cpus" is a list of CPU numbers
+SCHEMA = {
+    "window": {
+        "pid": (int, None, "game process ID (tried first)"),
+        "process_name": (str, "PetStarClient.exe", "process name to look for next"),
+        "title": (str, "PetStar", "window title to fall back to"),
+        "calibrate": (bool, True, "measure title bar/borders instead of capturing them"),
+    },
+    "capture": {
+        "backend": (str, "pyautogui", "how frames are grabbed"),
+        "fps": (float, 2.0, "frames processed per second"),
+        "stream_fps": (float, 30.0, "frames grabbed per second by the ffmpeg backend"),
+        "ffmpeg": (str, "ffmpeg", "ffmpeg binary for the ffmpeg backend"),
+        "roi": ("rect", None, "part of the window to search, fractions [x, y, w, h]"),
+    },
+    "model": {
+        "cfg": (str, "./yolov4-tiny/yolov4-tiny-custom.cfg", "Darknet cfg"),
+        "weights": (str, "yolov4-tiny-custom_last.weights", "Darknet weights (none: templates only)"),
+        "names": (str, None, "class names (default: obj.names next to the cfg)"),
+        "backend": (str, "opencv", "OpenCV DNN backend"),
+        "target": (str, "cpu", "OpenCV DNN target"),
+        "input_size": ("size", [416, 416], "network input, multiples of 32"),
+        "letterbox": (bool, False, "keep the aspect ratio when resizing"),
+        "tile_size": (int, None, "tiled inference tile edge in window pixels"),
+        "tile_overlap": (int, 64, "tile overlap in pixels"),
+        "templates": (str, None, "folder of UI widget templates to match too"),
+    },
+    "detect": {
+        "score_threshold": (float, 0.5, "minimum class score"),
+        "iou_threshold": (float, 0.4, "NMS overlap threshold"),
+        "per_class": (bool, True, "only suppress boxes of the same class"),
+        "nms": (str, "greedy", "greedy, diou or soft"),
+    },
+    "cache": {
+        "enabled": (bool, False, "reuse detections for non-gameplay screens seen recently (needs scene.enabled)"),
+        "entries": (int, 256, "screens kept in memory"),
+        "ttl": (float, 5.0, "seconds a cached result stays valid"),
+        "max_distance": (int, 0, "hash bits two frames may differ by and still match (0: exact only)"),
+        "disk": (str, None, "SQLite file keeping results across restarts"),
+    },
+    "scene": {
+        "enabled": (bool, False, "classify each frame first and skip detectors the scene cannot need"),
+        "model": (str, "scenes.npz", "classifier from scenegate.py train"),
+        "policy": ("policy", {}, "scene -> detect, ui or skip, on top of the built-in policy"),
+        "pause_clicking": ("labels", [], "scenes in which the bot does not click"),
+    },
+    "log": {
+        "enabled": (bool, False, "record detections and clicks as Parquet for sessionlog.py"),
+        "dir": (str, "logs", "where the Parquet files go"),
+        "flush_interval": (float, 5.0, "seconds between background writes"),
+    },
+    "resources": {
+        "threads": (int, None, "OpenCV/BLAS threads"),
+        "cpus": ("cpus", None, "CPUs to pin the bot to"),
+        "nice": (int, None, "process niceness"),
+    },
+    "bot": {
+        "click": (bool, True, "click detected objects"),
+        "show": (bool, True, "preview window with the detections"),
+    },
+    "profiler": {
+        "signal": (bool, True, "kill -USR2 <pid> starts/stops profiling"),
+        "socket": (str, None, "control socket for profiler.py start/stop/status"),
+        "frames": (int, 300, "frames profiled per signal toggle"),
+        "interval": (float, 0.005, "seconds between stack samples"),
+        "output": (str, "profiles", "folder for flame graph stacks and summaries"),
+    },
+}
+CHOICES = {
+    ("capture", "backend"): ("pyautogui", "ffmpeg"),
+    ("model", "backend"): ("opencv", "cuda", "openvino", "vulkan"),
+    ("model", "target"): ("cpu", "opencl", "opencl_fp16", "cuda", "cuda_fp16", "vulkan"),
+    ("detect", "nms"): ("greedy", "diou", "soft"),
+}
+
+# Built-in presets; a config file may add or extend them under [profiles.<name>]
+PROFILES = {
+    "default": {},
+    "low-cpu": {
+        "capture": {"fps": 1.0},
+        "model": {"input_size": [320, 320]},
+        "resources": {"threads": 1, "nice": 10},
+        "bot": {"show": False},
+    },
+    "accuracy": {
+        "model": {"input_size": [608, 608]},
+        "detect": {"score_threshold": 0.35, "nms": "diou"},
+    },
+    "large-window": {
+        "model": {"tile_size": 640, "tile_overlap": 64},
+    },
+    "headless": {
+        "bot": {"show": False},
+    },
+}
+
+
+def defaults():
+    return {section: {key: copy.deepcopy(spec[1]) for key, spec in keys.items()} for section, keys in SCHEMA.items()}
+
+
+def coerce(section, key, value):
+    """Check and convert one value against the schema"""
+    if section not in SCHEMA or key not in SCHEMA[section]:
+        raise Exception(f"Unknown config setting: {section}.{key}")
+    kind = SCHEMA[section][key][0]
+    name = f"{section}.{key}"
+    if value is None:
+        return None
+
+    if kind is bool:
+        if not isinstance(value, bool):
+            raise Exception(f"{name} must be true or false, got {value!r}")
+    elif kind is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise Exception(f"{name} must be a number, got {value!r}")
+        value = float(value)
+    elif kind is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise Exception(f"{name} must be an integer, got {value!r}")
+    elif kind is str:
+        if not isinstance(value, str):
+            raise Exception(f"{name} must be a string, got {value!r}")
+    elif kind == "size":
+        if not (isinstance(value, list) and len(value) == 2 and all(isinstance(v, int) and v > 0 for v in value)):
+            raise Exception(f"{name} must be [width, height], got {value!r}")
+    elif kind == "rect":
+        if not (isinstance(value, list) and len(value) == 4 and all(isinstance(v, (int, float)) for v in value)
+                and all(0 <= v <= 1 for v in value)):
+            raise Exception(f"{name} must be [x, y, w, h] fractions between 0 and 1, got {value!r}")
+        value = [float(v) for v in value]
+    elif kind == "policy":
+        if not (isinstance(value, dict) and all(v in ("detect", "ui", "skip") for v in value.values())):
+            raise Exception(f"{name} must map scene names to detect, ui or skip, got {value!r}")
+    elif kind == "labels":
+        if not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise Exception(f"{name} must be a list of scene names, got {value!r}")
+    elif kind == "cpus":
+        if not (isinstance(value, list) and all(isinstance(v, int) and v >= 0 for v in value)):
+            raise Exception(f"{name} must be a list of CPU numbers, got {value!r}")
+
+    choices = CHOICES.get((section, key))
+    if choices and value not in choices:
+        raise Exception(f"{name} must be one of {', '.join(choices)}, got {value!r}")
+    return value
+
+
+def merge(config, overrides, source):
+    for section, values in overrides.items():
+        if not isinstance(values, dict):
+            raise Exception(f"{source}: [{section}] must be a table")
+        for key, value in values.items():
+            try:
+                config[section][key] = coerce(section, key, value)
+            except Exception as e:
+                raise Exception(f"{source}: {e}")
+
+
+# ====================================================================
+# LOADING
+# ====================================================================
+def read_file(path):
+    """TOML, or YAML when PyYAML is installed"""
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise Exception("Reading YAML configs needs PyYAML (pip install pyyaml), or use TOML")
+        with open(path, "r") as file:
+            return yaml.safe_load(file) or {}
+    with open(path, "rb") as file:
+        return tomllib.load(file)
+
+
+def parse_override(item):
+    """section.key=value, with the value written as in TOML (strings may be bare)"""
+    if "=" not in item or "." not in item.split("=", 1)[0]:
+        raise Exception(f"Override must look like section.key=value, got {item!r}")
+    name, raw = item.split("=", 1)
+    section, key = name.strip().split(".", 1)
+    if raw.strip().lower() in ("none", "null"):
+        return section, key, None
+    try:
+        value = tomllib.loads(f"value = {raw}")["value"]
+    except tomllib.TOMLDecodeError:
+        value = raw
+    return section, key, value
+
+
+def load_config(path=None, profiles=(), overrides=()):
+    """Defaults <- config file <- profiles (in order) <- section.key=value overrides"""
+    config = defaults()
+    data = {}
+    if path is None and os.path.exists(CONFIG_FILE):
+        path = CONFIG_FILE
+    if path is not None:
+        data = read_file(path)
+
+    file_profiles = data.pop("profiles", {})
+    merge(config, data, path)
+    for name in profiles:
+        if name not in PROFILES and name not in file_profiles:
+            available = sorted(set(PROFILES) | set(file_profiles))
+            raise Exception(f"Unknown profile: {name} (available: {', '.join(available)})")
+        merge(config, PROFILES.get(name, {}), f"profile {name}")
+        merge(config, file_profiles.get(name, {}), f"profile {name}")
+    for item in overrides:
+        section, key, value = parse_override(item)
+        config[section][key] = coerce(section, key, value)
+    return config
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--config", help=f"TOML or YAML config (default: {CONFIG_FILE} if present)")
+    parser.add_argument("--profile", action="append", default=[],
+                        help=f"preset to apply, repeatable (built in: {', '.join(PROFILES)})")
+    parser.add_argument("--set", action="append", default=[], metavar="SECTION.KEY=VALUE",
+                        help="override one setting, e.g. --set detect.score_threshold=0.4")
+    parser.add_argument("--dry-run", action="store_true", help="validate the model and window, then exit")
+    parser.add_argument("--print-config", action="store_true", help="print the resolved config and exit")
+
+
+def config_from_args(args):
+    return load_config(args.config, args.profile, args.set)
+
+
+def format_config(config):
+    lines = []
+    for section, values in config.items():
+        lines.append(f"[{section}]")
+        for key, value in values.items():
+            lines.append(f"{key} = {value!r}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+# ====================================================================
+# BUILDING THE BOT FROM A CONFIG
+# ====================================================================
+def build_detector(config, img_size):
+    from decode import Decoder
+    from vision import ImageProcessor
+
+    model, detect = config["model"], config["detect"]
+    decoder = Decoder(detect["score_threshold"], detect["iou_threshold"], detect["per_class"], method=detect["nms"])
+    templates = None
+    if model["templates"]:
+        from templates import TemplateDetector
+        templates = TemplateDetector(model["templates"])
+    improc = ImageProcessor(
+        img_size, model["cfg"], model["weights"], show=config["bot"]["show"], letterbox=model["letterbox"],
+        decoder=decoder, templates=templates, tile_size=model["tile_size"], tile_overlap=model["tile_overlap"],
+        input_size=model["input_size"], names_file=model["names"], backend=model["backend"],
+        target=model["target"], roi=config["capture"]["roi"],
+    )
+
+    cache = config["cache"]
+    if cache["enabled"]:
+        if not config["scene"]["enabled"]:
+            raise Exception("cache.enabled needs scene.enabled: only frames the scene classifier places outside "
+                            "gameplay are cached")
+        from framecache import CachedImageProcessor, DetectionCache, model_namespace
+        namespace = model_namespace(model["cfg"], model["weights"], model["input_size"], config["capture"]["roi"])
+        improc = CachedImageProcessor(improc, DetectionCache(cache["entries"], cache["ttl"], cache["max_distance"],
+                                                             disk_path=cache["disk"], namespace=namespace))
+
+    scene = config["scene"]
+    if scene["enabled"]:
+        from scenegate import SceneClassifier, SceneGate
+        improc = SceneGate(improc, SceneClassifier.load(scene["model"]), scene["policy"])
+    return improc
+
+
+def find_window(config):
+    """PID first, then process name, then title, as the run scripts always did"""
+    from capture import WindowCapture
+
+    window = config["window"]
+    attempts = [("PID", {"pid": window["pid"]}),
+                ("process name", {"process_name": window["process_name"]}),
+                ("window title", {"window_name": window["title"]})]
+    for label, kwargs in attempts:
+        if not any(kwargs.values()):
+            continue
+        try:
+            print(f"Trying {label} detection...")
+            return WindowCapture(**kwargs)
+        except Exception as e:
+            print(f"{label} method failed: {e}")
+    raise Exception("Could not find game window using any method")
+
+
+def open_capture(config):
+    """Found, calibrated window; with the ffmpeg backend wrapped in a running stream"""
+    wincap = find_window(config)
+    # Capture only the client area (title bar/borders found once and cached per window class)
+    if config["window"]["calibrate"]:
+        wincap.calibrate()
+    else:
+        # Settles the frame size (HiDPI screenshots) before the detector is sized from it
+        wincap.get_screenshot(raw=True)
+    if config["capture"]["backend"] == "ffmpeg":
+        from streamcapture import StreamCapture
+        wincap = StreamCapture(wincap, config["capture"]["stream_fps"], ffmpeg=config["capture"]["ffmpeg"])
+        wincap.start()
+    return wincap
+
+
+def apply_resources(config):
+    from resources import ResourceConfig
+
+    resources = config["resources"]
+    ResourceConfig(threads=resources["threads"], cpus=resources["cpus"], nice=resources["nice"]).apply()
+
+
+def build_logger(config, wincap):
+    """SessionLogger for the window, or None when logging is off"""
+    settings = config["log"]
+    if not settings["enabled"]:
+        return None
+    from sessionlog import SessionLogger
+    return SessionLogger(settings["dir"], wincap.window_id, flush_interval=settings["flush_interval"])
+
+
+def build_profiler(config):
+    """Profiler wired to SIGUSR2 and/or a control socket, idle until switched on"""
+    from profiler import Profiler
+
+    settings = config["profiler"]
+    profiler = Profiler(settings["interval"], settings["output"])
+    if settings["signal"]:
+        profiler.install_signal(frames=settings["frames"])
+    if settings["socket"]:
+        profiler.serve(settings["socket"])
+    return profiler
+
+
+def dry_run(config):
+    """Check everything the loop needs without clicking anything; returns True when all is well"""
+    import cv2 as cv
+    import numpy as np
+    from vision import default_names_file
+
+    model = config["model"]
+    ok = True
+
+    def check(passed, message):
+        nonlocal ok
+        print(f"[{'ok' if passed else 'FAIL'}] {message}")
+        ok = ok and passed
+
+    names = model["names"] or (default_names_file(model["cfg"]) if model["weights"] else None)
+    for label, path in (("cfg", model["cfg"]), ("weights", model["weights"]), ("names", names)):
+        if path is not None:
+            check(os.path.isfile(path), f"{label}: {path}")
+    if model["weights"] is None:
+        check(bool(model["templates"]), "templates are set (no weights: templates only)")
+    if model["templates"]:
+        check(os.path.isdir(model["templates"]), f"templates: {model['templates']}")
+    if config["scene"]["enabled"]:
+        check(os.path.isfile(config["scene"]["model"]), f"scene classifier: {config['scene']['model']}")
+    check(model["input_size"][0] % 32 == 0 and model["input_size"][1] % 32 == 0,
+          f"input size {model['input_size'][0]}x{model['input_size'][1]} is a multiple of 32")
+    if model["tile_size"]:
+        check(0 <= model["tile_overlap"] < model["tile_size"], "tile overlap is smaller than the tile size")
+
+    if ok:
+        try:
+            improc = build_detector(dict(config, bot=dict(config["bot"], show=False)), tuple(model["input_size"]))
+            img = cv.imread("screenshot.png") if os.path.exists("screenshot.png") else None
+            if img is None:
+                img = np.random.default_rng(0).integers(0, 255, (*model["input_size"][::-1], 3), dtype=np.uint8)
+            improc.proccess_image(img)
+            check(True, f"model loads and runs ({len(improc.classes)} classes, backend {model['backend']}/{model['target']})")
+        except Exception as e:
+            check(False, f"model: {e}")
+
+    try:
+        wincap = open_capture(config)
+        w, h = wincap.get_window_size()
+        frame = wincap.get_screenshot(raw=True)
+        check(frame.any(), f"window '{wincap.window_title}' captured at {w}x{h} ({config['capture']['backend']})")
+        if config["capture"]["backend"] == "ffmpeg":
+            wincap.close()
+    except Exception as e:
+        check(False, f"window: {e}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or validate a PetStar bot config")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    print(format_config(config))
+    if args.dry_run:
+        raise SystemExit(0 if dry_run(config) else 1)
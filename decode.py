@@ -0,0 +1,244 @@
+import argparse
+import glob
+import time
+
+import cv2 as cv
+import numpy as np
+
+NMS_METHODS = ("greedy", "diou", "soft")
+
+
+# ====================================================================
+# BOX HELPERS
+# ====================================================================
+def pairwise_iou(box, boxes):
+    """IoU of one (x1, y1, x2, y2) box against an (N, 4) array of boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def pairwise_diou(box, boxes):
+    """Distance-IoU: IoU minus the normalized distance between box centers"""
+    iou = pairwise_iou(box, boxes)
+    center_dist = ((box[0] + box[2]) - (boxes[:, 0] + boxes[:, 2])) ** 2 / 4 \
+        + ((box[1] + box[3]) - (boxes[:, 1] + boxes[:, 3])) ** 2 / 4
+    enclose_w = np.maximum(box[2], boxes[:, 2]) - np.minimum(box[0], boxes[:, 0])
+    enclose_h = np.maximum(box[3], boxes[:, 3]) - np.minimum(box[1], boxes[:, 1])
+    return iou - center_dist / np.maximum(enclose_w ** 2 + enclose_h ** 2, 1e-9)
+
+
+# ====================================================================
+# NMS
+# ====================================================================
+def greedy_nms(boxes, scores, iou_threshold, overlap=pairwise_iou):
+    """Classic greedy NMS over (x1, y1, x2, y2) boxes; returns kept indices by score"""
+    order = np.argsort(scores)[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        order = rest[overlap(boxes[i], boxes[rest]) <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def soft_nms(boxes, scores, score_threshold, sigma=0.5):
+    """Gaussian soft-NMS: overlapping boxes have their score decayed instead of
+    being dropped, and are only removed once they fall below score_threshold"""
+    scores = scores.astype(np.float32).copy()
+    remaining = np.arange(len(scores))
+    keep = []
+    while remaining.size > 0:
+        best = np.argmax(scores[remaining])
+        i = remaining[best]
+        keep.append(i)
+        remaining = np.delete(remaining, best)
+        if remaining.size == 0:
+            break
+        iou = pairwise_iou(boxes[i], boxes[remaining])
+        scores[remaining] *= np.exp(-(iou ** 2) / sigma)
+        remaining = remaining[scores[remaining] > score_threshold]
+    return np.array(keep, dtype=np.int64), scores
+
+
+# ====================================================================
+# DECODER
+# ====================================================================
+class Decoder:
+    """Vectorized decode of YOLO outputs into the bot's coordinate dicts.
+
+    score_threshold - minimum class score (the old `conf`)
+    iou_threshold   - overlap above which a box is suppressed (the old `conf - 0.1`)
+    per_class       - only suppress boxes of the same class
+    top_k           - keep at most this many candidates before NMS (0 disables)
+    method          - "greedy", "diou" (DIoU-NMS) or "soft" (Gaussian soft-NMS)
+    """
+
+    def __init__(self, score_threshold=0.5, iou_threshold=0.4, per_class=True, top_k=200,
+                 method="greedy", sigma=0.5, max_detections=100):
+        if method not in NMS_METHODS:
+            raise Exception(f"Unknown NMS method: {method} (choose from {', '.join(NMS_METHODS)})")
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
+        self.per_class = per_class
+        self.top_k = top_k
+        self.method = method
+        self.sigma = sigma
+        self.max_detections = max_detections
+
+    def candidates(self, outputs, scale, offset):
+        """Score filter + top-K, returning corner boxes in pixels, scores and class IDs"""
+        class_scores = outputs[:, 5:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = np.take_along_axis(class_scores, class_ids[:, None], axis=1)[:, 0]
+
+        mask = scores > self.score_threshold
+        rows = outputs[mask]
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        if self.top_k and len(scores) > self.top_k:
+            top = np.argpartition(scores, -self.top_k)[-self.top_k:]
+            rows, scores, class_ids = rows[top], scores[top], class_ids[top]
+
+        xywh = rows[:, :4] * scale + offset
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+        return boxes, scores, class_ids
+
+    def suppress(self, boxes, scores, class_ids):
+        if len(scores) == 0:
+            return np.zeros(0, dtype=np.int64), scores
+
+        nms_boxes = boxes
+        if self.per_class:
+            # Shift each class into its own region so boxes of different classes never overlap
+            shift = (boxes.max() - boxes.min() + 1) * class_ids.astype(boxes.dtype)
+            nms_boxes = boxes + shift[:, None]
+
+        if self.method == "soft":
+            keep, scores = soft_nms(nms_boxes, scores, self.score_threshold, self.sigma)
+        elif self.method == "diou":
+            keep = greedy_nms(nms_boxes, scores, self.iou_threshold, pairwise_diou)
+        else:
+            keep = greedy_nms(nms_boxes, scores, self.iou_threshold)
+        return keep[:self.max_detections], scores
+
+    def __call__(self, outputs, scale, offset, classes):
+        return self.finish(*self.candidates(outputs, scale, offset), classes)
+
+    def finish(self, boxes, scores, class_ids, classes):
+        """NMS over pixel boxes (possibly gathered from several tiles) and conversion to dicts"""
+        keep, scores = self.suppress(boxes, scores, class_ids)
+
+        coordinates = []
+        for i in keep:
+            x1, y1, x2, y2 = boxes[i]
+            w, h = x2 - x1, y2 - y1
+            class_id = int(class_ids[i])
+            # Same rounding as the original get_coordinates, so click targets do not shift
+            coordinates.append({
+                "x": int(x1 + w / 2 - w // 2), "y": int(y1 + h / 2 - h // 2), "w": int(w), "h": int(h),
+                "class": class_id,
+                "class_name": classes[class_id],
+                "confidence": float(scores[i]),
+            })
+        return coordinates
+
+
+# ====================================================================
+# RECORDING AND BENCHMARK
+# ====================================================================
+def legacy_decode(outputs, conf, W, H):
+    """The original ImageProcessor.get_coordinates loop, kept as the benchmark baseline"""
+    boxes, confidences, classIDs = [], [], []
+    for output in outputs:
+        scores = output[5:]
+        classID = np.argmax(scores)
+        confidence = scores[classID]
+        if confidence > conf:
+            x, y, w, h = output[:4] * np.array([W, H, W, H])
+            p0 = int(x - w//2), int(y - h//2)
+            boxes.append([*p0, int(w), int(h)])
+            confidences.append(float(confidence))
+            classIDs.append(classID)
+    indices = cv.dnn.NMSBoxes(boxes, confidences, conf, conf-0.1)
+    return [boxes[i] for i in np.array(indices).flatten()]
+
+
+def record_outputs(cfg_file, weights_file, image_paths, out_file):
+    """Run dataset images through the network and save the raw stacked outputs"""
+    from vision import ImageProcessor
+
+    improc = ImageProcessor((416, 416), cfg_file, weights_file, show=False)
+    recorded = {}
+    for path in image_paths:
+        img = cv.imread(path)
+        if img is None:
+            continue
+        improc.net.setInput(improc.preprocess(img))
+        recorded[path] = np.vstack(improc.net.forward(improc.ln))
+    np.savez_compressed(out_file, **{f"frame_{i}": out for i, out in enumerate(recorded.values())})
+    print(f"Recorded {len(recorded)} frames to {out_file}")
+
+
+def benchmark(recorded_file, score_threshold=0.5, iou_threshold=0.4, size=(416, 416), repeat=20):
+    data = np.load(recorded_file)
+    frames = [data[key] for key in data.files]
+    W, H = size
+    scale, offset = np.array([W, H, W, H], dtype=np.float32), 0
+    classes = {i: str(i) for i in range(frames[0].shape[1] - 5)}
+
+    variants = [("legacy NMSBoxes", None)]
+    for per_class in (False, True):
+        for method in NMS_METHODS:
+            label = f"{method} {'per-class' if per_class else 'agnostic'}"
+            variants.append((label, Decoder(score_threshold, iou_threshold, per_class, method=method)))
+
+    print(f"{len(frames)} recorded frames, {len(frames[0])} candidate rows per frame")
+    for label, decoder in variants:
+        detections = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for outputs in frames:
+                if decoder is None:
+                    result = legacy_decode(outputs, score_threshold, W, H)
+                else:
+                    result = decoder(outputs, scale, offset, classes)
+                detections += len(result)
+        elapsed = (time.perf_counter() - start) / (repeat * len(frames))
+        print(f"{label:<22} {elapsed * 1000:7.3f} ms/frame | {detections / repeat / len(frames):5.2f} detections/frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record YOLO outputs and benchmark decode/NMS variants")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record")
+    record.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    record.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    record.add_argument("--images", default="images/*.jp*g", help="glob of frames to record")
+    record.add_argument("--out", default="recorded_outputs.npz")
+
+    bench = sub.add_parser("bench")
+    bench.add_argument("recorded", nargs="?", default="recorded_outputs.npz")
+    bench.add_argument("--score", type=float, default=0.5)
+    bench.add_argument("--iou", type=float, default=0.4)
+    bench.add_argument("--repeat", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_outputs(args.cfg, args.weights, sorted(glob.glob(args.images)), args.out)
+    else:
+        benchmark(args.recorded, args.score, args.iou, repeat=args.repeat)
@@ -0,0 +1,350 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2 as cv
+import numpy as np
+
+from framering import attach_shared_memory
+from resources import ResourceConfig, parse_cpu_list
+from vision import BGR_CONVERSIONS, ImageProcessor
+
+SOCKET_PATH = "/tmp/petstar-detector.sock"
+
+
+class DetectorBusy(Exception):
+    pass
+
+
+# ====================================================================
+# DETECTOR DAEMON (SERVER)
+# ====================================================================
+class _Request:
+    def __init__(self, img, channel_order):
+        self.img = img
+        self.channel_order = channel_order
+        self.coordinates = None
+        self.error = None
+        self.abandoned = False
+        self.done = threading.Event()
+
+
+class _ClientHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.detector
+        segments = {}
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if message.get("cmd") == "stats":
+                    reply = daemon.get_stats()
+                else:
+                    reply = self.detect(daemon, segments, message)
+                reply["id"] = message.get("id")
+                self.wfile.write((json.dumps(reply) + "\n").encode())
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            for shm in segments.values():
+                shm.close()
+
+    def detect(self, daemon, segments, message):
+        name = message["shm"]
+        if name not in segments:
+            # A new segment means the client outgrew the old one and unlinked it
+            for shm in segments.values():
+                shm.close()
+            segments.clear()
+            segments[name] = attach_shared_memory(name)
+        shape = tuple(message["shape"])
+        img = np.ndarray(shape, dtype=np.uint8, buffer=segments[name].buf)
+
+        request = _Request(img, message.get("channel_order", "BGR"))
+        try:
+            daemon.requests.put_nowait(request)
+        except queue.Full:
+            daemon.rejected += 1
+            return {"error": "busy", "retry_after": daemon.max_wait * 2}
+
+        if not request.done.wait(daemon.timeout):
+            # The batch worker skips it if it has not got to it yet
+            request.abandoned = True
+            daemon.timeouts += 1
+            return {"error": "timeout"}
+        if request.error:
+            return {"error": request.error}
+        return {"coordinates": request.coordinates}
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DetectorDaemon:
+    """Loads the network once and serves detections to many local bot processes.
+
+    Frames are passed through shared memory; the socket only carries small
+    JSON messages. Requests from all clients are collected into batches of
+    up to max_batch frames, waiting at most max_wait seconds for a batch to
+    fill. When more than max_pending frames are queued, new frames are
+    rejected with a "busy" reply instead of growing the queue. A frame that
+    is not served within `timeout` seconds (default: 1000 x max_wait, at
+    least 5 s) gets a "timeout" reply, so a stuck batch cannot hang the
+    bots forever.
+    """
+
+    def __init__(self, improc, socket_path=SOCKET_PATH, max_batch=8, max_wait=0.005, max_pending=32, timeout=None):
+        self.improc = improc
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout or max(5.0, 1000 * max_wait)
+        self.requests = queue.Queue(maxsize=max_pending)
+        self.running = False
+        self.server = None
+
+        self.frames = 0
+        self.batches = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.started = time.time()
+
+    def get_stats(self):
+        uptime = time.time() - self.started
+        return {
+            "frames": self.frames,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "pending": self.requests.qsize(),
+            "avg_batch": self.frames / self.batches if self.batches else 0.0,
+            "fps": self.frames / uptime if uptime > 0 else 0.0,
+        }
+
+    def collect_batch(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_batches(self):
+        while self.running:
+            batch = [request for request in self.collect_batch() if not request.abandoned]
+            if not batch:
+                continue
+
+            imgs = []
+            for request in batch:
+                img = request.img
+                # blobFromImages swaps channels for the whole batch, so bring every frame to BGR
+                if request.channel_order in BGR_CONVERSIONS:
+                    img = cv.cvtColor(img, BGR_CONVERSIONS[request.channel_order])
+                imgs.append(img)
+
+            try:
+                results = self.improc.proccess_images(imgs)
+                for request, coordinates in zip(batch, results):
+                    request.coordinates = coordinates
+            except Exception as e:
+                for request in batch:
+                    request.error = str(e)
+
+            self.frames += len(batch)
+            self.batches += 1
+            for request in batch:
+                # Drop the shared memory view before waking the client
+                request.img = None
+                request.done.set()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = self.server = _UnixServer(self.socket_path, _ClientHandler)
+        server.detector = self
+        self.running = True
+        worker = threading.Thread(target=self.run_batches, daemon=True)
+        worker.start()
+
+        print(f"Detector listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Detector stopped")
+        finally:
+            self.running = False
+            worker.join()
+            server.server_close()
+            os.unlink(self.socket_path)
+
+    def shutdown(self):
+        """Make serve_forever return (from another thread)"""
+        if self.server is not None:
+            self.server.shutdown()
+
+
+# ====================================================================
+# DETECTOR CLIENT
+# ====================================================================
+class DetectorClient:
+    """Drop-in replacement for ImageProcessor.proccess_image backed by the daemon"""
+
+    def __init__(self, socket_path=SOCKET_PATH, retries=20):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.rfile = self.sock.makefile("rb")
+        self.retries = retries
+        self.shm = None
+        self.next_id = 0
+
+    def request(self, message):
+        self.next_id += 1
+        message["id"] = self.next_id
+        self.sock.sendall((json.dumps(message) + "\n").encode())
+        return json.loads(self.rfile.readline())
+
+    def proccess_image(self, img, channel_order="BGR"):
+        img = np.ascontiguousarray(img)
+        if self.shm is None or self.shm.size < img.nbytes:
+            self.close_shm()
+            self.shm = shared_memory.SharedMemory(create=True, size=img.nbytes)
+        frame = np.ndarray(img.shape, dtype=np.uint8, buffer=self.shm.buf)
+        frame[...] = img
+        del frame
+
+        message = {"shm": self.shm.name, "shape": list(img.shape), "channel_order": channel_order}
+        for _ in range(self.retries + 1):
+            reply = self.request(dict(message))
+            if reply.get("error") != "busy":
+                break
+            time.sleep(reply["retry_after"])
+        else:
+            raise DetectorBusy("Detector busy, frame dropped")
+
+        if "error" in reply:
+            raise Exception(f"Detector error: {reply['error']}")
+        return reply["coordinates"]
+
+    def get_stats(self):
+        return self.request({"cmd": "stats"})
+
+    def close_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        self.close_shm()
+        self.rfile.close()
+        self.sock.close()
+
+
+# ====================================================================
+# LOAD TEST
+# ====================================================================
+def _load_test_client(socket_path, frames, size, results):
+    rng = np.random.default_rng(os.getpid())
+    img = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    client = DetectorClient(socket_path, retries=0)
+    latencies, busy = [], 0
+    try:
+        for _ in range(frames):
+            start = time.perf_counter()
+            try:
+                client.proccess_image(img)
+                latencies.append(time.perf_counter() - start)
+            except DetectorBusy:
+                busy += 1
+                time.sleep(0.01)
+    finally:
+        client.close()
+    results.put((latencies, busy))
+
+
+def load_test(socket_path=SOCKET_PATH, clients=16, frames=50, size=(800, 600)):
+    """Hammer a running daemon from many local processes and print latency percentiles"""
+    results = mp.Queue()
+    workers = [
+        mp.Process(target=_load_test_client, args=(socket_path, frames, size, results))
+        for _ in range(clients)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([l for lat, _ in outcomes for l in lat]) * 1000
+    busy = sum(b for _, b in outcomes)
+    if len(latencies) == 0:
+        raise Exception("No frames were served")
+
+    print(f"Clients: {clients} | Frames served: {len(latencies)} | Rejected (busy): {busy}")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} frames/s")
+    print("Latency ms: p50 {:.1f} | p95 {:.1f} | p99 {:.1f} | max {:.1f}".format(
+        *np.percentile(latencies, [50, 95, 99, 100])))
+
+    client = DetectorClient(socket_path)
+    print(f"Daemon stats: {client.get_stats()}")
+    client.close()
+    return latencies, busy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared YOLO detector daemon for PetStar bots")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve")
+    serve.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    serve.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    serve.add_argument("--templates", metavar="DIR", help="also match the UI widget templates in this folder")
+    serve.add_argument("--max-batch", type=int, default=8)
+    serve.add_argument("--max-wait", type=float, default=0.005)
+    serve.add_argument("--max-pending", type=int, default=32)
+    serve.add_argument("--timeout", type=float,
+                       help="seconds before a frame gets a timeout reply (default: 1000 x max-wait, at least 5)")
+    serve.add_argument("--threads", type=int, help="OpenCV compute threads")
+    serve.add_argument("--cpus", type=parse_cpu_list, help="CPU list to pin the daemon to, e.g. 0-3")
+    serve.add_argument("--nice", type=int)
+
+    bench = sub.add_parser("load-test")
+    bench.add_argument("--clients", type=int, default=16)
+    bench.add_argument("--frames", type=int, default=50)
+    bench.add_argument("--size", type=int, nargs=2, default=(800, 600))
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        ResourceConfig(threads=args.threads, cpus=args.cpus, nice=args.nice).apply()
+        # Frame sizes differ per client, so img_size is only used by proccess_image
+        templates = None
+        if args.templates:
+            from templates import TemplateDetector
+            templates = TemplateDetector(args.templates)
+        improc = ImageProcessor((416, 416), args.cfg, args.weights, show=False, templates=templates)
+        daemon = DetectorDaemon(improc, args.socket, args.max_batch, args.max_wait, args.max_pending,
+                                args.timeout)
+        daemon.serve_forever()
+    else:
+        load_test(args.socket, args.clients, args.frames, tuple(args.size))
@@ -0,0 +1,275 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+
+from decode import Decoder
+
+SWEEP_THRESHOLDS = np.round(np.arange(0.1, 0.96, 0.05), 2)
+
+
+# ====================================================================
+# DATASET
+# ====================================================================
+def resolve_image_path(path, root="."):
+    """test.txt holds paths relative to darknet's folder on Colab (data/obj/...);
+    fall back to the local obj/ folder from the labeling notebook"""
+    for candidate in (os.path.join(root, path), os.path.join(root, "obj", os.path.basename(path))):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def load_test_list(test_file="data/test.txt", root="."):
+    with open(test_file, "r") as file:
+        paths = [line.strip() for line in file if line.strip()]
+    images = []
+    for path in paths:
+        image_path = resolve_image_path(path, root)
+        if image_path is None:
+            print(f"Warning: missing image {path}")
+            continue
+        images.append(image_path)
+    if not images:
+        raise Exception(f"No images from {test_file} were found")
+    return images
+
+
+def load_ground_truth(image_path, w, h):
+    """Darknet label next to the image -> list of (class, x1, y1, x2, y2) in pixels"""
+    label_path = os.path.splitext(image_path)[0] + ".txt"
+    boxes = []
+    if os.path.exists(label_path):
+        with open(label_path, "r") as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) != 5:
+                    continue
+                cls, cx, cy, bw, bh = int(parts[0]), *map(float, parts[1:])
+                boxes.append((cls, (cx - bw / 2) * w, (cy - bh / 2) * h, (cx + bw / 2) * w, (cy + bh / 2) * h))
+    return boxes
+
+
+# ====================================================================
+# INFERENCE WORKERS
+# ====================================================================
+_improc = None
+
+
+def _init_worker(cfg_file, weights_file, nms_iou, threads, tile_size=None, tile_overlap=64):
+    global _improc
+    from resources import limit_threads
+    from vision import ImageProcessor
+
+    limit_threads(threads)
+    # Keep (almost) everything so the confidence sweep can be computed afterwards
+    decoder = Decoder(score_threshold=0.005, iou_threshold=nms_iou, per_class=True)
+    _improc = ImageProcessor((416, 416), cfg_file, weights_file, show=False, decoder=decoder,
+                             tile_size=tile_size, tile_overlap=tile_overlap)
+
+
+def _detect(image_path):
+    img = cv.imread(image_path)
+    if img is None:
+        return image_path, None, [], 0.0
+    _improc.W, _improc.H = img.shape[1], img.shape[0]
+
+    start = time.perf_counter()
+    coordinates = _improc.proccess_image(img)
+    elapsed = time.perf_counter() - start
+
+    detections = [
+        (c["class"], c["confidence"], c["x"], c["y"], c["x"] + c["w"], c["y"] + c["h"])
+        for c in coordinates
+    ]
+    return image_path, img.shape[:2], detections, elapsed
+
+
+# ====================================================================
+# METRICS
+# ====================================================================
+def box_iou(box, boxes):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = (box[2] - box[0]) * (box[3] - box[1]) + (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def match_detections(results, num_classes, iou_threshold=0.5):
+    """Mark each detection as true/false positive, per class.
+
+    Returns {class: (confidences, is_true_positive, number_of_ground_truth_boxes)}
+    """
+    per_class = {c: ([], [], 0) for c in range(num_classes)}
+    for detections, ground_truth in results:
+        for cls in range(num_classes):
+            gt = [g[1:] for g in ground_truth if g[0] == cls]
+            dets = sorted((d for d in detections if d[0] == cls), key=lambda d: -d[1])
+            confidences, hits, total = per_class[cls]
+            used = np.zeros(len(gt), dtype=bool)
+            for det in dets:
+                hit = False
+                if gt:
+                    ious = box_iou(det[2:], gt)
+                    ious[used] = 0
+                    best = int(np.argmax(ious))
+                    if ious[best] >= iou_threshold:
+                        used[best] = True
+                        hit = True
+                confidences.append(det[1])
+                hits.append(hit)
+            per_class[cls] = (confidences, hits, total + len(gt))
+    return {c: (np.array(conf), np.array(hit, dtype=bool), n) for c, (conf, hit, n) in per_class.items()}
+
+
+def average_precision(confidences, hits, total):
+    """VOC-style all-point interpolated AP"""
+    if total == 0 or len(confidences) == 0:
+        return 0.0
+    order = np.argsort(-confidences)
+    tp = np.cumsum(hits[order])
+    fp = np.cumsum(~hits[order])
+    recall = tp / total
+    precision = tp / np.maximum(tp + fp, 1e-9)
+
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[1.0], precision, [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+
+def precision_recall_at(confidences, hits, total, threshold):
+    keep = confidences >= threshold
+    tp = int(hits[keep].sum())
+    fp = int(keep.sum()) - tp
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / total if total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+# ====================================================================
+# EVALUATION
+# ====================================================================
+def evaluate(cfg_file, weights_file, images, classes, workers=None, nms_iou=0.4,
+             deployed_threshold=0.5, iou_threshold=0.5, tile_size=None, tile_overlap=64):
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    start = time.perf_counter()
+    init_args = (cfg_file, weights_file, nms_iou, 1, tile_size, tile_overlap)
+    with mp.get_context("spawn").Pool(workers, _init_worker, init_args) as pool:
+        outputs = pool.map(_detect, images, chunksize=4)
+    wall = time.perf_counter() - start
+
+    results, latencies = [], []
+    for image_path, shape, detections, elapsed in outputs:
+        if shape is None:
+            print(f"Warning: could not read {image_path}")
+            continue
+        results.append((detections, load_ground_truth(image_path, shape[1], shape[0])))
+        latencies.append(elapsed)
+
+    matched = match_detections(results, len(classes), iou_threshold)
+    mode = f"tiles {tile_size}px/{tile_overlap}px overlap" if tile_size else "single blob"
+    report = {"weights": weights_file, "mode": mode, "images": len(results), "classes": {}}
+    for cls, name in classes.items():
+        confidences, hits, total = matched[cls]
+        precision, recall, f1 = precision_recall_at(confidences, hits, total, deployed_threshold)
+        report["classes"][name] = {
+            "ground_truth": total,
+            "ap50": average_precision(confidences, hits, total),
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "sweep": [
+                dict(zip(("threshold", "precision", "recall", "f1"),
+                         (float(t), *precision_recall_at(confidences, hits, total, t))))
+                for t in SWEEP_THRESHOLDS
+            ],
+        }
+    report["map50"] = float(np.mean([c["ap50"] for c in report["classes"].values()]))
+
+    latencies = np.array(latencies) * 1000
+    report["latency_ms"] = {
+        "mean": float(latencies.mean()),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+    }
+    report["throughput_fps"] = len(results) / wall
+    report["workers"] = workers
+    return report
+
+
+def print_report(report, deployed_threshold):
+    print("=" * 60)
+    print(f"{report['weights']} ({report['mode']}) on {report['images']} images")
+    print("=" * 60)
+    for name, stats in report["classes"].items():
+        print(f"{name}: AP@0.5 {stats['ap50']:.3f} | at conf {deployed_threshold}: "
+              f"P {stats['precision']:.3f} R {stats['recall']:.3f} F1 {stats['f1']:.3f} "
+              f"({stats['ground_truth']} boxes)")
+        print("    conf   precision  recall  f1")
+        best = max(stats["sweep"], key=lambda row: row["f1"])
+        for row in stats["sweep"]:
+            marker = "  <- best F1" if row is best else ""
+            print(f"    {row['threshold']:.2f}   {row['precision']:.3f}      {row['recall']:.3f}   {row['f1']:.3f}{marker}")
+    latency = report["latency_ms"]
+    print(f"mAP@0.5: {report['map50']:.3f}")
+    print(f"Detector latency: mean {latency['mean']:.1f} ms | p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms "
+          f"(1 thread per worker) | throughput {report['throughput_fps']:.1f} images/s with {report['workers']} workers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate trained weights on the test split (mAP, threshold sweep, speed)")
+    parser.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    parser.add_argument("--weights", nargs="+", default=["yolov4-tiny-custom_last.weights"])
+    parser.add_argument("--test", default="data/test.txt")
+    parser.add_argument("--root", default=".", help="folder the paths in the test list are relative to")
+    parser.add_argument("--names", default="yolov4-tiny/obj.names")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--nms-iou", type=float, default=0.4)
+    parser.add_argument("--conf", type=float, default=0.5, help="deployed confidence threshold to report")
+    parser.add_argument("--json", help="also write the full report(s) to this file")
+    parser.add_argument("--tile-size", type=int, help="evaluate tiled inference with tiles of this many frame pixels")
+    parser.add_argument("--tile-overlap", type=int, default=64)
+    parser.add_argument("--compare-tiling", action="store_true",
+                        help="evaluate both the single-blob and the tiled mode and compare them")
+    args = parser.parse_args()
+    if args.compare_tiling and not args.tile_size:
+        parser.error("--compare-tiling needs --tile-size")
+
+    with open(args.names, "r") as file:
+        classes = {i: line.strip() for i, line in enumerate(file) if line.strip()}
+    images = load_test_list(args.test, args.root)
+
+    modes = [args.tile_size]
+    if args.compare_tiling:
+        modes = [None, args.tile_size]
+
+    reports = []
+    for weights_file in args.weights:
+        for tile_size in modes:
+            report = evaluate(args.cfg, weights_file, images, classes, args.workers, args.nms_iou, args.conf,
+                              tile_size=tile_size, tile_overlap=args.tile_overlap)
+            print_report(report, args.conf)
+            reports.append(report)
+
+    if args.compare_tiling:
+        print("=" * 60)
+        print(f"{'weights / mode':<50} {'mAP@0.5':>8} {'recall':>7} {'images/s':>9}")
+        for report in reports:
+            recall = np.mean([c["recall"] for c in report["classes"].values()])
+            print(f"{report['weights'] + ' / ' + report['mode']:<50} {report['map50']:8.3f} {recall:7.3f} "
+                  f"{report['throughput_fps']:9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(reports, file, indent=2)
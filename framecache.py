@@ -0,0 +1,297 @@
+import argparse
+import collections
+import json
+import os
+import sqlite3
+import time
+
+import cv2 as cv
+import numpy as np
+
+from templates import GRAY_CONVERSIONS
+
+CACHE_DB = "detections.sqlite"
+# Scenes whose frames are never cached: sprites move by a few pixels between
+# frames, which the hash does not always see, and "unknown" may be gameplay
+LIVE_SCENES = ("gameplay", "unknown")
+
+
+# ====================================================================
+# PERCEPTUAL FRAME HASH
+# ====================================================================
+def frame_hash(img, channel_order="BGR", hash_size=16):
+    """Difference hash of the downscaled frame: hash_size x hash_size bits,
+    one per pair of neighbouring cells, set where brightness clearly increases.
+
+    Insensitive to capture noise and small colour shifts but not to
+    anything that changes the layout of the screen. The frame size is part
+    of the key since detections are reported in window pixels.
+    """
+    # Area averaging is slow at large non-integer factors; skipping rows and
+    # columns down to ~8 samples per cell first keeps the hash well under a millisecond
+    step = max(1, min(img.shape[0], img.shape[1]) // (hash_size * 8))
+    small = cv.resize(img[::step, ::step], (hash_size + 1, hash_size), interpolation=cv.INTER_AREA)
+    if small.ndim == 3:
+        small = cv.cvtColor(small, GRAY_CONVERSIONS[channel_order])
+    # Flat areas (most of a game UI) would flip on noise with a plain `>`
+    small = small.astype(np.int16)
+    bits = np.packbits(small[:, 1:] > small[:, :-1] + 2)
+    return f"{img.shape[1]}x{img.shape[0]}:{bits.tobytes().hex()}"
+
+
+def hamming(key, keys):
+    """Bit distance from one hash to each of several hashes of the same size"""
+    a = np.frombuffer(bytes.fromhex(key.split(":")[1]), dtype=np.uint8)
+    b = np.array([np.frombuffer(bytes.fromhex(k.split(":")[1]), dtype=np.uint8) for k in keys])
+    return np.unpackbits(a ^ b, axis=1).sum(axis=1)
+
+
+# ====================================================================
+# CACHE
+# ====================================================================
+class DetectionCache:
+    """LRU + TTL cache of detections keyed by frame_hash.
+
+    Memory holds at most max_entries results (least recently used evicted
+    first); entries older than ttl seconds are treated as misses, so
+    something appearing on an otherwise unchanged screen is picked up within
+    ttl. With max_distance > 0 a frame also matches a cached one whose hash
+    differs by at most that many bits; only worth it where nothing small
+    ever appears, since a newly spawned sprite changes just a few bits and
+    would get the old screen's detections. With disk_path set, results are also
+    kept in an SQLite file that survives restarts and backs memory misses.
+    """
+
+    def __init__(self, max_entries=256, ttl=5.0, max_distance=0, hash_size=16, disk_path=None,
+                 namespace="", max_disk_entries=10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.namespace = namespace
+        self.max_disk_entries = max_disk_entries
+        self.entries = collections.OrderedDict()
+        self.stats = collections.Counter()
+        self.db = None
+        if disk_path:
+            self.db = sqlite3.connect(disk_path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS detections (namespace TEXT, key TEXT, coordinates TEXT,"
+                            " stored_at REAL, cost REAL, PRIMARY KEY (namespace, key))")
+
+    def key(self, img, channel_order="BGR"):
+        start = time.perf_counter()
+        key = frame_hash(img, channel_order, self.hash_size)
+        self.stats["hash_time"] += time.perf_counter() - start
+        return key
+
+    def expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def get(self, key):
+        """Cached coordinates for a frame hash, or None"""
+        entry = self.entries.get(key)
+        if entry is None and self.max_distance and self.entries:
+            keys = [k for k in self.entries if k.split(":")[0] == key.split(":")[0]]
+            if keys:
+                distances = hamming(key, keys)
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    key, entry = keys[best], self.entries[keys[best]]
+                    self.stats["near_hits"] += 1
+
+        if entry is not None and self.expired(entry[1]):
+            del self.entries[key]
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None and self.db is not None:
+            entry = self.get_disk(key)
+            if entry is not None:
+                self.stats["disk_hits"] += 1
+                self.put_memory(key, entry)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        self.stats["saved_time"] += entry[2]
+        return [dict(c) for c in entry[0]]
+
+    def put(self, key, coordinates, cost):
+        """Store the detections for a frame hash and how long they took to compute"""
+        entry = ([dict(c) for c in coordinates], time.time(), cost)
+        self.put_memory(key, entry)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?)",
+                            (self.namespace, key, json.dumps(coordinates), entry[1], cost))
+            self.stats["disk_writes"] += 1
+            if self.stats["disk_writes"] % 100 == 0:
+                self.prune_disk()
+            self.db.commit()
+
+    def put_memory(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_disk(self, key):
+        row = self.db.execute("SELECT coordinates, stored_at, cost FROM detections WHERE namespace = ? AND key = ?",
+                              (self.namespace, key)).fetchone()
+        if row is None:
+            return None
+        if self.expired(row[1]):
+            self.stats["expired"] += 1
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def prune_disk(self):
+        """Drop expired rows and keep only the newest max_disk_entries"""
+        if self.ttl is not None:
+            self.db.execute("DELETE FROM detections WHERE stored_at < ?", (time.time() - self.ttl,))
+        self.db.execute("DELETE FROM detections WHERE rowid NOT IN "
+                        "(SELECT rowid FROM detections ORDER BY stored_at DESC LIMIT ?)", (self.max_disk_entries,))
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self.entries),
+            "lookups": lookups,
+            "hits": self.stats["hits"],
+            "near_hits": self.stats["near_hits"],
+            "disk_hits": self.stats["disk_hits"],
+            "misses": self.stats["misses"],
+            "bypassed": self.stats["bypassed"],
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+            "evictions": self.stats["evictions"],
+            "expired": self.stats["expired"],
+            "hash_ms": self.stats["hash_time"] / lookups * 1000 if lookups else 0.0,
+            "saved_s": self.stats["saved_time"],
+        }
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+
+def model_namespace(cfg_file, weights_file, input_size, roi=None):
+    """Disk cache entries are only valid for the model (and settings) that produced them"""
+    if not weights_file:
+        return f"templates only|{roi}"
+    stat = os.stat(weights_file)
+    return f"{os.path.abspath(cfg_file)}|{os.path.abspath(weights_file)}|{stat.st_size}|{int(stat.st_mtime)}|" \
+           f"{input_size[0]}x{input_size[1]}|{roi}"
+
+
+class CachedImageProcessor:
+    """ImageProcessor front end that skips the forward pass for frames it has seen.
+
+    Only frames of a static scene are cached: the SceneGate in front passes
+    the scene it classified, and frames of live_scenes or without a scene go
+    straight to the detector. Everything other than proccess_image (classes,
+    W, H, ...) is the wrapped processor's.
+    """
+
+    takes_scene = True
+
+    def __init__(self, improc, cache, live_scenes=LIVE_SCENES):
+        self.improc = improc
+        self.cache = cache
+        self.live_scenes = live_scenes
+
+    def __getattr__(self, attr):
+        return getattr(self.improc, attr)
+
+    def proccess_image(self, img, channel_order="BGR", scene=None):
+        if scene is None or scene in self.live_scenes:
+            self.cache.stats["bypassed"] += 1
+            return self.improc.proccess_image(img, channel_order)
+
+        key = self.cache.key(img, channel_order)
+        coordinates = self.cache.get(key)
+        if coordinates is not None:
+            if self.improc.show:
+                self.improc.draw_identified_objects(self.improc.display_image(img, channel_order), coordinates)
+            return coordinates
+
+        start = time.perf_counter()
+        coordinates = self.improc.proccess_image(img, channel_order)
+        self.cache.put(key, coordinates, time.perf_counter() - start)
+        return coordinates
+
+
+def format_stats(stats):
+    return (f"cache: {stats['hit_ratio']:.1%} hits ({stats['hits']}/{stats['lookups']}, "
+            f"{stats['near_hits']} near, {stats['disk_hits']} from disk) | {stats['evictions']} evicted, "
+            f"{stats['expired']} expired, {stats['bypassed']} live frames not cached | hash {stats['hash_ms']:.2f} ms | saved {stats['saved_s']:.1f} s")
+
+
+# ====================================================================
+# BENCHMARK
+# ====================================================================
+def benchmark(cfg_file, weights_file, scenes=6, frames=200, size=(800, 600), disk_path=None, max_distance=0):
+    """Replay a session that keeps returning to a few screens, with capture
+    noise, and compare the plain detector with the cached one"""
+    from vision import ImageProcessor
+
+    rng = np.random.default_rng(0)
+    screens = []
+    for _ in range(scenes):
+        # Flat panels and buttons, like the game's menus and dialogs
+        screen = np.full((size[1], size[0], 3), rng.integers(0, 255, 3), dtype=np.uint8)
+        for _ in range(40):
+            x, y = rng.integers(0, size[0]), rng.integers(0, size[1])
+            w, h = rng.integers(20, 200, 2)
+            cv.rectangle(screen, (int(x), int(y)), (int(x + w), int(y + h)), rng.integers(0, 255, 3).tolist(), -1)
+        screens.append(screen)
+    order = rng.integers(0, scenes, frames)
+    noise = rng.integers(-2, 3, (size[1], size[0], 3))
+
+    improc = ImageProcessor(size, cfg_file, weights_file, show=False)
+    namespace = model_namespace(cfg_file, weights_file, improc.input_size) if disk_path else ""
+    cached = CachedImageProcessor(improc, DetectionCache(ttl=None, max_distance=max_distance,
+                                                         disk_path=disk_path, namespace=namespace))
+    # The synthetic screens stand in for menus, which a SceneGate would pass on as such
+    detectors = (("ImageProcessor", improc.proccess_image),
+                 ("CachedImageProcessor", lambda frame: cached.proccess_image(frame, scene="menu")))
+    for name, detect in detectors:
+        start = time.perf_counter()
+        for i in order:
+            frame = np.clip(screens[i] + noise, 0, 255).astype(np.uint8)
+            detect(frame)
+            noise = np.roll(noise, 1, axis=1)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22} {elapsed / frames * 1000:7.2f} ms/frame")
+    print(format_stats(cached.cache.get_stats()))
+    cached.cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detection cache for recurring game screens")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench = sub.add_parser("bench", help="replay recurring synthetic screens with and without the cache")
+    bench.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    bench.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    bench.add_argument("--scenes", type=int, default=6)
+    bench.add_argument("--frames", type=int, default=200)
+    bench.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    bench.add_argument("--max-distance", type=int, default=0)
+    bench.add_argument("--disk", metavar="DB", help="also use the persistent tier in this SQLite file")
+
+    info = sub.add_parser("info", help="show what a persistent cache file holds")
+    info.add_argument("db", nargs="?", default=CACHE_DB)
+
+    args = parser.parse_args()
+    if args.command == "bench":
+        benchmark(args.cfg, args.weights, args.scenes, args.frames, tuple(args.size), args.disk, args.max_distance)
+    else:
+        db = sqlite3.connect(args.db)
+        for namespace, count, oldest, newest, cost in db.execute(
+                "SELECT namespace, COUNT(*), MIN(stored_at), MAX(stored_at), AVG(cost) FROM detections "
+                "GROUP BY namespace"):
+            print(f"{count:6} entries | {time.ctime(oldest)} .. {time.ctime(newest)} | "
+                  f"{cost * 1000:.1f} ms/frame saved per hit | {namespace}")
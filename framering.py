@@ -0,0 +1,266 @@
+import argparse
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+RING_NAME = "petstar-frames"
+MAGIC = b"PSRING01"
+# magic, slots, max height, max width, channels, channel order, (write sequence at byte 56)
+HEADER = struct.Struct("<8sIIII4s")
+HEADER_SIZE = 64
+SLOT_META = np.dtype([("seq", "<u8"), ("timestamp", "<f8"), ("height", "<u4"), ("width", "<u4")])
+
+
+# ====================================================================
+# SHARED MEMORY HELPERS
+# ====================================================================
+def attach_shared_memory(name):
+    """Attach to a segment owned by another process without taking ownership of it"""
+    shm = shared_memory.SharedMemory(name=name)
+    # Attaching registers the segment with this process' resource tracker,
+    # which would unlink it (under the client's feet) when we exit.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+# ====================================================================
+# FRAME RING
+# ====================================================================
+class FrameRing:
+    """Fixed ring of preallocated frame slots in shared memory.
+
+    One writer (capture) fills slots in turn; any number of readers
+    (detector, preview, recorder), in this or other processes, look at the
+    same memory without copying. Every frame gets a sequence number n:
+
+    - the writer sets the slot's seq to 2n-1 before touching the pixels and
+      to 2n once done, then publishes n as the ring's write sequence
+    - a reader takes the newest n, checks the slot holds 2n, and after using
+      the pixels calls valid(n) to make sure the writer has not lapped it
+
+    Frames smaller than the slot size (e.g. after a window resize) are stored
+    in the top-left corner and returned as a view of their own size.
+
+    shared_tracker - set in readers started by the writer through
+    multiprocessing: they share its resource tracker, so they must not
+    unregister the segment the way independent readers do.
+    """
+
+    def __init__(self, name=RING_NAME, slots=None, shape=None, channel_order="RGB", create=False,
+                 shared_tracker=False):
+        self.name = name
+        self.owner = create
+        if create:
+            if slots is None or shape is None:
+                raise Exception("Creating a frame ring needs the number of slots and the frame shape")
+            height, width, channels = shape
+            size = self._layout(slots, height, width, channels)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left over from a writer that crashed; nobody else can be writing to it
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, slots, height, width, channels,
+                             channel_order.encode().ljust(4))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name) if shared_tracker else attach_shared_memory(name)
+            magic, slots, height, width, channels, order = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC:
+                raise Exception(f"Shared memory '{name}' is not a frame ring")
+            channel_order = order.decode().strip()
+            self._layout(slots, height, width, channels)
+
+        self.channel_order = channel_order
+        self.write_seq = np.ndarray((1,), dtype="<u8", buffer=self.shm.buf, offset=56)
+        self.meta = np.ndarray((self.slots,), dtype=SLOT_META, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.frames = np.ndarray((self.slots, *self.shape), dtype=np.uint8, buffer=self.shm.buf,
+                                 offset=self.frames_offset)
+        if create:
+            self.write_seq[0] = 0
+            self.meta[:] = 0
+        self.pending = None
+
+    def _layout(self, slots, height, width, channels):
+        self.slots = slots
+        self.shape = (height, width, channels)
+        self.frames_offset = _align(HEADER_SIZE + slots * SLOT_META.itemsize)
+        return self.frames_offset + slots * height * width * channels
+
+    # ---------------------------------------------------------------- writer
+    def begin_write(self, height=None, width=None):
+        """View of the next slot for the writer to fill in place (e.g. as a cv.resize dst)"""
+        height = height or self.shape[0]
+        width = width or self.shape[1]
+        if height > self.shape[0] or width > self.shape[1]:
+            raise Exception(f"Frame {width}x{height} does not fit the ring's {self.shape[1]}x{self.shape[0]} slots")
+        seq = int(self.write_seq[0]) + 1
+        slot = (seq - 1) % self.slots
+        self.meta["seq"][slot] = 2 * seq - 1
+        self.meta["height"][slot] = height
+        self.meta["width"][slot] = width
+        self.pending = seq
+        return self.frames[slot, :height, :width]
+
+    def commit(self, timestamp=None):
+        seq = self.pending
+        slot = (seq - 1) % self.slots
+        self.meta["timestamp"][slot] = time.time() if timestamp is None else timestamp
+        self.meta["seq"][slot] = 2 * seq
+        self.write_seq[0] = seq
+        self.pending = None
+        return seq
+
+    def write(self, img, timestamp=None):
+        """Copy one frame into the ring; the only copy on its way to every reader"""
+        np.copyto(self.begin_write(img.shape[0], img.shape[1]), img)
+        return self.commit(timestamp)
+
+    # ---------------------------------------------------------------- readers
+    def latest(self):
+        """(seq, timestamp, view) of the newest complete frame, or None before the first one"""
+        while True:
+            seq = int(self.write_seq[0])
+            if seq == 0:
+                return None
+            slot = (seq - 1) % self.slots
+            meta = self.meta[slot]
+            timestamp, height, width = float(meta["timestamp"]), int(meta["height"]), int(meta["width"])
+            if int(self.meta["seq"][slot]) == 2 * seq:
+                return seq, timestamp, self.frames[slot, :height, :width]
+            # The writer lapped us between the two reads; take the newer frame
+
+    def valid(self, seq):
+        """True while frame `seq` has not been overwritten; check after using a view"""
+        return int(self.meta["seq"][(seq - 1) % self.slots]) == 2 * seq
+
+    def wait(self, after=0, timeout=None, poll=0.001):
+        """Newest frame with a sequence number above `after` (None on timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while int(self.write_seq[0]) <= after:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(poll)
+        return self.latest()
+
+    def read_copy(self, out):
+        """Copy the newest frame into `out` (for readers slower than the ring), retrying
+        if the writer lapped the slot mid-copy"""
+        while True:
+            frame = self.latest()
+            if frame is None:
+                return None
+            seq, timestamp, view = frame
+            target = out[:view.shape[0], :view.shape[1]]
+            np.copyto(target, view)
+            if self.valid(seq):
+                return seq, timestamp, target
+
+    def close(self):
+        # Views into the buffer must go before the segment can be closed
+        del self.write_seq, self.meta, self.frames
+        try:
+            self.shm.close()
+        except BufferError:
+            # A caller still holds a frame view; the mapping goes away with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+# ====================================================================
+# CAPTURE, DETECTOR, PREVIEW AND RECORDER PROCESSES
+# ====================================================================
+def run_capture(name, slots, window_title, fps):
+    from capture import WindowCapture
+
+    wincap = WindowCapture(window_name=window_title)
+    wincap.calibrate()
+    w, h = wincap.get_window_size()
+    ring = FrameRing(name, slots, (h, w, 3), "RGB", create=True)
+    print(f"Capturing {w}x{h} into '{name}' ({slots} slots)")
+    try:
+        while True:
+            start = time.monotonic()
+            ring.write(wincap.get_screenshot(raw=True))
+            time.sleep(max(0.0, 1 / fps - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        print("Capture stopped")
+    finally:
+        ring.close()
+
+
+def run_detector(name, cfg_file, weights_file, show):
+    import cv2 as cv
+    from vision import ImageProcessor
+
+    ring = FrameRing(name)
+    improc = ImageProcessor(ring.shape[1::-1], cfg_file, weights_file, show=show)
+    seq = 0
+    while True:
+        frame = ring.wait(seq)
+        seq, _, view = frame
+        # The detector reads the ring slot directly
+        coordinates = improc.proccess_image(view, ring.channel_order)
+        if not ring.valid(seq):
+            print(f"Frame {seq} was overwritten while detecting, result dropped")
+            continue
+        for coordinate in coordinates:
+            print(f"Frame {seq}: {coordinate}")
+        if show and cv.waitKey(1) == ord("q"):
+            break
+
+
+def run_recorder(name, out_dir, interval):
+    import cv2 as cv
+    from vision import BGR_CONVERSIONS
+
+    ring = FrameRing(name)
+    os.makedirs(out_dir, exist_ok=True)
+    seq = 0
+    while True:
+        frame = ring.wait(seq)
+        seq, _, view = frame
+        img = cv.cvtColor(view, BGR_CONVERSIONS[ring.channel_order]) if ring.channel_order in BGR_CONVERSIONS else view
+        if ring.valid(seq):
+            path = os.path.join(out_dir, f"img_{len(os.listdir(out_dir))}.jpeg")
+            cv.imwrite(path, img)
+            print(f"Saved frame {seq} to {path}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-memory frame ring between capture, detector and recorder")
+    parser.add_argument("--name", default=RING_NAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    capture = sub.add_parser("capture", help="write game frames into the ring")
+    capture.add_argument("--window-title", default="PetStar")
+    capture.add_argument("--slots", type=int, default=8)
+    capture.add_argument("--fps", type=float, default=10.0)
+
+    detect = sub.add_parser("detect", help="run the detector (and preview) on ring frames")
+    detect.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    detect.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    detect.add_argument("--no-show", action="store_true")
+
+    record = sub.add_parser("record", help="save ring frames as a dataset")
+    record.add_argument("--out", default="images")
+    record.add_argument("--interval", type=float, default=1.0)
+
+    args = parser.parse_args()
+    if args.command == "capture":
+        run_capture(args.name, args.slots, args.window_title, args.fps)
+    elif args.command == "detect":
+        run_detector(args.name, args.cfg, args.weights, not args.no_show)
+    else:
+        run_recorder(args.name, args.out, args.interval)
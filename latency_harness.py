@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+WINDOW_TITLE = "PetStar latency harness"
+WINDOW_SIZE = (800, 600)
+BACKGROUND = (96, 140, 70)  # grass, BGR
+BOT_SCRIPT = "RUN-WITH-PID-LINUX.py"
+
+
+# ====================================================================
+# SYNTHETIC GAME WINDOW
+# ====================================================================
+def draw_pig(size=48):
+    """A pig-ish sprite on the window background, BGR"""
+    img = np.full((size, size, 3), BACKGROUND, dtype=np.uint8)
+    c = size // 2
+    cv.ellipse(img, (c, c + 2), (c - 3, c - 8), 0, 0, 360, (180, 160, 250), -1)
+    cv.circle(img, (c - size // 6, c - size // 8), max(2, size // 16), (40, 40, 40), -1)
+    cv.circle(img, (c + size // 6, c - size // 8), max(2, size // 16), (40, 40, 40), -1)
+    cv.ellipse(img, (c, c + size // 8), (size // 7, size // 10), 0, 0, 360, (150, 110, 230), -1)
+    return img
+
+
+def run_target(title, events_file, sprite_file, interval=1.5, lifetime=4.0, seed=0, x=100, y=100):
+    """Tk window that spawns one pig at a time at a random spot and logs when
+    each appeared and every pointer click it received (with wall-clock times,
+    taken in this process so no clock needs to be shared with the bot)"""
+    import tkinter as tk
+
+    rng = random.Random(seed)
+    w, h = WINDOW_SIZE
+    root = tk.Tk()
+    root.title(title)
+    root.geometry(f"{w}x{h}+{x}+{y}")
+    root.resizable(False, False)
+    canvas = tk.Canvas(root, width=w, height=h, highlightthickness=0,
+                       background="#%02x%02x%02x" % BACKGROUND[::-1])
+    canvas.pack()
+    sprite = tk.PhotoImage(file=sprite_file)
+    sw, sh = sprite.width(), sprite.height()
+
+    log = open(events_file, "w", buffering=1)
+    state = {"next_id": 0, "current": None}
+
+    def emit(**event):
+        log.write(json.dumps(event) + "\n")
+
+    def remove(reason):
+        sprite_id, item, _ = state["current"]
+        canvas.delete(item)
+        state["current"] = None
+        emit(type=reason, id=sprite_id, t=time.time())
+
+    def spawn():
+        if state["current"] is None:
+            sx, sy = rng.randint(0, w - sw), rng.randint(0, h - sh)
+            item = canvas.create_image(sx, sy, image=sprite, anchor="nw")
+            root.update_idletasks()
+            sprite_id = state["next_id"]
+            state["next_id"] += 1
+            state["current"] = (sprite_id, item, (sx, sy, sw, sh))
+            emit(type="spawn", id=sprite_id, t=time.time(), x=sx, y=sy, w=sw, h=sh)
+            root.after(int(lifetime * 1000), lambda: state["current"] and state["current"][0] == sprite_id
+                       and remove("expire"))
+        root.after(int(interval * 1000 * rng.uniform(0.75, 1.25)), spawn)
+
+    def on_click(event):
+        hit = None
+        if state["current"] is not None:
+            sprite_id, _, (sx, sy, sw_, sh_) = state["current"]
+            if sx <= event.x < sx + sw_ and sy <= event.y < sy + sh_:
+                hit = sprite_id
+        emit(type="click", t=time.time(), x=event.x, y=event.y, hit=hit)
+        if hit is not None:
+            remove("hit")
+
+    canvas.bind("<ButtonPress-1>", on_click)
+    root.after(1000, spawn)
+    root.mainloop()
+
+
+# ====================================================================
+# HARNESS
+# ====================================================================
+def start_xvfb(display, screen="1280x800x24"):
+    number = display.lstrip(":")
+    server = subprocess.Popen(["Xvfb", display, "-screen", "0", screen, "-nolisten", "tcp"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            return server
+        if server.poll() is not None:
+            break
+        time.sleep(0.05)
+    server.kill()
+    raise Exception(f"Xvfb did not start on {display}")
+
+
+def wait_for_window(title, env, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = subprocess.run(["xdotool", "search", "--name", title], capture_output=True, text=True, env=env)
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.split()[0]
+        time.sleep(0.1)
+    raise Exception(f"Synthetic window '{title}' did not appear")
+
+
+def summarize(events):
+    spawns = {e["id"]: e for e in events if e["type"] == "spawn"}
+    hits = {e["id"]: e for e in events if e["type"] == "hit"}
+    expired = [e for e in events if e["type"] == "expire"]
+    clicks = [e for e in events if e["type"] == "click"]
+    latencies = np.array([hits[i]["t"] - spawns[i]["t"] for i in hits]) * 1000
+    # A sprite still on screen when the run stopped counts as neither hit nor missed
+    finished = len(hits) + len(expired)
+    report = {
+        "spawned": len(spawns),
+        "hit": len(hits),
+        "missed": len(expired),
+        "hit_rate": len(hits) / finished if finished else 0.0,
+        "clicks": len(clicks),
+        "wasted_clicks": sum(1 for c in clicks if c["hit"] is None),
+    }
+    if len(latencies):
+        report.update({
+            "latency_ms_mean": float(latencies.mean()),
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+            "latency_ms_p99": float(np.percentile(latencies, 99)),
+            "latency_ms_max": float(latencies.max()),
+        })
+    return report
+
+
+def run_variant(name, overrides, workdir, env, duration, interval, lifetime, seed, bot_args, weights=None):
+    """Synthetic window plus the real bot loop for `duration` seconds; without
+    weights the bot finds the pigs with the sprite template alone"""
+    sprite_file = os.path.join(workdir, "pig.png")
+    templates = os.path.join(workdir, "templates")
+    events_file = os.path.join(workdir, f"events-{name}.jsonl")
+
+    target = subprocess.Popen([sys.executable, __file__, "target", "--events", events_file, "--sprite", sprite_file,
+                               "--interval", str(interval), "--lifetime", str(lifetime), "--seed", str(seed)], env=env)
+    try:
+        wait_for_window(WINDOW_TITLE, env)
+        settings = [
+            f"window.title={json.dumps(WINDOW_TITLE)}", "window.process_name=''", "window.calibrate=false",
+            "bot.show=false", f"model.templates={json.dumps(templates)}",
+            f"model.weights={json.dumps(weights) if weights else 'none'}",
+        ] + list(overrides)
+        repo = os.path.dirname(os.path.abspath(__file__))
+        command = [sys.executable, os.path.join(repo, BOT_SCRIPT)] + bot_args
+        for setting in settings:
+            command += ["--set", setting]
+        print(f"[{name}] {' '.join(shlex.quote(part) for part in command)}")
+        bot = subprocess.Popen(command, env=env, cwd=repo, stdout=subprocess.DEVNULL)
+        time.sleep(duration)
+        bot.terminate()
+        bot.wait(timeout=10)
+    finally:
+        target.terminate()
+        target.wait(timeout=10)
+
+    with open(events_file, "r") as file:
+        return summarize([json.loads(line) for line in file])
+
+
+def print_table(results):
+    header = f"{'variant':<16} {'spawned':>7} {'hit':>5} {'missed':>6} {'hit %':>6} {'wasted':>6} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        latency = " ".join(f"{r.get(f'latency_ms_{k}', float('nan')):>8.0f}" for k in ("p50", "p95", "p99", "max"))
+        print(f"{name:<16} {r['spawned']:>7} {r['hit']:>5} {r['missed']:>6} {r['hit_rate'] * 100:>5.0f}% "
+              f"{r['wasted_clicks']:>6} {latency}")
+
+
+def run_harness(variants, duration=60.0, interval=1.5, lifetime=4.0, display=":99", xvfb=True, bot_args=(),
+                report_file=None, seed=0, weights=None):
+    env = dict(os.environ)
+    server = None
+    if xvfb:
+        server = start_xvfb(display)
+        env["DISPLAY"] = display
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="petstar-harness-") as workdir:
+            sprite = draw_pig()
+            cv.imwrite(os.path.join(workdir, "pig.png"), sprite)
+            os.makedirs(os.path.join(workdir, "templates"))
+            cv.imwrite(os.path.join(workdir, "templates", "pig.png"), sprite)
+            for name, overrides in variants:
+                results[name] = run_variant(name, overrides, workdir, env, duration, interval, lifetime, seed,
+                                            list(bot_args), weights)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_table(results)
+    if report_file:
+        with open(report_file, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frame-to-click latency of the real bot loop against a synthetic "
+                                                 "game window on Xvfb")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run")
+    run.add_argument("--variant", nargs="+", action="append", metavar=("NAME", "SECTION.KEY=VALUE"),
+                     help="bot configuration to measure: a name then --set style overrides, repeatable "
+                          "(default: 'default' and 'fps10' with capture.fps=10)")
+    run.add_argument("--duration", type=float, default=60.0, help="seconds per variant")
+    run.add_argument("--interval", type=float, default=1.5, help="mean seconds between pig spawns")
+    run.add_argument("--lifetime", type=float, default=4.0, help="seconds before an unclicked pig counts as missed")
+    run.add_argument("--display", default=":99")
+    run.add_argument("--no-xvfb", action="store_true", help="use the current DISPLAY instead of starting Xvfb")
+    run.add_argument("--bot-args", default="", help="extra arguments for the bot, e.g. \"--config my.toml\"")
+    run.add_argument("--report", help="also write the results as JSON")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--weights", help="Darknet weights to detect with too (default: the pig template only, "
+                                       "so no trained model is needed)")
+
+    target = sub.add_parser("target", help="the synthetic game window (started by run)")
+    target.add_argument("--events", required=True)
+    target.add_argument("--sprite", required=True)
+    target.add_argument("--interval", type=float, default=1.5)
+    target.add_argument("--lifetime", type=float, default=4.0)
+    target.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "target":
+        run_target(WINDOW_TITLE, args.events, args.sprite, args.interval, args.lifetime, args.seed)
+    else:
+        variants = [(v[0], v[1:]) for v in args.variant] if args.variant else \
+            [("default", []), ("fps10", ["capture.fps=10"])]
+        run_harness(variants, args.duration, args.interval, args.lifetime, args.display, not args.no_xvfb,
+                    shlex.split(args.bot_args), args.report, args.seed, args.weights)
@@ -0,0 +1,377 @@
+import argparse
+import collections
+import functools
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import numpy as np
+
+SOCKET_PATH = "/tmp/petstar-profiler.sock"
+OUTPUT_DIR = "profiles"
+
+# Methods timed by default; anything the object does not have is skipped
+CAPTURE_METHODS = ("get_screenshot", "get_screen_position", "calibrate", "apply_insets", "_get_window_geometry")
+PROCESSOR_METHODS = ("proccess_image", "proccess_images", "proccess_tiles", "crop_roi", "match_templates",
+                     "get_coordinates", "display_image", "draw_identified_objects")
+# The profiler's own wrappers, left out of the sampled stacks
+HIDDEN_FRAMES = ("wrapper", "__call__", "__enter__", "__exit__")
+
+
+# ====================================================================
+# PROFILER
+# ====================================================================
+class Profiler:
+    """Stack sampling plus per-stage timers that can be switched on in a live bot.
+
+    While idle every instrumented call costs one attribute check. Once
+    started, a background thread samples the Python stacks of the bot's
+    threads every `interval` seconds (no tracing hooks, so the bot runs at
+    near full speed) and every instrumented method records its wall time.
+    After `frames` calls to frame() (or on stop()) the samples are written
+    as a collapsed-stack file for flamegraph.pl / speedscope / inferno and
+    a per-stage summary is printed and saved next to it; when the frame
+    budget runs out that happens on a background thread, not the bot's.
+    """
+
+    def __init__(self, interval=0.005, output_dir=OUTPUT_DIR):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.active = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.sampler = None
+        self.exporter = None
+        self.last_report = None
+        self.reset(None)
+
+    def reset(self, frames):
+        self.frames_wanted = frames
+        self.frames = 0
+        self.frame_times = []
+        self.frame_start = None
+        self.samples = collections.Counter()
+        self.stage_times = collections.defaultdict(list)
+        self.stage_self = collections.defaultdict(float)
+        self.started = time.perf_counter()
+
+    # ----------------------------------------------------------------
+    # Switching on and off
+    # ----------------------------------------------------------------
+    def start(self, frames=None):
+        """Profile the next `frames` frames (None: until stop())"""
+        with self.lock:
+            if self.active or self.exporting():
+                return False
+            self.reset(frames)
+            self.active = True
+            self.sampler = threading.Thread(target=self.sample_loop, name="profiler-sampler", daemon=True)
+            self.sampler.start()
+        print(f"Profiling started ({frames or 'all'} frames, sampling every {self.interval * 1000:g} ms)")
+        return True
+
+    def stop(self):
+        """Stop profiling and export what was collected; returns the report paths"""
+        with self.lock:
+            if not self.active:
+                return None
+            self.active = False
+        return self.finish()
+
+    def finish(self):
+        if self.sampler is not threading.current_thread():
+            self.sampler.join()
+        return self.export()
+
+    def exporting(self):
+        return self.exporter is not None and self.exporter.is_alive()
+
+    def close(self, timeout=None):
+        """Stop, and wait for a report still being written in the background"""
+        self.stop()
+        if self.exporting():
+            self.exporter.join(timeout)
+
+    def toggle(self, frames=None):
+        return self.stop() if self.active else self.start(frames)
+
+    def status(self):
+        return {
+            "active": self.active,
+            "frames": self.frames,
+            "frames_wanted": self.frames_wanted,
+            "samples": sum(self.samples.values()),
+            "last_report": self.last_report,
+        }
+
+    def frame(self):
+        """Mark a frame boundary in the bot loop"""
+        if not self.active:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.frame_times.append(now - self.frame_start)
+            self.frames += 1
+        self.frame_start = now
+        if self.frames_wanted and self.frames >= self.frames_wanted:
+            with self.lock:
+                if not self.active:
+                    return
+                self.active = False
+            # Writing the reports takes a while; the bot loop carries on meanwhile
+            self.exporter = threading.Thread(target=self.finish, name="profiler-export", daemon=True)
+            self.exporter.start()
+
+    # ----------------------------------------------------------------
+    # Stack sampling
+    # ----------------------------------------------------------------
+    def sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while self.active:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename == __file__ and code.co_name in HIDDEN_FRAMES:
+                        frame = frame.f_back
+                        continue
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    # ----------------------------------------------------------------
+    # Scoped timers
+    # ----------------------------------------------------------------
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def timed(self, name, fn):
+        """Wrap a callable so each call is timed as stage `name` while profiling"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.active:
+                return fn(*args, **kwargs)
+            with _Stage(self, name):
+                return fn(*args, **kwargs)
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    def instrument(self, obj, methods, prefix=None):
+        """Time the given methods (or callable attributes) of one object"""
+        prefix = prefix or type(obj).__name__
+        for method in methods:
+            fn = getattr(obj, method, None)
+            if callable(fn) and not hasattr(fn, "__wrapped__"):
+                setattr(obj, method, self.timed(f"{prefix}.{method}", fn))
+        return obj
+
+    def proxy(self, target, name, methods=()):
+        """Stand-in for an object whose methods cannot be replaced (cv2 objects,
+        callables with state): calling it is timed as `name`, the listed methods
+        as `name.method`, everything else passes straight through"""
+        return _Proxy(self, target, name, methods)
+
+    def record(self, name, elapsed, children):
+        self.stage_times[name].append(elapsed)
+        self.stage_self[name] += elapsed - children
+
+    # ----------------------------------------------------------------
+    # Reports
+    # ----------------------------------------------------------------
+    def summary(self):
+        duration = time.perf_counter() - self.started
+        frame_total = sum(self.frame_times) or duration
+        lines = [f"{self.frames} frames in {duration:.2f} s, {sum(self.samples.values())} stack samples"]
+        if self.frame_times:
+            ft = np.array(self.frame_times) * 1000
+            lines.append(f"frame time: mean {ft.mean():.1f} ms | p50 {np.percentile(ft, 50):.1f} | "
+                         f"p95 {np.percentile(ft, 95):.1f} | max {ft.max():.1f}")
+        lines.append(f"{'stage':<40} {'calls':>6} {'mean ms':>8} {'p95 ms':>8} {'max ms':>8} "
+                     f"{'total ms':>9} {'self ms':>8} {'self %':>7}")
+        order = sorted(self.stage_times, key=lambda name: -self.stage_self[name])
+        for name in order:
+            t = np.array(self.stage_times[name]) * 1000
+            own = self.stage_self[name] * 1000
+            lines.append(f"{name:<40} {len(t):>6} {t.mean():>8.2f} {np.percentile(t, 95):>8.2f} {t.max():>8.2f} "
+                         f"{t.sum():>9.1f} {own:>8.1f} {own / (frame_total * 1000) * 100:>6.1f}%")
+        return "\n".join(lines)
+
+    def export(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S"))
+        with open(base + ".folded", "w") as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+        summary = self.summary()
+        with open(base + ".txt", "w") as file:
+            file.write(summary + "\n")
+        print(summary)
+        print(f"Flame graph stacks: {base}.folded (e.g. flamegraph.pl {base}.folded > {base}.svg)")
+        self.last_report = base
+        return base
+
+    # ----------------------------------------------------------------
+    # Runtime controls
+    # ----------------------------------------------------------------
+    def install_signal(self, signum=signal.SIGUSR2, frames=None):
+        """`kill -USR2 <pid>` starts profiling, a second one stops and exports"""
+        def handler(signum, frame):
+            # Exporting from inside the handler could land mid-stage; do it on a thread
+            threading.Thread(target=self.toggle, args=(frames,), daemon=True).start()
+        signal.signal(signum, handler)
+
+    def serve(self, socket_path=SOCKET_PATH):
+        """Accept start/stop/status commands on a Unix socket from a background thread"""
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixServer(socket_path, _ControlHandler)
+        server.profiler = self
+        threading.Thread(target=server.serve_forever, name="profiler-control", daemon=True).start()
+        print(f"Profiler control socket: {socket_path}")
+        return server
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        local = self.profiler.local
+        if not hasattr(local, "children"):
+            local.children = []
+        local.children.append(0.0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        children = self.profiler.local.children
+        own_children = children.pop()
+        if children:
+            children[-1] += elapsed
+        self.profiler.record(self.name, elapsed, own_children)
+        return False
+
+
+class _Proxy:
+    def __init__(self, profiler, target, name, methods):
+        self._target = target
+        self._call = profiler.timed(name, target) if callable(target) else None
+        self._methods = {method: profiler.timed(f"{name}.{method}", getattr(target, method)) for method in methods}
+
+    def __call__(self, *args, **kwargs):
+        return self._call(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr in self._methods:
+            return self._methods[attr]
+        return getattr(self._target, attr)
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        profiler = self.server.profiler
+        for line in self.rfile:
+            message = json.loads(line)
+            cmd = message.get("cmd")
+            if cmd == "start":
+                reply = {"started": profiler.start(message.get("frames"))}
+            elif cmd == "stop":
+                reply = {"report": profiler.stop()}
+            elif cmd == "status":
+                reply = profiler.status()
+            else:
+                reply = {"error": f"unknown command: {cmd}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def instrument_bot(profiler, wincap, improc):
+    """Timers on the capture and detector methods the run scripts call"""
+    profiler.instrument(wincap, CAPTURE_METHODS)
+    # Front ends (scenegate.SceneGate, framecache.CachedImageProcessor) wrap the real processor
+    while "improc" in vars(improc):
+        profiler.instrument(improc, ("proccess_image",))
+        if "cache" in vars(improc):
+            profiler.instrument(improc.cache, ("key", "get", "put"))
+        if "classifier" in vars(improc):
+            improc.classifier = profiler.proxy(improc.classifier, "SceneClassifier")
+        improc = improc.improc
+    profiler.instrument(improc, PROCESSOR_METHODS)
+    if improc.net is not None:
+        improc.net = profiler.proxy(improc.net, "net", ("forward",))
+    improc.preprocess = profiler.proxy(improc.preprocess, "ImageProcessor.preprocess")
+    if improc.templates is not None:
+        improc.templates = profiler.proxy(improc.templates, "TemplateDetector")
+
+
+def send_command(cmd, socket_path=SOCKET_PATH, **fields):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    sock.sendall((json.dumps(dict(fields, cmd=cmd)) + "\n").encode())
+    reply = json.loads(sock.makefile("rb").readline())
+    sock.close()
+    return reply
+
+
+# ====================================================================
+# DEMO
+# ====================================================================
+def demo(frames=100, size=(800, 600), cfg_file=None, weights_file=None):
+    """Profile the detector on synthetic frames, as a live bot would be"""
+    from vision import ImageProcessor
+
+    class FakeCapture:
+        def get_screenshot(self, raw=False):
+            return np.random.default_rng().integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+
+    wincap = FakeCapture()
+    improc = ImageProcessor(size, cfg_file, weights_file, show=False)
+    profiler = Profiler()
+    instrument_bot(profiler, wincap, improc)
+    profiler.start(frames)
+    while profiler.active:
+        profiler.frame()
+        improc.proccess_image(wincap.get_screenshot(raw=True), "RGB")
+    profiler.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control or try out the bot profiler")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    start = sub.add_parser("start", help="start profiling a running bot")
+    start.add_argument("--frames", type=int, help="stop and export after this many frames")
+    sub.add_parser("stop", help="stop profiling and write the reports")
+    sub.add_parser("status")
+
+    run = sub.add_parser("demo", help="profile the detector on synthetic frames")
+    run.add_argument("--frames", type=int, default=100)
+    run.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    run.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    run.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+
+    args = parser.parse_args()
+    if args.command == "demo":
+        demo(args.frames, tuple(args.size), args.cfg, args.weights)
+    elif args.command == "start":
+        print(send_command("start", args.socket, frames=args.frames))
+    else:
+        print(send_command(args.command, args.socket))
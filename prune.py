@@ -0,0 +1,419 @@
+import argparse
+import os
+import re
+import subprocess
+import time
+
+import cv2 as cv
+import numpy as np
+
+PRUNED_DIR = "pruned"
+LEAKY_SLOPE = 0.1
+
+
+# ====================================================================
+# DARKNET CFG
+# ====================================================================
+def read_cfg(cfg_file):
+    """Sections of a Darknet cfg, keeping the raw lines so it can be written back as is"""
+    sections, preamble = [], []
+    with open(cfg_file, "r") as file:
+        for line in file:
+            stripped = line.split("#")[0].strip()
+            if stripped.startswith("["):
+                sections.append({"type": stripped[1:-1], "lines": [line], "options": {}})
+            elif sections:
+                sections[-1]["lines"].append(line)
+                if "=" in stripped:
+                    key, value = stripped.split("=", 1)
+                    sections[-1]["options"][key.strip()] = value.strip()
+            else:
+                preamble.append(line)
+    return preamble, sections
+
+
+def write_cfg(preamble, sections, filters, cfg_file):
+    """Write the cfg back with new filters= values for the layers in `filters`"""
+    with open(cfg_file, "w") as file:
+        file.writelines(preamble)
+        for index, section in enumerate(sections):
+            layer = index - 1
+            for line in section["lines"]:
+                if layer in filters and line.split("=")[0].strip() == "filters":
+                    line = f"filters={filters[layer]}\n"
+                file.write(line)
+
+
+def layer_refs(options, index):
+    return [int(v) if int(v) >= 0 else index + int(v) for v in options["layers"].split(",")]
+
+
+def trace(layers, in_channels=3, size=(416, 416)):
+    """Follow every channel through the network.
+
+    Returns, per layer, the sources of its input and output channels as
+    (conv layer, channel) pairs (("input", c) for the image) and the output
+    size, which is all pruning needs to know about routes, shortcuts,
+    maxpools and upsamples.
+    """
+    inputs, outputs, sizes = [], [], []
+    previous = [("input", c) for c in range(in_channels)]
+    w, h = size
+    for index, layer in enumerate(layers):
+        kind, options = layer["type"], layer["options"]
+        sources = previous
+        if kind == "convolutional":
+            if int(options.get("groups", 1)) != 1:
+                raise Exception(f"Layer {index}: grouped convolutions are not supported")
+            stride = int(options.get("stride", 1))
+            w, h = -(-w // stride), -(-h // stride)
+            out = [(index, c) for c in range(int(options["filters"]))]
+        elif kind == "route":
+            refs = layer_refs(options, index)
+            sources = [s for ref in refs for s in outputs[ref]]
+            out = sources
+            if "groups" in options:
+                groups, group_id = int(options["groups"]), int(options.get("group_id", 0))
+                part = len(sources) // groups
+                out = sources[group_id * part:(group_id + 1) * part]
+            w, h = sizes[refs[0]]
+        elif kind == "maxpool":
+            stride = int(options.get("stride", 1))
+            w, h = -(-w // stride), -(-h // stride)
+            out = sources
+        elif kind == "upsample":
+            stride = int(options.get("stride", 2))
+            w, h = w * stride, h * stride
+            out = sources
+        elif kind == "shortcut":
+            if "weights_type" in options:
+                raise Exception(f"Layer {index}: weighted shortcuts are not supported")
+            # Channel c is the sum of the previous layer's and the `from` layer's
+            # channel c; the previous layer's source stands for both
+            refs = layer_refs({"layers": options["from"]}, index)
+            if len(outputs[refs[0]]) != len(sources):
+                raise Exception(f"Layer {index}: shortcut from layer {refs[0]} has a different channel count")
+            out = sources
+        elif kind == "yolo":
+            out = sources
+        else:
+            raise Exception(f"Layer {index}: [{kind}] layers are not supported")
+        inputs.append(sources)
+        outputs.append(out)
+        sizes.append((w, h))
+        previous = out
+    return inputs, outputs, sizes
+
+
+# ====================================================================
+# DARKNET WEIGHTS
+# ====================================================================
+def _long_seen(major, minor):
+    return major * 10 + minor >= 2 and major < 1000 and minor < 1000
+
+
+def read_weights(weights_file, layers, inputs):
+    """Per-conv arrays from a .weights file: bias, and for batch-normalized
+    layers scale/mean/var, plus the kernel as (out, in, k, k)"""
+    with open(weights_file, "rb") as file:
+        major, minor, revision = np.fromfile(file, dtype=np.int32, count=3)
+        seen = int(np.fromfile(file, dtype=np.int64 if _long_seen(major, minor) else np.int32, count=1)[0])
+        data = np.fromfile(file, dtype=np.float32)
+
+    params, offset = {}, 0
+
+    def take(count):
+        nonlocal offset
+        if offset + count > len(data):
+            raise Exception(f"{weights_file} is too short for this cfg")
+        values = data[offset:offset + count]
+        offset += count
+        return values.copy()
+
+    for index, layer in enumerate(layers):
+        if layer["type"] != "convolutional":
+            continue
+        options = layer["options"]
+        filters, k = int(options["filters"]), int(options["size"])
+        conv = {"bn": int(options.get("batch_normalize", 0)) == 1}
+        conv["bias"] = take(filters)
+        if conv["bn"]:
+            conv["scale"], conv["mean"], conv["var"] = take(filters), take(filters), take(filters)
+        conv["weight"] = take(filters * len(inputs[index]) * k * k).reshape(filters, len(inputs[index]), k, k)
+        params[index] = conv
+    if offset != len(data):
+        print(f"Warning: {len(data) - offset} unused values at the end of {weights_file}")
+    return (int(major), int(minor), int(revision), seen), params
+
+
+def write_weights(weights_file, header, params):
+    major, minor, revision, seen = header
+    with open(weights_file, "wb") as file:
+        np.array([major, minor, revision], dtype=np.int32).tofile(file)
+        np.array([seen], dtype=np.int64 if _long_seen(major, minor) else np.int32).tofile(file)
+        for index in sorted(params):
+            conv = params[index]
+            parts = [conv["bias"]]
+            if conv["bn"]:
+                parts += [conv["scale"], conv["mean"], conv["var"]]
+            for part in parts + [conv["weight"]]:
+                np.ascontiguousarray(part, dtype=np.float32).tofile(file)
+
+
+# ====================================================================
+# PRUNING
+# ====================================================================
+def split_layers(layers, outputs):
+    """Convs whose output a grouped route splits into equal parts: they must
+    keep the same number of channels in each part. Convs feeding a grouped
+    route through a concat, and convs added together by a shortcut (which
+    would have to drop the same channels), are left alone."""
+    split, frozen = {}, set()
+    for index, layer in enumerate(layers):
+        if layer["type"] == "shortcut":
+            refs = [index - 1] + layer_refs({"layers": layer["options"]["from"]}, index)
+            frozen |= {source[0] for ref in refs for source in outputs[ref]}
+        elif layer["type"] == "route" and "groups" in layer["options"]:
+            refs = layer_refs(layer["options"], index)
+            owners = {source[0] for ref in refs for source in outputs[ref]}
+            if len(owners) == 1 and layers[refs[0]]["type"] == "convolutional":
+                split[refs[0]] = int(layer["options"]["groups"])
+            else:
+                frozen |= owners
+    return split, frozen
+
+
+def prunable_layers(layers, outputs):
+    """Batch-normalized convs not feeding a [yolo] layer directly"""
+    split, frozen = split_layers(layers, outputs)
+    prunable = []
+    for index, layer in enumerate(layers):
+        if layer["type"] != "convolutional" or int(layer["options"].get("batch_normalize", 0)) != 1:
+            continue
+        if index in frozen or (index + 1 < len(layers) and layers[index + 1]["type"] == "yolo"):
+            continue
+        prunable.append(index)
+    return prunable, split
+
+
+def choose_channels(params, prunable, split, ratio, min_keep=0.1, multiple=8):
+    """Channels to keep per layer, by batch-norm gamma magnitude.
+
+    One global threshold removes `ratio` of all prunable channels (network
+    slimming); every layer keeps at least `min_keep` of its channels, and
+    counts are rounded up to `multiple` so the convolutions stay SIMD-friendly.
+    """
+    gammas = np.concatenate([np.abs(params[i]["scale"]) for i in prunable])
+    threshold = np.quantile(gammas, ratio) if ratio > 0 else -1
+    masks = {}
+    for index in prunable:
+        gamma = np.abs(params[index]["scale"])
+        filters = len(gamma)
+        keep = max(int((gamma > threshold).sum()), int(np.ceil(filters * min_keep)), 1)
+        parts = split.get(index, 1)
+        part = filters // parts
+        step = max(1, multiple // parts)
+        per_part = -(-keep // parts)
+        per_part = min(part, -(-per_part // step) * step)
+        chosen = []
+        for p in range(parts):
+            order = np.argsort(-gamma[p * part:(p + 1) * part])[:per_part]
+            chosen.extend(sorted(p * part + order))
+        masks[index] = np.array(chosen, dtype=np.int64)
+    return masks
+
+
+def activate(x, activation):
+    if activation == "leaky":
+        return np.where(x > 0, x, x * LEAKY_SLOPE)
+    if activation == "relu":
+        return np.maximum(x, 0)
+    if activation == "linear":
+        return x
+    if activation == "mish":
+        return x * np.tanh(np.log1p(np.exp(x)))
+    raise Exception(f"Unsupported activation: {activation}")
+
+
+def prune_params(layers, inputs, params, masks):
+    """Slice every conv to the kept channels.
+
+    A removed channel with a tiny gamma outputs almost exactly
+    activation(beta) everywhere, so its contribution to each consumer is
+    folded into that consumer's running mean (or bias) rather than lost.
+    """
+    pruned = {}
+    for index, conv in params.items():
+        sources = inputs[index]
+        keep_in, constants = [], np.zeros(len(sources), dtype=np.float32)
+        for position, (owner, channel) in enumerate(sources):
+            if owner == "input" or owner not in masks or channel in set(masks[owner].tolist()):
+                keep_in.append(position)
+            else:
+                beta = params[owner]["bias"][channel]
+                constants[position] = activate(beta, layers[owner]["options"].get("activation", "linear"))
+
+        shift = np.einsum("oikl,i->o", conv["weight"], constants)
+        keep_out = masks.get(index, np.arange(conv["weight"].shape[0]))
+        new = {"bn": conv["bn"], "bias": conv["bias"].copy()}
+        if conv["bn"]:
+            new["scale"], new["var"] = conv["scale"].copy(), conv["var"].copy()
+            new["mean"] = conv["mean"] - shift
+        else:
+            new["bias"] += shift
+        for key in ("bias", "scale", "mean", "var"):
+            if key in new:
+                new[key] = new[key][keep_out]
+        new["weight"] = conv["weight"][keep_out][:, keep_in]
+        pruned[index] = new
+    return pruned
+
+
+def prune(cfg_file, weights_file, ratio, out_dir=PRUNED_DIR, min_keep=0.1, multiple=8):
+    """Write a slimmer cfg/weights pair; returns their paths"""
+    preamble, sections = read_cfg(cfg_file)
+    net, layers = sections[0]["options"], sections[1:]
+    size = (int(net.get("width", 416)), int(net.get("height", 416)))
+    inputs, outputs, _ = trace(layers, int(net.get("channels", 3)), size)
+    header, params = read_weights(weights_file, layers, inputs)
+
+    prunable, split = prunable_layers(layers, outputs)
+    masks = choose_channels(params, prunable, split, ratio, min_keep, multiple)
+    pruned = prune_params(layers, inputs, params, masks)
+
+    os.makedirs(out_dir, exist_ok=True)
+    stem = f"{os.path.splitext(os.path.basename(cfg_file))[0]}-p{round(ratio * 100):02d}"
+    out_cfg = os.path.join(out_dir, stem + ".cfg")
+    out_weights = os.path.join(out_dir, stem + ".weights")
+    write_cfg(preamble, sections, {i: len(m) for i, m in masks.items()}, out_cfg)
+    write_weights(out_weights, header, pruned)
+    return out_cfg, out_weights
+
+
+def model_stats(cfg_file, weights_file=None):
+    """GFLOPs and parameter count at the cfg's input size"""
+    _, sections = read_cfg(cfg_file)
+    net, layers = sections[0]["options"], sections[1:]
+    size = (int(net.get("width", 416)), int(net.get("height", 416)))
+    inputs, _, sizes = trace(layers, int(net.get("channels", 3)), size)
+    total_flops, total_params = 0, 0
+    for index, layer in enumerate(layers):
+        if layer["type"] != "convolutional":
+            continue
+        options = layer["options"]
+        k, filters = int(options["size"]), int(options["filters"])
+        w, h = sizes[index]
+        total_flops += 2 * k * k * len(inputs[index]) * filters * w * h
+        total_params += k * k * len(inputs[index]) * filters + filters * (4 if options.get("batch_normalize") else 1)
+    return total_flops / 1e9, total_params, size
+
+
+# ====================================================================
+# MEASURING
+# ====================================================================
+def latency(cfg_file, weights_file, size, runs=30):
+    net = cv.dnn.readNetFromDarknet(cfg_file, weights_file)
+    names = net.getLayerNames()
+    out_layers = [names[i - 1] for i in net.getUnconnectedOutLayers()]
+    blob = np.random.default_rng(0).random((1, 3, size[1], size[0]), dtype=np.float32)
+    net.setInput(blob)
+    net.forward(out_layers)
+    start = time.perf_counter()
+    for _ in range(runs):
+        net.setInput(blob)
+        net.forward(out_layers)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def score_drift(reference, candidate, size, image="screenshot.png"):
+    """Largest change in any box's confidence on a sample frame, a quick
+    fidelity check when there is no labelled test set"""
+    img = cv.imread(image) if os.path.exists(image) else None
+    if img is None:
+        img = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    blob = cv.dnn.blobFromImage(img, 1/255.0, size, swapRB=True, crop=False)
+    scores = []
+    for cfg_file, weights_file in (reference, candidate):
+        net = cv.dnn.readNetFromDarknet(cfg_file, weights_file)
+        names = net.getLayerNames()
+        net.setInput(blob)
+        outputs = np.vstack(net.forward([names[i - 1] for i in net.getUnconnectedOutLayers()]))
+        # OpenCV's region layer has already multiplied the class scores by objectness
+        scores.append(outputs[:, 5:])
+    return float(np.abs(scores[0] - scores[1]).max())
+
+
+def finetune(darknet, data_file, cfg_file, weights_file, batches=500):
+    """Short darknet training run from the pruned weights; returns the final weights"""
+    backup = "backup"
+    with open(data_file, "r") as file:
+        for line in file:
+            if line.split("=")[0].strip() == "backup":
+                backup = line.split("=", 1)[1].strip()
+
+    tune_cfg = os.path.splitext(cfg_file)[0] + "-ft.cfg"
+    with open(cfg_file, "r") as file:
+        content = file.read()
+    content = re.sub(r"^max_batches\s*=.*$", f"max_batches = {batches}", content, flags=re.MULTILINE)
+    content = re.sub(r"^steps\s*=.*$", f"steps={int(batches * 0.8)},{int(batches * 0.9)}", content, flags=re.MULTILINE)
+    content = re.sub(r"^burn_in\s*=.*$", "burn_in=0", content, flags=re.MULTILINE)
+    with open(tune_cfg, "w") as file:
+        file.write(content)
+
+    subprocess.run([darknet, "detector", "train", data_file, tune_cfg, weights_file, "-dont_show", "-clear"],
+                   check=True)
+    return tune_cfg, os.path.join(backup, os.path.splitext(os.path.basename(tune_cfg))[0] + "_final.weights")
+
+
+def compare(cfg_file, weights_file, ratios, out_dir=PRUNED_DIR, min_keep=0.1, multiple=8, test=None, root=".",
+            names="yolov4-tiny/obj.names", darknet=None, data_file=None, finetune_batches=500):
+    models = [("original", cfg_file, weights_file)]
+    for ratio in ratios:
+        pruned_cfg, pruned_weights = prune(cfg_file, weights_file, ratio, out_dir, min_keep, multiple)
+        models.append((f"pruned {ratio:.0%}", pruned_cfg, pruned_weights))
+        if darknet:
+            tuned_cfg, tuned_weights = finetune(darknet, data_file, pruned_cfg, pruned_weights, finetune_batches)
+            models.append((f"pruned {ratio:.0%} + ft", tuned_cfg, tuned_weights))
+
+    images = classes = None
+    if test:
+        from evaluate import evaluate, load_test_list
+        images = load_test_list(test, root)
+        with open(names, "r") as file:
+            classes = {i: line.strip() for i, line in enumerate(file) if line.strip()}
+
+    print(f"{'model':<22} {'GFLOPs':>7} {'params':>9} {'latency ms':>11} {'speedup':>8} {'drift':>7} {'mAP@0.5':>8}")
+    base_latency = None
+    for name, model_cfg, model_weights in models:
+        gflops, params, size = model_stats(model_cfg)
+        ms = latency(model_cfg, model_weights, size)
+        base_latency = base_latency or ms
+        drift = score_drift((cfg_file, weights_file), (model_cfg, model_weights), size)
+        map50 = "-"
+        if images:
+            map50 = f"{evaluate(model_cfg, model_weights, images, classes)['map50']:.3f}"
+        print(f"{name:<22} {gflops:>7.2f} {params:>9,} {ms:>11.1f} {base_latency / ms:>7.2f}x {drift:>7.3f} "
+              f"{map50:>8}")
+        print(f"{'':<22} {model_cfg} / {model_weights}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune yolov4-tiny channels by batch-norm gamma and write a slim "
+                                                 "cfg/weights pair")
+    parser.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    parser.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.3, 0.5, 0.7],
+                        help="fractions of the prunable channels to remove")
+    parser.add_argument("--out", default=PRUNED_DIR)
+    parser.add_argument("--min-keep", type=float, default=0.1, help="fraction of every layer always kept")
+    parser.add_argument("--multiple", type=int, default=8, help="round channel counts up to this")
+    parser.add_argument("--test", help="darknet test list for mAP, e.g. data/test.txt")
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--names", default="yolov4-tiny/obj.names")
+    parser.add_argument("--finetune", metavar="DARKNET", help="darknet binary for a short fine-tune of each model")
+    parser.add_argument("--data", default="yolov4-tiny/obj.data")
+    parser.add_argument("--finetune-batches", type=int, default=500)
+    args = parser.parse_args()
+
+    compare(args.cfg, args.weights, args.ratios, args.out, args.min_keep, args.multiple, args.test, args.root,
+            args.names, args.finetune, args.data, args.finetune_batches)
@@ -0,0 +1,233 @@
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+# OpenCV's own pool (pthreads/TBB/OpenMP, depending on the build) follows
+# cv.setNumThreads; these cover OpenMP and BLAS libraries loaded alongside it.
+# They are only read when a library initializes, so they take effect in
+# child processes or when set before cv2 is imported.
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+CAP_SYS_NICE = 23
+
+
+# ====================================================================
+# THREAD / CPU / PRIORITY CONTROLS
+# ====================================================================
+def thread_env(threads):
+    """Environment for a child process limited to `threads` compute threads"""
+    env = {var: str(threads) for var in THREAD_ENV_VARS}
+    # Idle OpenMP workers spin by default, stealing cycles from other bots
+    env["OMP_WAIT_POLICY"] = "PASSIVE"
+    return env
+
+
+def limit_threads(threads):
+    """Limit OpenCV (and OpenMP/BLAS in future child processes) to `threads` threads"""
+    os.environ.update(thread_env(threads))
+    cv.setNumThreads(threads)
+
+
+def available_cpus():
+    return sorted(os.sched_getaffinity(0))
+
+
+def pin_to_cpus(cpus, tid=0):
+    """Pin a process, or a single thread by native ID, to a set of CPUs"""
+    os.sched_setaffinity(tid, set(cpus))
+
+
+def set_niceness(nice, tid=0):
+    """Set the niceness of a process or thread; returns False if not permitted.
+
+    Raising niceness is always allowed, lowering it again needs CAP_SYS_NICE
+    (or a raised RLIMIT_NICE).
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, nice)
+        return True
+    except PermissionError:
+        return False
+
+
+def may_lower_niceness(nice):
+    """Whether a thread that was reniced up may go back down to `nice`:
+    needs CAP_SYS_NICE or an RLIMIT_NICE soft limit of at least 20 - nice"""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("CapEff:") and int(line.split()[1], 16) >> CAP_SYS_NICE & 1:
+                    return True
+    except OSError:
+        pass
+    limit = resource.getrlimit(resource.RLIMIT_NICE)[0]
+    return limit == resource.RLIM_INFINITY or limit >= 20 - nice
+
+
+def split_cpus(bots, threads_per_bot=None, cpus=None):
+    """Split the CPUs into one contiguous set per bot.
+
+    With threads_per_bot given, each bot gets that many CPUs, wrapping
+    around when the host does not have enough; otherwise the CPUs are
+    divided as evenly as possible.
+    """
+    cpus = cpus or available_cpus()
+    if threads_per_bot is None:
+        size, extra = divmod(len(cpus), bots)
+        sets, start = [], 0
+        for i in range(bots):
+            end = start + max(1, size + (1 if i < extra else 0))
+            sets.append([cpus[j % len(cpus)] for j in range(start, end)])
+            start = end
+        return sets
+    return [
+        [cpus[(i * threads_per_bot + j) % len(cpus)] for j in range(threads_per_bot)]
+        for i in range(bots)
+    ]
+
+
+class ResourceConfig:
+    """CPU budget for one bot (or the detector daemon).
+
+    threads   - OpenCV/OpenMP compute threads (None leaves the default: all cores)
+    cpus      - CPU IDs to pin to (None leaves the affinity alone)
+    nice      - niceness while the bot is active
+    idle_nice - niceness while the bot has nothing to do (None disables)
+    """
+
+    def __init__(self, threads=None, cpus=None, nice=None, idle_nice=None):
+        self.threads = threads
+        self.cpus = cpus
+        self.nice = nice
+        self.idle_nice = idle_nice
+        self.idle = False
+
+    def apply(self, tid=0):
+        """Apply to the whole process (tid=0) or to one thread"""
+        if self.threads is not None:
+            limit_threads(self.threads)
+        if self.cpus:
+            pin_to_cpus(self.cpus, tid)
+        if self.nice is not None:
+            set_niceness(self.nice, tid)
+
+    def apply_to_current_thread(self):
+        """Pin and renice only the calling thread (cv.setNumThreads stays process-wide)"""
+        tid = threading.get_native_id()
+        if self.cpus:
+            pin_to_cpus(self.cpus, tid)
+        if self.nice is not None:
+            set_niceness(self.nice, tid)
+
+    def set_idle(self, idle, tid=0):
+        """Switch between nice and idle_nice; a no-op when idle_nice is unset.
+
+        If the switch is refused, idle renicing is turned off rather than
+        retried on every frame.
+        """
+        if self.idle_nice is None or idle == self.idle:
+            return
+        nice = self.idle_nice if idle else (self.nice or 0)
+        if set_niceness(nice, tid):
+            self.idle = idle
+        else:
+            print(f"Not allowed to set niceness {nice}, idle renicing disabled")
+            self.idle_nice = None
+
+    def describe(self):
+        threads = self.threads if self.threads is not None else "default"
+        cpus = ",".join(map(str, self.cpus)) if self.cpus else "any"
+        return f"threads={threads} cpus={cpus} nice={self.nice} idle_nice={self.idle_nice}"
+
+
+def parse_cpu_list(text):
+    """Parse a CPU list like '0-3,6' into [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in text.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+# ====================================================================
+# BENCHMARK (BOTS x THREADS)
+# ====================================================================
+def _benchmark_bot(cfg_file, weights_file, size, threads, cpus, seconds, start_at, results):
+    from vision import ImageProcessor
+
+    ResourceConfig(threads=threads, cpus=cpus).apply()
+    improc = ImageProcessor(size, cfg_file, weights_file, show=False)
+    img = np.random.default_rng(os.getpid()).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+
+    improc.proccess_image(img)
+    # Start all bots together so they really compete for the CPUs
+    time.sleep(max(0.0, start_at - time.time()))
+
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        improc.proccess_image(img)
+        latencies.append(time.perf_counter() - start)
+    results.put(latencies)
+
+
+def benchmark(cfg_file, weights_file, size=(800, 600), seconds=5.0, max_bots=None):
+    """Try every bots x threads split that fits on this host and report throughput"""
+    cpus = available_cpus()
+    max_bots = max_bots or len(cpus)
+    ctx = mp.get_context("spawn")
+
+    rows = []
+    for bots in range(1, max_bots + 1):
+        for threads in range(1, len(cpus) // bots + 1):
+            cpu_sets = split_cpus(bots, threads, cpus)
+            results = ctx.Queue()
+            start_at = time.time() + 3.0
+            env = os.environ.copy()
+            # Spawned children import cv2 fresh, so the thread env applies to them
+            os.environ.update(thread_env(threads))
+            procs = [
+                ctx.Process(target=_benchmark_bot,
+                            args=(cfg_file, weights_file, size, threads, cpu_set, seconds, start_at, results))
+                for cpu_set in cpu_sets
+            ]
+            for proc in procs:
+                proc.start()
+            os.environ.clear()
+            os.environ.update(env)
+
+            latencies = [results.get() for _ in procs]
+            for proc in procs:
+                proc.join()
+
+            fps = sum(len(lat) for lat in latencies) / seconds
+            p95 = np.percentile(np.concatenate(latencies), 95) * 1000
+            rows.append((bots, threads, fps, fps / bots, p95))
+            print(f"bots={bots:<3} threads={threads:<3} total {fps:6.1f} FPS | per bot {fps / bots:5.1f} FPS | p95 {p95:6.1f} ms")
+
+    best = max(rows, key=lambda row: row[2])
+    print("-" * 60)
+    print(f"Best throughput: {best[0]} bots x {best[1]} threads -> {best[2]:.1f} FPS (p95 {best[4]:.1f} ms)")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the throughput-optimal bots x threads split on this host")
+    parser.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    parser.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--max-bots", type=int)
+    args = parser.parse_args()
+
+    benchmark(args.cfg, args.weights, tuple(args.size), args.seconds, args.max_bots)
@@ -0,0 +1,295 @@
+import argparse
+import collections
+import glob
+import os
+import shutil
+import time
+
+import cv2 as cv
+import numpy as np
+
+SCENE_MODEL = "scenes.npz"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+UNKNOWN = "unknown"
+
+# What to run for each scene: the YOLO detector, only the UI templates, or nothing.
+# Scenes missing here (and "unknown") run the detector, so a bad model never hides pigs.
+ACTIONS = ("detect", "ui", "skip")
+DEFAULT_POLICY = {
+    "gameplay": "detect",
+    "dialog": "ui",
+    "reward": "ui",
+    "lobby": "skip",
+    "menu": "skip",
+    "loading": "skip",
+    "disconnect": "skip",
+}
+HSV_CONVERSIONS = {
+    "BGR": cv.COLOR_BGR2HSV,
+    "BGRA": cv.COLOR_BGR2HSV,
+    "RGB": cv.COLOR_RGB2HSV,
+    "RGBA": cv.COLOR_RGB2HSV,
+}
+
+
+# ====================================================================
+# FEATURES
+# ====================================================================
+def scene_features(img, channel_order="BGR", size=(64, 36), grid=4):
+    """Colour histogram plus a coarse brightness layout of a tiny copy of the frame.
+
+    A hue/saturation histogram of the coloured pixels plus a brightness
+    histogram of the grey ones tells grass from menus from black loading
+    screens; the grid of mean brightness separates screens that share
+    a palette but not a layout (a dialog over the map). Square roots turn
+    histogram comparison into a plain Euclidean distance (Hellinger).
+    """
+    step = max(1, min(img.shape[0] // size[1], img.shape[1] // size[0]) // 2)
+    small = cv.resize(img[::step, ::step, :3], size, interpolation=cv.INTER_AREA)
+    hsv = cv.cvtColor(small, HSV_CONVERSIONS[channel_order])
+    # Hue is noise on grey and dark pixels (and JPEG makes plenty of those), so
+    # they only count towards a brightness histogram
+    coloured = ((hsv[..., 1] >= 40) & (hsv[..., 2] >= 40)).astype(np.uint8)
+    hue = cv.calcHist([hsv], [0, 1], coloured, [18, 3], [0, 180, 40, 256]).ravel()
+    grey = cv.calcHist([hsv], [2], 1 - coloured, [8], [0, 256]).ravel()
+    hist = np.concatenate([hue, grey])
+    hist = np.sqrt(hist / hist.sum())
+    layout = cv.resize(hsv[..., 2], (grid, grid), interpolation=cv.INTER_AREA).ravel() / 255.0
+    return np.concatenate([hist, layout * 0.5]).astype(np.float32)
+
+
+# ====================================================================
+# CLASSIFIER
+# ====================================================================
+def load_labelled(image_dir):
+    """images/<scene>/*.png -> (paths, labels)"""
+    paths, labels = [], []
+    for label in sorted(os.listdir(image_dir)):
+        folder = os.path.join(image_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        for path in sorted(glob.glob(os.path.join(folder, "*"))):
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(path)
+                labels.append(label)
+    if not paths:
+        raise Exception(f"No labelled frames in {image_dir}/ (expected {image_dir}/<scene>/*.png)")
+    return paths, labels
+
+
+class SceneClassifier:
+    """k-nearest-neighbour vote over the feature vectors of labelled frames.
+
+    Frames further than max_distance from every example are "unknown".
+    """
+
+    def __init__(self, features, labels, names, k=3, max_distance=None):
+        self.features = np.asarray(features, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.names = list(names)
+        self.k = k
+        self.max_distance = max_distance
+        self.norms = (self.features ** 2).sum(axis=1)
+
+    @classmethod
+    def train(cls, image_dir, k=3):
+        paths, labels = load_labelled(image_dir)
+        names = sorted(set(labels))
+        features = []
+        for path in paths:
+            img = cv.imread(path)
+            if img is None:
+                raise Exception(f"Could not read {path}")
+            features.append(scene_features(img))
+        classifier = cls(features, [names.index(label) for label in labels], names, k)
+        classifier.max_distance = classifier.calibrate_distance()
+        return classifier
+
+    def calibrate_distance(self, slack=2.0):
+        """Twice the 95th percentile distance from each example to its nearest same-scene neighbour"""
+        distances = self.distances(self.features)
+        np.fill_diagonal(distances, np.inf)
+        same = self.labels[:, None] == self.labels[None, :]
+        nearest = np.where(same, distances, np.inf).min(axis=1)
+        nearest = nearest[np.isfinite(nearest)]
+        return float(np.percentile(nearest, 95) * slack) if len(nearest) else None
+
+    def distances(self, features):
+        features = np.atleast_2d(features)
+        squared = (features ** 2).sum(axis=1)[:, None] + self.norms[None, :] - 2 * features @ self.features.T
+        return np.sqrt(np.maximum(squared, 0))
+
+    def predict_features(self, features):
+        distances = self.distances(features)[0]
+        nearest = np.argsort(distances)[:self.k]
+        if self.max_distance is not None and distances[nearest[0]] > self.max_distance:
+            return UNKNOWN, float(distances[nearest[0]])
+        votes = collections.Counter(self.labels[nearest].tolist())
+        return self.names[votes.most_common(1)[0][0]], float(distances[nearest[0]])
+
+    def __call__(self, img, channel_order="BGR"):
+        """(scene label, distance to the closest example)"""
+        return self.predict_features(scene_features(img, channel_order))
+
+    def save(self, path=SCENE_MODEL):
+        np.savez_compressed(path, features=self.features, labels=self.labels, names=np.array(self.names),
+                            k=self.k, max_distance=np.nan if self.max_distance is None else self.max_distance)
+
+    @classmethod
+    def load(cls, path=SCENE_MODEL):
+        data = np.load(path)
+        max_distance = float(data["max_distance"])
+        return cls(data["features"], data["labels"], data["names"].tolist(), int(data["k"]),
+                   None if np.isnan(max_distance) else max_distance)
+
+
+# ====================================================================
+# GATE
+# ====================================================================
+class SceneGate:
+    """Classifies each frame first and only runs the detectors the scene needs.
+
+    Drop-in for ImageProcessor.proccess_image. The last scene is kept in
+    `scene` (and its action in `action`) for the action loop, e.g. to stop
+    clicking on a disconnect dialog.
+    """
+
+    def __init__(self, improc, classifier, policy=None):
+        self.improc = improc
+        self.classifier = classifier
+        self.policy = dict(DEFAULT_POLICY, **(policy or {}))
+        self.scene = UNKNOWN
+        self.action = "detect"
+        self.scene_counts = collections.Counter()
+        self.action_counts = collections.Counter()
+        self.classify_time = 0.0
+
+    def __getattr__(self, attr):
+        return getattr(self.improc, attr)
+
+    def proccess_image(self, img, channel_order="BGR"):
+        start = time.perf_counter()
+        self.scene, _ = self.classifier(img, channel_order)
+        self.classify_time += time.perf_counter() - start
+        self.action = self.policy.get(self.scene, "detect")
+        self.scene_counts[self.scene] += 1
+        self.action_counts[self.action] += 1
+
+        if self.action == "detect":
+            # A detection cache behind the gate only caches static scenes
+            if getattr(self.improc, "takes_scene", False):
+                return self.improc.proccess_image(img, channel_order, scene=self.scene)
+            return self.improc.proccess_image(img, channel_order)
+        coordinates = []
+        if self.action == "ui" and self.improc.templates is not None:
+            # Same ROI and offset as a full proccess_image
+            view, origin, size = self.improc.crop_roi(img)
+            coordinates = self.improc.match_templates(view, channel_order, origin, size)
+        if self.improc.show:
+            self.improc.draw_identified_objects(self.improc.display_image(img, channel_order), coordinates)
+        return coordinates
+
+    def get_stats(self):
+        frames = sum(self.scene_counts.values())
+        return {
+            "frames": frames,
+            "scenes": dict(self.scene_counts),
+            "actions": dict(self.action_counts),
+            "forward_passes_avoided": 1 - self.action_counts["detect"] / frames if frames else 0.0,
+            "classify_ms": self.classify_time / frames * 1000 if frames else 0.0,
+        }
+
+
+def format_stats(stats):
+    scenes = ", ".join(f"{name} {count}" for name, count in sorted(stats["scenes"].items()))
+    return (f"scenes: {scenes} | {stats['forward_passes_avoided']:.1%} of forward passes avoided | "
+            f"classifier {stats['classify_ms']:.2f} ms/frame")
+
+
+# ====================================================================
+# TOOLS
+# ====================================================================
+def cluster_frames(image_dir, out_dir, clusters=8):
+    """Group unlabelled frames (as saved by generate_image_dataset) by look,
+    so labelling is renaming a handful of folders"""
+    paths = [p for p in sorted(glob.glob(os.path.join(image_dir, "*"))) if p.lower().endswith(IMAGE_EXTENSIONS)]
+    if len(paths) < clusters:
+        raise Exception(f"Need at least {clusters} frames in {image_dir}/, found {len(paths)}")
+    features = np.array([scene_features(cv.imread(p)) for p in paths], dtype=np.float32)
+    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 100, 1e-4)
+    _, assignment, _ = cv.kmeans(features, clusters, None, criteria, 5, cv.KMEANS_PP_CENTERS)
+    for path, cluster in zip(paths, assignment.ravel()):
+        folder = os.path.join(out_dir, f"cluster_{cluster}")
+        os.makedirs(folder, exist_ok=True)
+        shutil.copy(path, folder)
+    counts = collections.Counter(assignment.ravel().tolist())
+    for cluster in sorted(counts):
+        print(f"{out_dir}/cluster_{cluster}: {counts[cluster]} frames")
+    print(f"Rename the folders to scene names ({', '.join(DEFAULT_POLICY)}, ...), merge or delete them, then train")
+
+
+def holdout_report(image_dir, k=3, test_fraction=0.25, seed=0):
+    """Accuracy on held-out frames and the classifier's own cost"""
+    paths, labels = load_labelled(image_dir)
+    names = sorted(set(labels))
+    frames = [cv.imread(p) for p in paths]
+    features = np.array([scene_features(f) for f in frames])
+    order = np.random.default_rng(seed).permutation(len(paths))
+    split = max(1, int(len(paths) * test_fraction))
+    test, train = order[:split], order[split:]
+    classifier = SceneClassifier(features[train], [names.index(labels[i]) for i in train], names, k)
+    classifier.max_distance = classifier.calibrate_distance()
+
+    confusion = collections.Counter()
+    start = time.perf_counter()
+    for i in test:
+        predicted, _ = classifier(frames[i])
+        confusion[(labels[i], predicted)] += 1
+    elapsed = (time.perf_counter() - start) / len(test) * 1000
+
+    correct = sum(count for (truth, predicted), count in confusion.items() if truth == predicted)
+    print(f"held-out accuracy: {correct / len(test):.1%} on {len(test)} frames | {elapsed:.2f} ms/frame")
+    for (truth, predicted), count in sorted(confusion.items()):
+        if truth != predicted:
+            print(f"  {truth} -> {predicted}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scene classifier that decides which detectors run per frame")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cluster = sub.add_parser("cluster", help="sort unlabelled frames into look-alike folders to label")
+    cluster.add_argument("--images", default="images")
+    cluster.add_argument("--out", default="images/scenes")
+    cluster.add_argument("--clusters", type=int, default=8)
+
+    train = sub.add_parser("train", help="build the classifier from images/<scene>/ folders")
+    train.add_argument("--images", default="images/scenes")
+    train.add_argument("--model", default=SCENE_MODEL)
+    train.add_argument("-k", type=int, default=3)
+
+    check = sub.add_parser("eval", help="held-out accuracy and cost")
+    check.add_argument("--images", default="images/scenes")
+    check.add_argument("-k", type=int, default=3)
+
+    classify = sub.add_parser("classify")
+    classify.add_argument("images", nargs="+")
+    classify.add_argument("--model", default=SCENE_MODEL)
+
+    args = parser.parse_args()
+    if args.command == "cluster":
+        cluster_frames(args.images, args.out, args.clusters)
+    elif args.command == "train":
+        classifier = SceneClassifier.train(args.images, args.k)
+        classifier.save(args.model)
+        limit = "no unknown limit" if classifier.max_distance is None else \
+            f"unknown beyond distance {classifier.max_distance:.3f}"
+        print(f"{len(classifier.labels)} frames of {', '.join(classifier.names)} -> {args.model} ({limit})")
+    elif args.command == "eval":
+        holdout_report(args.images, args.k)
+    else:
+        classifier = SceneClassifier.load(args.model)
+        for path in args.images:
+            scene, distance = classifier(cv.imread(path))
+            action = DEFAULT_POLICY.get(scene, "detect")
+            print(f"{path}: {scene} (distance {distance:.3f}) -> {action}")
@@ -0,0 +1,182 @@
+import argparse
+import re
+import subprocess
+
+# ====================================================================
+# MONITOR LAYOUT
+# ====================================================================
+# " 1: +HDMI-1 1920/527x1080/296+2560+0  HDMI-1"
+XRANDR_MONITOR = re.compile(r'^\s*\d+:\s+\+?(\*?)(\S+)\s+(\d+)/(\d+)x(\d+)/(\d+)([+-]\d+)([+-]\d+)')
+
+
+def _dpi_scale(pixels, millimeters):
+    """Desktop scale factor implied by a monitor's pixel density, in steps of 0.25"""
+    if not millimeters:
+        return 1.0
+    dpi = pixels / (millimeters / 25.4)
+    return max(1.0, round(dpi / 96 * 4) / 4)
+
+
+def xrandr_monitors():
+    """Monitors from `xrandr --listmonitors`, in root window pixels"""
+    try:
+        result = subprocess.run(['xrandr', '--listmonitors'], capture_output=True, text=True)
+    except FileNotFoundError:
+        return []
+    monitors = []
+    for line in result.stdout.split('\n'):
+        match = XRANDR_MONITOR.match(line)
+        if match:
+            primary, name, w, w_mm, h, h_mm, x, y = match.groups()
+            monitors.append({
+                "name": name, "primary": bool(primary),
+                "x": int(x), "y": int(y), "w": int(w), "h": int(h),
+                "scale": _dpi_scale(int(w), int(w_mm)),
+            })
+    return monitors
+
+
+def enable_dpi_awareness():
+    """Make Windows report physical pixels everywhere (window rects, cursor, BitBlt),
+    otherwise scaled monitors hand out virtualized coordinates"""
+    import ctypes
+
+    try:
+        ctypes.windll.shcore.SetProcessDpiAwareness(2)  # per-monitor aware
+    except (AttributeError, OSError):
+        ctypes.windll.user32.SetProcessDPIAware()
+
+
+def windows_monitors():
+    """Monitors from EnumDisplayMonitors, in virtual-screen pixels"""
+    import ctypes
+    import win32api
+
+    monitors = []
+    for handle, _, _ in win32api.EnumDisplayMonitors():
+        info = win32api.GetMonitorInfo(handle)
+        left, top, right, bottom = info["Monitor"]
+        dpi_x, dpi_y = ctypes.c_uint(96), ctypes.c_uint(96)
+        try:
+            ctypes.windll.shcore.GetDpiForMonitor(int(handle), 0, ctypes.byref(dpi_x), ctypes.byref(dpi_y))
+        except (AttributeError, OSError):
+            pass
+        monitors.append({
+            "name": info["Device"], "primary": bool(info["Flags"] & 1),
+            "x": left, "y": top, "w": right - left, "h": bottom - top,
+            "scale": dpi_x.value / 96,
+        })
+    return monitors
+
+
+def intersect(a, b):
+    """Intersection of two (x, y, w, h) rectangles, or None"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+# ====================================================================
+# COORDINATE SPACES
+# ====================================================================
+class CoordinateSpace:
+    """Maps points between the three spaces a bot works in.
+
+    root     - X root window / Windows virtual screen pixels (what clicks use)
+    window   - pixels of the window's client area, origin at its top-left
+    detector - pixels of the captured frame as the detector sees it (img_size)
+
+    Only the part of the window on its main monitor (the one showing most of
+    it) is captured, so a window hanging off the screen edge or across two
+    heads never needs a full-screen grab. Conversions are plain float maths
+    on precomputed factors, so they allocate nothing per call.
+
+    X11 root coordinates are device pixels, so frames come back at the size
+    of the capture region. Where root coordinates are logical instead
+    (logical_root=True: a scaled desktop without DPI awareness), frames come
+    back at the monitor's scale and detector pixels are divided by it on the
+    way to root. Either way check_frame() follows the size actually grabbed.
+    """
+
+    def __init__(self, window_rect, monitors=None, logical_root=False):
+        self.monitors = monitors if monitors is not None else xrandr_monitors()
+        self.logical_root = logical_root
+        # Frame pixels per capture pixel as last grabbed, kept when the region changes
+        self.frame_scale = None
+        self.update(window_rect)
+
+    def update(self, window_rect):
+        """Recompute the capture region, e.g. after the window moved"""
+        self.window_rect = window_rect
+        self.monitor = None
+        self.capture = window_rect
+        best = 0
+        for monitor in self.monitors:
+            visible = intersect(window_rect, (monitor["x"], monitor["y"], monitor["w"], monitor["h"]))
+            if visible and visible[2] * visible[3] > best:
+                best = visible[2] * visible[3]
+                self.monitor, self.capture = monitor, visible
+        if self.monitors and self.monitor is None:
+            raise Exception(f"Window {window_rect} is not on any monitor")
+
+        self.offset_x = self.capture[0] - window_rect[0]
+        self.offset_y = self.capture[1] - window_rect[1]
+        self.scale = self.frame_scale or (self.monitor["scale"] if self.monitor and self.logical_root else 1.0)
+        self.set_detector_size(round(self.capture[2] * self.scale), round(self.capture[3] * self.scale))
+
+    def set_detector_size(self, w, h):
+        """Frames may come back at another resolution (HiDPI screenshots); the
+        detector reports boxes in this size, which defaults to the capture
+        region at the monitor's scale"""
+        self.detector_size = (w, h)
+        self.ratio_x = self.capture[2] / w
+        self.ratio_y = self.capture[3] / h
+
+    def check_frame(self, img):
+        """Follow the size of a grabbed frame; True when it was not the expected one"""
+        h, w = img.shape[:2]
+        if (w, h) == self.detector_size:
+            return False
+        self.set_detector_size(w, h)
+        self.frame_scale = self.scale = w / self.capture[2]
+        return True
+
+    def detector_to_root(self, pos):
+        return (self.capture[0] + pos[0] * self.ratio_x, self.capture[1] + pos[1] * self.ratio_y)
+
+    def root_to_detector(self, pos):
+        return ((pos[0] - self.capture[0]) / self.ratio_x, (pos[1] - self.capture[1]) / self.ratio_y)
+
+    def detector_to_window(self, pos):
+        return (self.offset_x + pos[0] * self.ratio_x, self.offset_y + pos[1] * self.ratio_y)
+
+    def window_to_root(self, pos):
+        return (self.window_rect[0] + pos[0], self.window_rect[1] + pos[1])
+
+    def root_to_window(self, pos):
+        return (pos[0] - self.window_rect[0], pos[1] - self.window_rect[1])
+
+    def describe(self):
+        x, y, w, h = self.capture
+        clipped = "" if self.capture == self.window_rect else f" (clipped from {self.window_rect[2]}x{self.window_rect[3]})"
+        monitor = f" on {self.monitor['name']} @ {self.monitor['scale']}x" if self.monitor else ""
+        if self.logical_root:
+            monitor += " (logical root)"
+        return f"capture {w}x{h}+{x}+{y}{clipped}{monitor}, detector {self.detector_size[0]}x{self.detector_size[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the monitor layout and where a window would be captured")
+    parser.add_argument("--window", type=int, nargs=4, metavar=("X", "Y", "W", "H"))
+    parser.add_argument("--logical-root", action="store_true", help="root coordinates are DPI-virtualized")
+    args = parser.parse_args()
+
+    monitors = xrandr_monitors()
+    for monitor in monitors:
+        primary = " (primary)" if monitor["primary"] else ""
+        print(f"{monitor['name']}{primary}: {monitor['w']}x{monitor['h']}+{monitor['x']}+{monitor['y']} "
+              f"scale {monitor['scale']}")
+    if args.window:
+        print(CoordinateSpace(tuple(args.window), monitors, args.logical_root).describe())
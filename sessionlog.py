@@ -0,0 +1,281 @@
+import argparse
+import atexit
+import os
+import threading
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+LOG_DIR = "logs"
+
+DETECTION_SCHEMA = pa.schema([
+    ("session", pa.string()),
+    ("window_id", pa.string()),
+    ("frame", pa.int64()),
+    ("t_capture", pa.float64()),  # unix seconds, before get_screenshot
+    ("t_detect", pa.float64()),   # unix seconds, after proccess_image
+    ("class_id", pa.int16()),
+    ("class_name", pa.string()),
+    ("x", pa.int32()),
+    ("y", pa.int32()),
+    ("w", pa.int32()),
+    ("h", pa.int32()),
+    ("confidence", pa.float32()),
+])
+CLICK_SCHEMA = pa.schema([
+    ("session", pa.string()),
+    ("window_id", pa.string()),
+    ("frame", pa.int64()),
+    ("t_capture", pa.float64()),
+    ("t_click", pa.float64()),    # unix seconds, after the click was sent
+    ("class_id", pa.int16()),
+    ("class_name", pa.string()),
+    ("confidence", pa.float32()),
+    ("screen_x", pa.int32()),
+    ("screen_y", pa.int32()),
+])
+
+
+# ====================================================================
+# WRITER
+# ====================================================================
+class _Table:
+    """Column buffers for one table plus the Parquet file they are flushed to"""
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.schema = schema
+        self.columns = {field.name: [] for field in schema}
+        self.writer = None
+        self.path = None
+
+    def take(self):
+        columns = self.columns
+        self.columns = {field.name: [] for field in self.schema}
+        return columns
+
+
+class SessionLogger:
+    """Append-only columnar log of every detection and click.
+
+    The bot loop only appends to in-memory column lists; a background thread
+    turns them into Parquet row groups every flush_interval seconds (or
+    sooner once flush_rows are waiting). Files are hive-partitioned by day,
+    logs/<table>/date=YYYY-MM-DD/<session>-<n>.parquet, and a new file is
+    started every rotate_interval seconds, so a crash loses at most the file
+    being written (Parquet needs its footer to be read).
+    """
+
+    def __init__(self, log_dir=LOG_DIR, window_id="", flush_rows=8192, flush_interval=5.0, rotate_interval=900.0):
+        self.log_dir = log_dir
+        self.window_id = str(window_id)
+        self.session = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rotate_interval = rotate_interval
+        self.tables = {"detections": _Table("detections", DETECTION_SCHEMA), "clicks": _Table("clicks", CLICK_SCHEMA)}
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.part = 0
+        self.opened = time.time()
+        self.rows_written = 0
+        self.wake = threading.Event()
+        self.running = True
+        self.flusher = threading.Thread(target=self.flush_loop, name="session-log", daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def log_detections(self, frame, t_capture, coordinates, t_detect=None):
+        if not coordinates:
+            return
+        t_detect = t_detect or time.time()
+        with self.lock:
+            columns = self.tables["detections"].columns
+            for c in coordinates:
+                columns["session"].append(self.session)
+                columns["window_id"].append(self.window_id)
+                columns["frame"].append(frame)
+                columns["t_capture"].append(t_capture)
+                columns["t_detect"].append(t_detect)
+                columns["class_id"].append(c["class"])
+                columns["class_name"].append(c["class_name"])
+                columns["x"].append(c["x"])
+                columns["y"].append(c["y"])
+                columns["w"].append(c["w"])
+                columns["h"].append(c["h"])
+                columns["confidence"].append(c.get("confidence"))
+            self.pending += len(coordinates)
+        if self.pending >= self.flush_rows:
+            self.wake.set()
+
+    def log_click(self, frame, t_capture, coordinate, screen_pos, t_click=None):
+        t_click = t_click or time.time()
+        with self.lock:
+            columns = self.tables["clicks"].columns
+            columns["session"].append(self.session)
+            columns["window_id"].append(self.window_id)
+            columns["frame"].append(frame)
+            columns["t_capture"].append(t_capture)
+            columns["t_click"].append(t_click)
+            columns["class_id"].append(coordinate["class"])
+            columns["class_name"].append(coordinate["class_name"])
+            columns["confidence"].append(coordinate.get("confidence"))
+            columns["screen_x"].append(int(screen_pos[0]))
+            columns["screen_y"].append(int(screen_pos[1]))
+            self.pending += 1
+
+    def flush_loop(self):
+        while self.running:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            batches = {name: table.take() for name, table in self.tables.items()}
+            self.pending = 0
+        if time.time() - self.opened > self.rotate_interval:
+            self.rotate()
+        for name, columns in batches.items():
+            if not columns["frame"]:
+                continue
+            table = self.tables[name]
+            if table.writer is None:
+                directory = os.path.join(self.log_dir, name, f"date={time.strftime('%Y-%m-%d')}")
+                os.makedirs(directory, exist_ok=True)
+                table.path = os.path.join(directory, f"{self.session}-{self.part}.parquet")
+                table.writer = pq.ParquetWriter(table.path, table.schema, compression="zstd")
+            table.writer.write_table(pa.Table.from_pydict(columns, schema=table.schema))
+            self.rows_written += len(columns["frame"])
+
+    def rotate(self):
+        """Finish the current files so they are readable, the next flush starts new ones"""
+        for table in self.tables.values():
+            if table.writer is not None:
+                table.writer.close()
+                table.writer = None
+        self.part += 1
+        self.opened = time.time()
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wake.set()
+        self.flusher.join()
+        self.flush()
+        self.rotate()
+
+
+# ====================================================================
+# QUERIES
+# ====================================================================
+def load(log_dir, table, columns=None, since=None, window_id=None, session=None):
+    """One log table as an Arrow table; only the needed columns are read and
+    rows are filtered while scanning, so months of logs stay quick to query"""
+    path = os.path.join(log_dir, table)
+    if not os.path.isdir(path):
+        raise Exception(f"No {table} logged in {log_dir}/")
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    time_column = "t_capture"
+    condition = None
+    for clause in (
+        pc.field(time_column) >= since if since else None,
+        pc.field("window_id") == window_id if window_id else None,
+        pc.field("session") == session if session else None,
+    ):
+        if clause is not None:
+            condition = clause if condition is None else condition & clause
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def active_hours(table, time_column="t_capture"):
+    """Time the bots were running, summed per session"""
+    spans = table.group_by("session").aggregate([(time_column, "min"), (time_column, "max")])
+    return float(pc.sum(pc.subtract(spans[f"{time_column}_max"], spans[f"{time_column}_min"])).as_py() or 0) / 3600
+
+
+def class_rates(log_dir, **filters):
+    detections = load(log_dir, "detections", ["session", "frame", "t_capture", "class_name", "confidence", "w", "h"],
+                      **filters)
+    hours = active_hours(detections)
+    frames = detections.group_by(["session", "frame"]).aggregate([]).num_rows
+    stats = detections.group_by("class_name").aggregate([
+        ("class_name", "count"), ("confidence", "mean"), ("confidence", "min"), ("w", "mean"), ("h", "mean"),
+    ]).sort_by([("class_name_count", "descending")])
+    print(f"{detections.num_rows:,} detections in {frames:,} frames with detections over {hours:.1f} bot-hours")
+    print(f"{'class':<20} {'count':>10} {'per hour':>10} {'mean conf':>10} {'min conf':>9} {'mean size':>11}")
+    for row in stats.to_pylist():
+        per_hour = row["class_name_count"] / hours if hours else float("nan")
+        print(f"{row['class_name']:<20} {row['class_name_count']:>10,} {per_hour:>10.1f} "
+              f"{row['confidence_mean']:>10.3f} {row['confidence_min']:>9.3f} "
+              f"{row['w_mean']:>5.0f}x{row['h_mean']:<5.0f}")
+
+
+def latency_report(log_dir, **filters):
+    detections = load(log_dir, "detections", ["t_capture", "t_detect"], **filters)
+    clicks = load(log_dir, "clicks", ["t_capture", "t_click"], **filters)
+    print(f"{'stage':<26} {'count':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, table, end in (("capture -> detections", detections, "t_detect"), ("capture -> click", clicks, "t_click")):
+        if table.num_rows == 0:
+            continue
+        delta = pc.multiply(pc.subtract(table[end], table["t_capture"]), 1000)
+        p50, p95, p99 = pc.quantile(delta, q=[0.5, 0.95, 0.99]).to_pylist()
+        print(f"{name:<26} {table.num_rows:>9,} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {pc.max(delta).as_py():>8.1f}")
+
+
+def hit_report(log_dir, repeat_seconds=2.0, repeat_pixels=30, **filters):
+    """Clicks per detection and repeat clicks: a click landing near the previous
+    one shortly after usually means the first one did not take"""
+    detections = load(log_dir, "detections", ["session", "frame"], **filters)
+    clicks = load(log_dir, "clicks", ["session", "frame", "window_id", "t_click", "class_name", "screen_x", "screen_y"],
+                  **filters).sort_by([("window_id", "ascending"), ("t_click", "ascending")])
+    frames = detections.group_by(["session", "frame"]).aggregate([]).num_rows
+    acted = clicks.group_by(["session", "frame"]).aggregate([]).num_rows
+    print(f"{clicks.num_rows:,} clicks for {frames:,} frames with detections "
+          f"({acted / frames if frames else 0:.1%} of them acted on)")
+    if clicks.num_rows < 2:
+        return
+
+    window = clicks["window_id"].to_numpy(zero_copy_only=False)
+    t = clicks["t_click"].to_numpy()
+    xy = np.stack([clicks["screen_x"].to_numpy(), clicks["screen_y"].to_numpy()], axis=1)
+    same_window = window[1:] == window[:-1]
+    close = np.linalg.norm(xy[1:] - xy[:-1], axis=1) <= repeat_pixels
+    soon = t[1:] - t[:-1] <= repeat_seconds
+    repeats = same_window & close & soon
+    print(f"repeat clicks (<= {repeat_pixels}px within {repeat_seconds:g}s): {repeats.sum():,} "
+          f"({repeats.mean():.1%}), likely misses")
+
+    names = clicks["class_name"].to_numpy(zero_copy_only=False)[1:]
+    for name in np.unique(names):
+        mask = names == name
+        print(f"  {name:<20} {mask.sum():>8,} clicks, {repeats[mask].mean():.1%} repeated")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the detection and click logs of bot sessions")
+    parser.add_argument("report", choices=["classes", "latency", "hits", "all"])
+    parser.add_argument("--dir", default=LOG_DIR)
+    parser.add_argument("--hours", type=float, help="only the last N hours")
+    parser.add_argument("--window", help="only this window ID")
+    parser.add_argument("--session")
+    args = parser.parse_args()
+
+    filters = {
+        "since": time.time() - args.hours * 3600 if args.hours else None,
+        "window_id": args.window,
+        "session": args.session,
+    }
+    start = time.perf_counter()
+    if args.report in ("classes", "all"):
+        class_rates(args.dir, **filters)
+    if args.report in ("latency", "all"):
+        latency_report(args.dir, **filters)
+    if args.report in ("hits", "all"):
+        hit_report(args.dir, **filters)
+    print(f"({time.perf_counter() - start:.2f} s)")
@@ -0,0 +1,253 @@
+import argparse
+import collections
+import os
+import subprocess
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+
+# ====================================================================
+# FFMPEG X11GRAB STREAM
+# ====================================================================
+class StreamCapture:
+    """WindowCapture backend fed by one long-running ffmpeg x11grab process.
+
+    ffmpeg grabs the capture region at `fps` and writes raw RGB frames to a
+    pipe; a reader thread keeps only the newest one, stamped with the time
+    it finished arriving. get_screenshot() then costs a copy instead of a
+    fresh X11 round trip, so capture time and jitter no longer land in the
+    bot loop. Window discovery, calibration and coordinate mapping are the
+    wrapped WindowCapture's; recalibrating restarts the stream on the new
+    region. If the stream dies or stalls it is restarted, and the frame is
+    pulled the old way meanwhile.
+    """
+
+    def __init__(self, wincap, fps=30, display=None, stale_after=1.0, draw_mouse=False, ffmpeg="ffmpeg"):
+        self.wincap = wincap
+        self.fps = fps
+        self.display = display or os.environ.get("DISPLAY", ":0")
+        self.stale_after = stale_after
+        self.draw_mouse = draw_mouse
+        self.ffmpeg = ffmpeg
+        self.process = None
+        self.reader = None
+        self.stderr_reader = None
+        # Last lines ffmpeg wrote to stderr, for the restart message
+        self.messages = collections.deque(maxlen=20)
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.frame = None
+        self.frame_time = None
+        self.frame_index = 0
+        self.last_frame_time = None
+        self.restarts = 0
+        self.fallbacks = 0
+
+    def __getattr__(self, attr):
+        return getattr(self.wincap, attr)
+
+    def input_args(self, region):
+        x, y, w, h = region
+        return ["-f", "x11grab", "-draw_mouse", "1" if self.draw_mouse else "0",
+                "-framerate", str(self.fps), "-video_size", f"{w}x{h}", "-i", f"{self.display}+{x},{y}"]
+
+    def command(self, region):
+        return [self.ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-fflags", "nobuffer",
+                "-probesize", "32"] + self.input_args(region) + ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+
+    def start(self):
+        self.stop()
+        region = tuple(int(v) for v in self.wincap.space.capture)
+        self.shape = (region[3], region[2], 3)
+        self.messages.clear()
+        self.process = subprocess.Popen(self.command(region), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0)
+        self.reader = threading.Thread(target=self.read_frames, args=(self.process,), name="ffmpeg-reader",
+                                       daemon=True)
+        self.reader.start()
+        # ffmpeg blocks once a full stderr pipe is left unread, so keep draining it
+        self.stderr_reader = threading.Thread(target=self.read_messages, args=(self.process,), name="ffmpeg-stderr",
+                                              daemon=True)
+        self.stderr_reader.start()
+        print(f"Streaming {region[2]}x{region[3]}+{region[0]}+{region[1]} at {self.fps} fps through ffmpeg")
+
+    def read_frames(self, process):
+        """Read whole frames into two alternating buffers and publish the newest"""
+        size = self.shape[0] * self.shape[1] * 3
+        buffers = [np.empty(self.shape, dtype=np.uint8) for _ in range(2)]
+        index = 0
+        while True:
+            view = memoryview(buffers[index]).cast("B")
+            received = 0
+            while received < size:
+                count = process.stdout.readinto(view[received:])
+                if not count:
+                    return
+                received += count
+            with self.lock:
+                self.frame = buffers[index]
+                self.frame_time = time.time()
+                self.frame_index += 1
+                self.new_frame.notify_all()
+            # The consumer copies under the lock, so the other buffer is free now
+            index = 1 - index
+
+    def read_messages(self, process):
+        for line in process.stderr:
+            self.messages.append(line.decode(errors="replace").rstrip())
+
+    def stop(self):
+        if self.process is not None:
+            # Raw frames on a pipe leave nothing to finalize, and ffmpeg can keep
+            # producing for seconds after SIGTERM, so just kill it
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+        for thread in (self.reader, self.stderr_reader):
+            if thread is not None:
+                thread.join(timeout=2)
+        self.reader = self.stderr_reader = None
+        self.frame = None
+
+    def healthy(self):
+        return (self.process is not None and self.process.poll() is None and self.frame is not None
+                and time.time() - self.frame_time < self.stale_after)
+
+    def get_frame(self, newer_than=None, timeout=1.0):
+        """(frame copy, capture time, frame index); with newer_than, waits for a
+        frame after that index. Returns (None, None, None) on timeout."""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while self.frame is None or (newer_than is not None and self.frame_index <= newer_than):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, None, None
+                self.new_frame.wait(remaining)
+            return self.frame.copy(), self.frame_time, self.frame_index
+
+    def get_screenshot(self, raw=False):
+        """Newest streamed frame, same contract as WindowCapture.get_screenshot
+        (raw=True returns RGB); `last_frame_time` is set to when it was captured"""
+        if self.process is None:
+            self.start()
+        elif not self.healthy() and (self.process.poll() is not None or self.frame is not None):
+            code = self.process.poll()
+            if code is not None:
+                self.stderr_reader.join(timeout=1)
+            reason = "stalled" if code is None else f"exited with code {code}"
+            detail = f": {' | '.join(self.messages)}" if self.messages else ""
+            print(f"ffmpeg stream {reason}{detail}, restarting")
+            self.restarts += 1
+            self.start()
+        img, frame_time, _ = self.get_frame(timeout=self.stale_after)
+        if img is None:
+            self.fallbacks += 1
+            self.last_frame_time = time.time()
+            return self.wincap.get_screenshot(raw)
+        self.last_frame_time = frame_time
+        if raw:
+            return img
+        return cv.cvtColor(img, cv.COLOR_RGB2BGR)
+
+    def calibrate(self, *args, **kwargs):
+        self.stop()
+        insets = self.wincap.calibrate(*args, **kwargs)
+        self.start()
+        return insets
+
+    def apply_insets(self, insets):
+        self.wincap.apply_insets(insets)
+        if self.process is not None:
+            self.start()
+
+    def close(self):
+        self.stop()
+
+
+# ====================================================================
+# BENCHMARK
+# ====================================================================
+class _Region:
+    """Just enough of WindowCapture to stream a fixed region"""
+
+    def __init__(self, region):
+        from screens import CoordinateSpace
+
+        self.space = CoordinateSpace(region, monitors=[])
+
+    def get_screenshot(self, raw=False):
+        import pyautogui
+
+        img = np.asarray(pyautogui.screenshot(region=self.space.capture))
+        return img if raw else cv.cvtColor(img, cv.COLOR_RGB2BGR)
+
+
+class _TestPattern(StreamCapture):
+    """The same pipe and reader fed by ffmpeg's test pattern, no display needed"""
+
+    def input_args(self, region):
+        return ["-re", "-f", "lavfi", "-i", f"testsrc2=size={region[2]}x{region[3]}:rate={self.fps}"]
+
+
+def benchmark(region, fps=60, seconds=5.0, xvfb=False, test_pattern=False, ffmpeg="ffmpeg"):
+    """Delivered frame rate and inter-frame jitter of the stream, and the cost
+    of get_screenshot for the pull (pyautogui) and stream backends"""
+    server = None
+    if xvfb:
+        from latency_harness import start_xvfb
+        server = start_xvfb(":98")
+        os.environ["DISPLAY"] = ":98"
+    try:
+        source = _Region(region)
+        stream = (_TestPattern if test_pattern else StreamCapture)(source, fps, ffmpeg=ffmpeg)
+        stream.start()
+        times, index = [], None
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            img, frame_time, index = stream.get_frame(newer_than=index)
+            if img is not None:
+                times.append(frame_time)
+        if len(times) < 2:
+            raise Exception(f"The stream delivered {len(times)} frames: {' | '.join(stream.messages)}")
+        intervals = np.diff(times) * 1000
+        print(f"stream: {len(times) / seconds:.1f} fps delivered (asked {fps}) | interval "
+              f"mean {intervals.mean():.1f} ms, std {intervals.std():.1f} ms, max {intervals.max():.1f} ms")
+
+        grabbers = [("stream", stream.get_screenshot)]
+        if not test_pattern:
+            grabbers.insert(0, ("pull (pyautogui)", source.get_screenshot))
+        for name, grab in grabbers:
+            try:
+                grab(raw=True)
+            except Exception as e:
+                print(f"{name:<18} skipped: {e}")
+                continue
+            calls = []
+            for _ in range(50):
+                start = time.perf_counter()
+                grab(raw=True)
+                calls.append((time.perf_counter() - start) * 1000)
+            print(f"{name:<18} get_screenshot p50 {np.percentile(calls, 50):6.2f} ms | "
+                  f"p95 {np.percentile(calls, 95):6.2f} ms | max {max(calls):6.2f} ms")
+        stream.close()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ffmpeg x11grab capture stream")
+    parser.add_argument("--region", type=int, nargs=4, default=(0, 0, 800, 600), metavar=("X", "Y", "W", "H"))
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--xvfb", action="store_true", help="run against a fresh Xvfb display")
+    parser.add_argument("--test-pattern", action="store_true",
+                        help="stream ffmpeg's test pattern instead of the screen (checks the pipe without X)")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg binary")
+    args = parser.parse_args()
+
+    benchmark(tuple(args.region), args.fps, args.seconds, args.xvfb, args.test_pattern, args.ffmpeg)
@@ -0,0 +1,407 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 as cv
+
+from resources import ResourceConfig, limit_threads, may_lower_niceness, split_cpus
+
+
+class StalledCapture(Exception):
+    pass
+
+
+# ====================================================================
+# FRAME SCHEDULER (PER-BOT FPS BUDGET)
+# ====================================================================
+class FrameScheduler:
+    """Hands out detector slots earliest-deadline-first.
+
+    Every bot asks for a slot when its next frame is due (1/fps after the
+    previous one). At most `slots` frames are processed at once; when bots
+    have to wait, the most overdue frame goes first, so CPU time is shared
+    in proportion to each bot's FPS budget.
+    """
+
+    def __init__(self, slots):
+        self.free = slots
+        self.waiting = []
+        self.counter = itertools.count()
+
+    async def acquire(self, deadline):
+        if self.free > 0 and not self.waiting:
+            self.free -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (deadline, next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been granted just before we were cancelled
+            if not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self.waiting:
+            _, _, future = heapq.heappop(self.waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.free += 1
+
+
+# ====================================================================
+# BOT WORKER (CAPTURE -> DETECT -> ACT)
+# ====================================================================
+class BotWorker:
+    def __init__(self, window, make_detector, scheduler, click_lock,
+                 fps=2.0, stall_frames=10, click=True, resources=None, idle_frames=20, slot=0):
+        self.window = window
+        self.slot = slot
+        self.make_detector = make_detector
+        self.scheduler = scheduler
+        self.click_lock = click_lock
+        self.fps = fps
+        self.stall_frames = stall_frames
+        self.click = click
+        self.resources = resources or ResourceConfig()
+        self.idle_frames = idle_frames
+        self.empty_frames = 0
+
+        self.frames = 0
+        self.clicks = 0
+        self.restarts = 0
+        self.failures = 0
+        self.stalled = False
+        self.started = time.monotonic()
+        self.last_heartbeat = time.monotonic()
+        self.task = None
+        self.run_task = None
+
+    @property
+    def name(self):
+        return f"{self.window['title']} ({self.window['window_id']})"
+
+    def heartbeat(self):
+        self.last_heartbeat = time.monotonic()
+
+    def open_capture(self):
+        # capture pulls in pyautogui, which needs an X display as soon as it is imported
+        from capture import WindowCapture
+
+        wincap = WindowCapture(window_name=self.window["title"], window_id=self.window["window_id"])
+        wincap.calibrate()
+        return wincap
+
+    def step(self, wincap, detector):
+        img = wincap.get_screenshot(raw=True)
+        # get_screenshot falls back to an all-black frame when capture fails
+        if not img[::8, ::8].any():
+            return False, []
+        coordinates = detector.proccess_image(img, "RGB")
+
+        # Runs on the worker's own thread, so only this bot is reniced
+        self.empty_frames = 0 if coordinates else self.empty_frames + 1
+        self.resources.set_idle(self.empty_frames >= self.idle_frames, threading.get_native_id())
+        return True, coordinates
+
+    def act(self, wincap, coordinate):
+        from capture import click_at_coordinate
+
+        center_x = coordinate["x"] + coordinate["w"] // 2
+        center_y = coordinate["y"] + coordinate["h"] // 2
+        screen_x, screen_y = wincap.get_screen_position((center_x, center_y))
+        print(f"[{self.name}] Clicking {coordinate['class_name']} at ({screen_x}, {screen_y})")
+        click_at_coordinate(screen_x, screen_y)
+
+    async def run(self):
+        # A dedicated thread per run keeps this bot's CPU pinning and niceness
+        # apart from other bots, and a hung thread is simply left behind.
+        self.resources.idle = False
+        executor = ThreadPoolExecutor(max_workers=1, initializer=self.resources.apply_to_current_thread)
+        try:
+            await self.loop(executor)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def loop(self, executor):
+        loop = asyncio.get_running_loop()
+        self.heartbeat()
+        self.started = time.monotonic()
+        self.frames = 0
+
+        wincap = detector = None
+        try:
+            wincap = await loop.run_in_executor(executor, self.open_capture)
+            detector = await loop.run_in_executor(executor, self.make_detector, wincap.get_window_size())
+            self.heartbeat()
+
+            black_frames = 0
+            next_due = time.monotonic()
+            while True:
+                await asyncio.sleep(max(0.0, next_due - time.monotonic()))
+                await self.scheduler.acquire(next_due)
+                try:
+                    valid, coordinates = await loop.run_in_executor(executor, self.step, wincap, detector)
+                finally:
+                    self.scheduler.release()
+                # Missed frames are dropped rather than made up with a burst
+                next_due = max(next_due + 1.0 / self.fps, time.monotonic())
+
+                if not valid:
+                    black_frames += 1
+                    if black_frames >= self.stall_frames:
+                        raise StalledCapture(f"{black_frames} black frames in a row")
+                    continue
+
+                black_frames = 0
+                self.frames += 1
+                self.heartbeat()
+
+                if coordinates and self.click:
+                    async with self.click_lock:
+                        await loop.run_in_executor(executor, self.act, wincap, coordinates[0])
+                    self.clicks += 1
+        finally:
+            # Every restart opens a new detector (a daemon socket and its shared
+            # memory) and capture (an ffmpeg stream), so release the old ones
+            for resource in (detector, wincap):
+                self.close(resource)
+
+    def close(self, resource):
+        close = getattr(resource, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            print(f"[{self.name}] Failed to close {type(resource).__name__}: {e}")
+
+
+# ====================================================================
+# SUPERVISOR
+# ====================================================================
+class BotSupervisor:
+    """Discovers PetStar windows, runs one BotWorker per window and restarts
+    workers that crash or stop sending heartbeats, with exponential backoff."""
+
+    def __init__(self, make_detector, process_name="PetStarClient", window_title="PetStar",
+                 fps=2.0, bot_fps=None, slots=None, heartbeat_timeout=15.0,
+                 stall_frames=10, discover_interval=10.0, backoff_base=1.0, backoff_max=60.0,
+                 click=True, pin=False, nice=None, idle_nice=None, idle_frames=20):
+        self.make_detector = make_detector
+        self.process_name = process_name
+        self.window_title = window_title
+        self.fps = fps
+        self.bot_fps = bot_fps or {}
+        self.slots = slots or max(1, (os.cpu_count() or 2) // 2)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.stall_frames = stall_frames
+        self.discover_interval = discover_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.click = click
+        self.nice = nice
+        self.idle_nice = idle_nice
+        if idle_nice is not None and not may_lower_niceness(nice or 0):
+            # An idle bot could never be made active again
+            print(f"Idle renicing disabled: returning to niceness {nice or 0} needs CAP_SYS_NICE or RLIMIT_NICE")
+            self.idle_nice = None
+        self.idle_frames = idle_frames
+        if pin:
+            # OpenCV's worker pool is shared by the whole process and keeps the
+            # affinity of the bot thread that happened to create it, so run
+            # inference serially on each bot's own pinned thread instead
+            cv.setNumThreads(0)
+        # One CPU set per slot; each bot takes the lowest free slot index, and
+        # bots share sets only when there are more bots than slots
+        self.cpu_sets = split_cpus(self.slots) if pin else None
+
+        self.workers = {}
+        self.scheduler = FrameScheduler(self.slots)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.click_lock = asyncio.Lock()
+
+    def discover(self):
+        """Find every PetStar window, by process name first and then by title"""
+        from capture import find_window_by_process_name, find_windows_by_title
+
+        windows = {}
+        for window in find_window_by_process_name(self.process_name) + find_windows_by_title(self.window_title):
+            windows.setdefault(window["window_id"], window)
+        return windows
+
+    def fps_for(self, window):
+        for key, fps in self.bot_fps.items():
+            if key == window["window_id"] or key in window["title"]:
+                return fps
+        return self.fps
+
+    def free_slot(self):
+        """Lowest slot index no live worker holds; a worker's slot is freed when it is removed"""
+        taken = {worker.slot for worker in self.workers.values()}
+        return next(index for index in itertools.count() if index not in taken)
+
+    def resources_for(self, index):
+        cpus = self.cpu_sets[index % len(self.cpu_sets)] if self.cpu_sets else None
+        return ResourceConfig(cpus=cpus, nice=self.nice, idle_nice=self.idle_nice)
+
+    def start_worker(self, window):
+        slot = self.free_slot()
+        resources = self.resources_for(slot)
+        worker = BotWorker(
+            window, self.make_detector, self.scheduler, self.click_lock,
+            fps=self.fps_for(window), stall_frames=self.stall_frames, click=self.click,
+            resources=resources, idle_frames=self.idle_frames, slot=slot,
+        )
+        worker.task = asyncio.create_task(self.supervise(worker))
+        self.workers[window["window_id"]] = worker
+        print(f"Started bot for {worker.name} at {worker.fps} FPS ({resources.describe()})")
+
+    async def supervise(self, worker):
+        while True:
+            started = time.monotonic()
+            worker.run_task = asyncio.create_task(worker.run())
+            try:
+                await worker.run_task
+            except asyncio.CancelledError:
+                if not worker.stalled:
+                    worker.run_task.cancel()
+                    raise
+                worker.stalled = False
+                print(f"[{worker.name}] No heartbeat for {self.heartbeat_timeout}s")
+            except Exception as e:
+                print(f"[{worker.name}] Worker failed: {e}")
+
+            # A worker that stayed up for a while starts its backoff from scratch
+            if time.monotonic() - started > self.backoff_max:
+                worker.failures = 0
+            worker.failures += 1
+            worker.restarts += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (worker.failures - 1))
+            delay *= random.uniform(0.8, 1.2)
+            print(f"[{worker.name}] Restarting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def check_heartbeats(self):
+        now = time.monotonic()
+        for worker in self.workers.values():
+            run_task = worker.run_task
+            if run_task is None or run_task.done() or worker.stalled:
+                continue
+            if now - worker.last_heartbeat > self.heartbeat_timeout:
+                # The executor thread cannot be interrupted; it is abandoned and
+                # its result ignored once the hung call eventually returns.
+                worker.stalled = True
+                run_task.cancel()
+
+    def print_status(self):
+        print("-" * 60)
+        for worker in self.workers.values():
+            uptime = time.monotonic() - worker.started
+            fps = worker.frames / uptime if uptime > 0 else 0.0
+            print(f"{worker.name}: {fps:.1f}/{worker.fps} FPS | clicks {worker.clicks} | restarts {worker.restarts}")
+
+    async def run(self, status_interval=30.0):
+        loop = asyncio.get_running_loop()
+        next_discovery = 0.0
+        next_status = time.monotonic() + status_interval
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_discovery:
+                    windows = await loop.run_in_executor(self.executor, self.discover)
+                    for window_id, window in windows.items():
+                        if window_id not in self.workers:
+                            self.start_worker(window)
+                    for window_id in list(self.workers):
+                        if window_id not in windows:
+                            print(f"Window closed: {self.workers[window_id].name}")
+                            self.workers.pop(window_id).task.cancel()
+                    next_discovery = now + self.discover_interval
+
+                if now >= next_status:
+                    self.print_status()
+                    next_status = now + status_interval
+
+                self.check_heartbeats()
+                await asyncio.sleep(1.0)
+        finally:
+            for worker in self.workers.values():
+                worker.task.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one PetStar bot per game window")
+    parser.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    parser.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    parser.add_argument("--daemon", metavar="SOCKET", help="use a running detector_daemon instead of one network per bot")
+    parser.add_argument("--templates", metavar="DIR", help="also match the UI widget templates in this folder")
+    parser.add_argument("--tile-size", type=int, help="tiled inference for large windows (tile edge in window pixels)")
+    parser.add_argument("--tile-overlap", type=int, default=64)
+    parser.add_argument("--process-name", default="PetStarClient")
+    parser.add_argument("--window-title", default="PetStar")
+    parser.add_argument("--fps", type=float, default=2.0, help="default FPS budget per bot")
+    parser.add_argument("--bot-fps", action="append", default=[], metavar="WINDOW=FPS",
+                        help="FPS budget for a window ID or title substring (repeatable)")
+    parser.add_argument("--slots", type=int, help="frames processed concurrently (default: half the cores)")
+    parser.add_argument("--heartbeat-timeout", type=float, default=15.0)
+    parser.add_argument("--stall-frames", type=int, default=10)
+    parser.add_argument("--no-click", action="store_true")
+    parser.add_argument("--threads", type=int, help="OpenCV compute threads for the whole process")
+    parser.add_argument("--pin", action="store_true",
+                        help="pin each bot to its own CPU set; inference then runs single-threaded on the bot's thread")
+    parser.add_argument("--nice", type=int)
+    parser.add_argument("--idle-nice", type=int,
+                        help="niceness for bots that have not detected anything lately; needs CAP_SYS_NICE or "
+                             "RLIMIT_NICE to return to --nice, and is turned off when that is not allowed")
+    parser.add_argument("--idle-frames", type=int, default=20)
+    args = parser.parse_args()
+    if args.pin and args.threads is not None:
+        parser.error("--pin runs each bot's inference on its own thread, so --threads does not apply")
+
+    if args.threads is not None:
+        limit_threads(args.threads)
+
+    if args.daemon:
+        from detector_daemon import DetectorClient
+
+        def make_detector(size):
+            return DetectorClient(args.daemon)
+    else:
+        from vision import ImageProcessor
+
+        def make_detector(size):
+            templates = None
+            if args.templates:
+                from templates import TemplateDetector
+                templates = TemplateDetector(args.templates)
+            return ImageProcessor(size, args.cfg, args.weights, show=False, templates=templates,
+                                  tile_size=args.tile_size, tile_overlap=args.tile_overlap)
+
+    bot_fps = {}
+    for item in args.bot_fps:
+        key, fps = item.rsplit("=", 1)
+        bot_fps[key] = float(fps)
+
+    async def main():
+        supervisor = BotSupervisor(
+            make_detector, args.process_name, args.window_title, args.fps, bot_fps,
+            args.slots, args.heartbeat_timeout, args.stall_frames, click=not args.no_click,
+            pin=args.pin, nice=args.nice, idle_nice=args.idle_nice, idle_frames=args.idle_frames,
+        )
+        await supervisor.run()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Supervisor stopped")
@@ -0,0 +1,315 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+
+from decode import greedy_nms
+
+TEMPLATE_DIR = "templates"
+MANIFEST = "templates.json"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+GRAY_CONVERSIONS = {
+    "BGR": cv.COLOR_BGR2GRAY,
+    "BGRA": cv.COLOR_BGRA2GRAY,
+    "RGB": cv.COLOR_RGB2GRAY,
+    "RGBA": cv.COLOR_RGBA2GRAY,
+}
+
+
+# ====================================================================
+# TEMPLATE REGISTRY
+# ====================================================================
+def load_templates(template_dir=TEMPLATE_DIR):
+    """Read every template image from the directory.
+
+    templates/ok_button.png          -> class "ok_button"
+    templates/reward_popup/*.png     -> class "reward_popup" (several looks of one widget)
+    templates/templates.json         -> optional per-class settings:
+        {"reference_size": [800, 600],
+         "ok_button": {"roi": [0.3, 0.6, 0.4, 0.4], "threshold": 0.9}}
+
+    reference_size is the window size the templates were cut at; roi is the
+    part of the window to search, as fractions (x, y, w, h).
+    """
+    manifest = {}
+    manifest_path = os.path.join(template_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+
+    templates = []
+    for path in sorted(glob.glob(os.path.join(template_dir, "*")) + glob.glob(os.path.join(template_dir, "*", "*"))):
+        if not path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        parent = os.path.dirname(path)
+        if os.path.normpath(parent) == os.path.normpath(template_dir):
+            name = os.path.splitext(os.path.basename(path))[0]
+        else:
+            name = os.path.basename(parent)
+        image = cv.imread(path, cv.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"Warning: could not read template {path}")
+            continue
+        settings = manifest.get(name, {})
+        templates.append({
+            "name": name,
+            "path": path,
+            "image": image,
+            "roi": settings.get("roi"),
+            "threshold": settings.get("threshold"),
+        })
+    if not templates:
+        raise Exception(f"No templates found in {template_dir}/")
+    return templates, manifest.get("reference_size")
+
+
+def add_template(image_path, name, rect, template_dir=TEMPLATE_DIR):
+    """Cut a widget out of a screenshot and register it as a template"""
+    img = cv.imread(image_path)
+    if img is None:
+        raise Exception(f"Could not read {image_path}")
+    x, y, w, h = rect
+    os.makedirs(os.path.join(template_dir, name), exist_ok=True)
+    index = len(os.listdir(os.path.join(template_dir, name)))
+    out = os.path.join(template_dir, name, f"{name}_{index}.png")
+    cv.imwrite(out, img[y:y + h, x:x + w])
+
+    # Remember the window size the template was cut at, so it can be rescaled later
+    manifest_path = os.path.join(template_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+    manifest.setdefault("reference_size", [img.shape[1], img.shape[0]])
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    print(f"Saved {out}")
+
+
+# ====================================================================
+# MATCHER
+# ====================================================================
+def _peaks(result, threshold, max_peaks, suppress):
+    """Best scores above threshold, blanking a neighbourhood around each hit"""
+    peaks = []
+    for _ in range(max_peaks):
+        _, score, _, (x, y) = cv.minMaxLoc(result)
+        if score < threshold:
+            break
+        peaks.append((x, y, score))
+        cv.rectangle(result, (x - suppress[0], y - suppress[1]), (x + suppress[0], y + suppress[1]), -1.0, -1)
+    return peaks
+
+
+class TemplateDetector:
+    """Finds fixed UI widgets (buttons, dialogs, reward popups) with matchTemplate.
+
+    Each frame is converted to grayscale once and shrunk into a pyramid; every
+    template is matched on the coarsest level where it is still at least
+    min_size pixels, inside its ROI only, and each hit is refined at full
+    resolution in a small window. Templates are rescaled to the current
+    frame size once and cached, together with their pyramid levels.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, threshold=0.85, levels=3, min_size=12,
+                 max_instances=5, class_offset=0):
+        self.templates, self.reference_size = load_templates(template_dir)
+        self.threshold = threshold
+        self.levels = levels
+        self.min_size = min_size
+        self.max_instances = max_instances
+        self.set_class_offset(class_offset)
+
+    def set_class_offset(self, offset):
+        """Number template classes after the detector's own, so IDs never collide"""
+        names = sorted({t["name"] for t in self.templates})
+        self.classes = {offset + i: name for i, name in enumerate(names)}
+        self.class_ids = {name: i for i, name in self.classes.items()}
+        self.cache = {}
+
+    def prepare(self, size):
+        """Rescale templates for frames of `size` and pick their pyramid level (cached per size)"""
+        if size in self.cache:
+            return self.cache[size]
+        w, h = size
+        ref_w, ref_h = self.reference_size or size
+        sx, sy = w / ref_w, h / ref_h
+
+        prepared = []
+        for template in self.templates:
+            image = template["image"]
+            if (sx, sy) != (1, 1):
+                image = cv.resize(image, (max(1, round(image.shape[1] * sx)), max(1, round(image.shape[0] * sy))),
+                                  interpolation=cv.INTER_AREA)
+            level = 0
+            while level < self.levels and min(image.shape) >> (level + 1) >= self.min_size:
+                level += 1
+            coarse = image
+            for _ in range(level):
+                coarse = cv.pyrDown(coarse)
+
+            roi = template["roi"] or (0, 0, 1, 1)
+            x1, y1 = int(roi[0] * w), int(roi[1] * h)
+            x2, y2 = min(w, int((roi[0] + roi[2]) * w)), min(h, int((roi[1] + roi[3]) * h))
+            prepared.append({
+                "name": template["name"],
+                "class": self.class_ids[template["name"]],
+                "full": image,
+                "coarse": coarse,
+                "level": level,
+                "roi": (x1, y1, x2, y2),
+                "threshold": template["threshold"] or self.threshold,
+            })
+        self.cache[size] = prepared
+        return prepared
+
+    def pyramid(self, gray, depth):
+        levels = [gray]
+        for _ in range(depth):
+            levels.append(cv.pyrDown(levels[-1]))
+        return levels
+
+    def match(self, template, levels):
+        """Coarse search inside the ROI, then refine each hit at full resolution"""
+        x1, y1, x2, y2 = template["roi"]
+        level, coarse, full = template["level"], template["coarse"], template["full"]
+        th, tw = full.shape
+        if x2 - x1 < tw or y2 - y1 < th:
+            return []
+
+        f = 1 << level
+        region = levels[level][y1 // f:y2 // f, x1 // f:x2 // f]
+        if region.shape[0] < coarse.shape[0] or region.shape[1] < coarse.shape[1]:
+            return []
+        result = cv.matchTemplate(region, coarse, cv.TM_CCOEFF_NORMED)
+        # Downscaling blurs the match peak, so accept a slightly lower score before refining
+        candidates = _peaks(result, template["threshold"] - 0.1 * level, self.max_instances,
+                            (coarse.shape[1] // 2, coarse.shape[0] // 2))
+
+        found = []
+        full_frame = levels[0]
+        pad = 2 * f
+        for cx, cy, _ in candidates:
+            # Refine in a window of +-2 coarse pixels around the hit
+            rx = min(max((x1 // f + cx) * f - pad, 0), full_frame.shape[1] - tw)
+            ry = min(max((y1 // f + cy) * f - pad, 0), full_frame.shape[0] - th)
+            window = full_frame[ry:ry + th + 2 * pad, rx:rx + tw + 2 * pad]
+            if window.shape[0] < th or window.shape[1] < tw:
+                continue
+            _, score, _, (dx, dy) = cv.minMaxLoc(cv.matchTemplate(window, full, cv.TM_CCOEFF_NORMED))
+            if score >= template["threshold"]:
+                found.append((rx + dx, ry + dy, tw, th, score))
+        return found
+
+    def detect(self, gray):
+        prepared = self.prepare((gray.shape[1], gray.shape[0]))
+        levels = self.pyramid(gray, max(t["level"] for t in prepared))
+        hits = []
+        for template in prepared:
+            for x, y, w, h, score in self.match(template, levels):
+                hits.append({
+                    "x": int(x), "y": int(y), "w": int(w), "h": int(h),
+                    "class": template["class"],
+                    "class_name": template["name"],
+                    "confidence": float(score),
+                })
+
+        # Several variants of one widget may hit the same spot; keep the best per class
+        coordinates = []
+        for class_id in {c["class"] for c in hits}:
+            same = [c for c in hits if c["class"] == class_id]
+            boxes = np.array([(c["x"], c["y"], c["x"] + c["w"], c["y"] + c["h"]) for c in same], dtype=np.float32)
+            scores = np.array([c["confidence"] for c in same], dtype=np.float32)
+            coordinates.extend(same[i] for i in greedy_nms(boxes, scores, 0.3))
+        return coordinates
+
+    def __call__(self, img, channel_order="BGR", size=None):
+        """Coordinate dicts like ImageProcessor.get_coordinates, in pixels of `size`
+        (the window size) when the frame was captured at another resolution"""
+        gray = cv.cvtColor(img, GRAY_CONVERSIONS[channel_order]) if img.ndim == 3 else img
+        coordinates = self.detect(gray)
+        if size is not None and size != (gray.shape[1], gray.shape[0]):
+            sx, sy = size[0] / gray.shape[1], size[1] / gray.shape[0]
+            for c in coordinates:
+                c["x"], c["w"] = int(c["x"] * sx), int(c["w"] * sx)
+                c["y"], c["h"] = int(c["y"] * sy), int(c["h"] * sy)
+        return coordinates
+
+
+# ====================================================================
+# BENCHMARK
+# ====================================================================
+def benchmark(image_paths, template_dir, cfg_file, weights_file, repeat=5):
+    """Time YOLO and template matching on the same frames and compare what they find"""
+    from evaluate import box_iou
+    from vision import ImageProcessor
+
+    frames = [img for img in (cv.imread(path) for path in image_paths) if img is not None]
+    if not frames:
+        raise Exception("No frames to benchmark")
+    matcher = TemplateDetector(template_dir)
+    h, w = frames[0].shape[:2]
+    improc = ImageProcessor((w, h), cfg_file, weights_file, show=False)
+
+    results = {}
+    for label, detect in (("YOLO", lambda img: improc.proccess_image(img)),
+                          ("templates", lambda img: matcher(img))):
+        detect(frames[0])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            detections = [detect(img) for img in frames]
+        elapsed = (time.perf_counter() - start) / (repeat * len(frames))
+        results[label] = detections
+        print(f"{label:<10} {elapsed * 1000:7.2f} ms/frame | {sum(map(len, detections)) / len(frames):5.2f} detections/frame")
+
+    # Agreement on the targets both detectors know by name
+    shared = set(matcher.classes.values()) & set(improc.classes.values())
+    for name in sorted(shared):
+        agreed = total = 0
+        for yolo, tmpl in zip(results["YOLO"], results["templates"]):
+            yolo_boxes = [(c["x"], c["y"], c["x"] + c["w"], c["y"] + c["h"]) for c in yolo if c["class_name"] == name]
+            for c in (c for c in tmpl if c["class_name"] == name):
+                total += 1
+                if yolo_boxes and box_iou((c["x"], c["y"], c["x"] + c["w"], c["y"] + c["h"]), yolo_boxes).max() >= 0.5:
+                    agreed += 1
+        print(f"{name}: {agreed}/{total} template hits also found by YOLO (IoU >= 0.5)")
+    if not shared:
+        print("No target is known to both detectors by the same name; only speed was compared")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Template matching for fixed UI widgets")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add = sub.add_parser("add", help="cut a template out of a screenshot")
+    add.add_argument("name")
+    add.add_argument("image")
+    add.add_argument("rect", type=int, nargs=4, metavar=("X", "Y", "W", "H"))
+    add.add_argument("--dir", default=TEMPLATE_DIR)
+
+    find = sub.add_parser("find", help="show template hits on screenshots")
+    find.add_argument("images", nargs="+")
+    find.add_argument("--dir", default=TEMPLATE_DIR)
+    find.add_argument("--threshold", type=float, default=0.85)
+
+    bench = sub.add_parser("bench", help="compare speed and hits with YOLO")
+    bench.add_argument("--images", default="images/*.jp*g")
+    bench.add_argument("--dir", default=TEMPLATE_DIR)
+    bench.add_argument("--cfg", default="./yolov4-tiny/yolov4-tiny-custom.cfg")
+    bench.add_argument("--weights", default="yolov4-tiny-custom_last.weights")
+    bench.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "add":
+        add_template(args.image, args.name, args.rect, args.dir)
+    elif args.command == "find":
+        matcher = TemplateDetector(args.dir, args.threshold)
+        for path in args.images:
+            for c in matcher(cv.imread(path)):
+                print(f"{path}: {c}")
+    else:
+        benchmark(sorted(glob.glob(args.images)), args.dir, args.cfg, args.weights, args.repeat)
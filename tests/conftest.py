@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TINY_CFG = """[net]
+width=64
+height=64
+channels=3
+
+[convolutional]
+size=3
+stride=2
+pad=1
+filters=8
+activation=leaky
+
+[convolutional]
+size=1
+stride=1
+pad=1
+filters=18
+activation=linear
+
+[yolo]
+mask=0,1,2
+anchors=10,14, 23,27, 37,58
+classes=1
+num=3
+"""
+
+
+@pytest.fixture
+def tiny_net(tmp_path):
+    """(cfg, weights, names) of a two-layer Darknet YOLO with fixed random weights,
+    small enough to run anywhere and busy enough to produce boxes"""
+    rng = np.random.default_rng(0)
+    cfg, weights, names = tmp_path / "tiny.cfg", tmp_path / "tiny.weights", tmp_path / "obj.names"
+    cfg.write_text(TINY_CFG)
+    names.write_text("pig\n")
+    params = [
+        rng.normal(0, 0.1, 8), rng.normal(0, 0.3, 8 * 3 * 3 * 3),   # conv 1: biases, kernels
+        rng.normal(0, 0.5, 18), rng.normal(0, 0.3, 18 * 8),         # conv 2
+    ]
+    with open(weights, "wb") as file:
+        file.write(np.array([0, 2, 5], dtype=np.int32).tobytes() + np.array([0], dtype=np.int64).tobytes())
+        for p in params:
+            file.write(p.astype(np.float32).tobytes())
+    return str(cfg), str(weights), str(names)
@@ -0,0 +1,22 @@
+import pytest
+
+from config import PROFILES, load_config
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_built_in_profiles_load(profile, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = load_config(None, [profile])
+    for section, values in PROFILES[profile].items():
+        for key, value in values.items():
+            assert config[section][key] == value
+
+
+def test_example_config_loads(monkeypatch, tmp_path):
+    import os
+
+    example = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "petstar.example.toml")
+    monkeypatch.chdir(tmp_path)
+    config = load_config(example, ["low-cpu"], ["cache.enabled=true"])
+    assert config["cache"]["enabled"] and config["cache"]["max_distance"] == 0
+    assert config["resources"]["threads"] == 1
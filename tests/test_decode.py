@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+import pytest
+
+from decode import Decoder
+
+CLASSES = {0: "pig", 1: "button", 2: "popup"}
+
+# (x1, y1, x2, y2), score, class
+HAND_BUILT = [
+    ((10, 10, 50, 50), 0.90, 0),
+    ((12, 12, 52, 52), 0.80, 0),     # almost the same box: suppressed
+    ((30, 30, 70, 70), 0.70, 0),     # IoU 0.14 with the first: kept
+    ((11, 11, 51, 51), 0.85, 1),     # same place, other class
+    ((100, 100, 120, 140), 0.60, 1),
+    ((102, 98, 121, 139), 0.55, 1),  # suppressed by the one above
+    ((0, 60, 40, 100), 0.65, 2),
+    ((20, 60, 60, 100), 0.50, 2),    # IoU 0.33, but centers 20 px apart: DIoU 0.26
+]
+
+
+# ====================================================================
+# REFERENCE LOOPS
+# ====================================================================
+def iou(a, b):
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union
+
+
+def diou(a, b):
+    dx = (a[0] + a[2]) / 2 - (b[0] + b[2]) / 2
+    dy = (a[1] + a[3]) / 2 - (b[1] + b[3]) / 2
+    diagonal = (max(a[2], b[2]) - min(a[0], b[0])) ** 2 + (max(a[3], b[3]) - min(a[1], b[1])) ** 2
+    return iou(a, b) - (dx * dx + dy * dy) / diagonal
+
+
+def reference_greedy(boxes, scores, class_ids, threshold, per_class, overlap):
+    keep = []
+    for i in sorted(range(len(scores)), key=lambda i: -scores[i]):
+        if all(overlap(boxes[i], boxes[k]) <= threshold
+               for k in keep if not per_class or class_ids[k] == class_ids[i]):
+            keep.append(i)
+    return keep, list(scores)
+
+
+def reference_soft(boxes, scores, class_ids, score_threshold, per_class, sigma):
+    scores = list(scores)
+    remaining = list(range(len(scores)))
+    keep = []
+    while remaining:
+        i = max(remaining, key=lambda j: scores[j])
+        keep.append(i)
+        remaining.remove(i)
+        for j in remaining:
+            if not per_class or class_ids[j] == class_ids[i]:
+                scores[j] *= math.exp(-iou(boxes[i], boxes[j]) ** 2 / sigma)
+        remaining = [j for j in remaining if scores[j] > score_threshold]
+    return keep, scores
+
+
+def reference(decoder, boxes, scores, class_ids):
+    boxes, scores = boxes.tolist(), scores.tolist()
+    if decoder.method == "soft":
+        return reference_soft(boxes, scores, class_ids, decoder.score_threshold, decoder.per_class, decoder.sigma)
+    overlap = diou if decoder.method == "diou" else iou
+    return reference_greedy(boxes, scores, class_ids, decoder.iou_threshold, decoder.per_class, overlap)
+
+
+def hand_built():
+    boxes = np.array([box for box, _, _ in HAND_BUILT], dtype=np.float32)
+    scores = np.array([score for _, score, _ in HAND_BUILT], dtype=np.float32)
+    class_ids = np.array([class_id for _, _, class_id in HAND_BUILT])
+    return boxes, scores, class_ids
+
+
+def random_boxes(seed, count=80):
+    """Clusters of jittered boxes, so there is plenty to suppress"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(20, 300, (count // 8, 2)).repeat(8, axis=0) + rng.normal(0, 6, (count, 2))
+    sizes = rng.uniform(15, 60, (count // 8, 2)).repeat(8, axis=0) * rng.uniform(0.8, 1.2, (count, 2))
+    boxes = np.hstack([centers - sizes / 2, centers + sizes / 2]).astype(np.float32)
+    # Distinct scores, so the order never depends on tie-breaking
+    scores = rng.permutation(np.linspace(0.31, 0.99, count)).astype(np.float32)
+    return boxes, scores, rng.integers(0, 3, count)
+
+
+# ====================================================================
+# TESTS
+# ====================================================================
+@pytest.mark.parametrize("method", ["greedy", "diou", "soft"])
+@pytest.mark.parametrize("per_class", [True, False])
+def test_suppress_matches_reference_loop(method, per_class):
+    decoder = Decoder(score_threshold=0.3, iou_threshold=0.3, per_class=per_class, method=method)
+    for boxes, scores, class_ids in [hand_built()] + [random_boxes(seed) for seed in range(5)]:
+        keep, new_scores = decoder.suppress(boxes, scores, class_ids)
+        expected_keep, expected_scores = reference(decoder, boxes, scores, class_ids)
+        assert keep.tolist() == expected_keep
+        assert np.allclose(new_scores[keep], np.array(expected_scores)[expected_keep], atol=1e-5)
+
+
+def test_hand_built_boxes_per_method():
+    boxes, scores, class_ids = hand_built()
+    kept, decayed = {}, {}
+    for method in ("greedy", "diou", "soft"):
+        keep, decayed[method] = Decoder(score_threshold=0.3, iou_threshold=0.3, method=method).suppress(
+            boxes, scores, class_ids)
+        kept[method] = sorted(keep.tolist())
+    assert kept["greedy"] == [0, 2, 3, 4, 6]
+    # DIoU keeps the side-by-side pair that plain IoU merges
+    assert kept["diou"] == [0, 2, 3, 4, 6, 7]
+    # Soft-NMS decays the near-duplicates below 0.3 and the side-by-side box only a little
+    assert kept["soft"] == [0, 2, 3, 4, 6, 7]
+    assert decayed["soft"][7] == pytest.approx(0.5 * math.exp(-(1 / 3) ** 2 / 0.5))
+
+    agnostic, _ = Decoder(score_threshold=0.3, iou_threshold=0.3, per_class=False).suppress(boxes, scores, class_ids)
+    assert 3 not in agnostic.tolist()
+
+
+def test_candidates_match_reference_loop():
+    rng = np.random.default_rng(7)
+    outputs = np.hstack([
+        rng.uniform(0.1, 0.9, (300, 2)), rng.uniform(0.02, 0.2, (300, 2)),
+        rng.uniform(0, 1, (300, 1)), rng.uniform(0, 1, (300, 3)) ** 3,
+    ]).astype(np.float32)
+    W, H = 640, 480
+    decoder = Decoder(score_threshold=0.5, top_k=0)
+    boxes, scores, class_ids = decoder.candidates(outputs, np.array([W, H, W, H], dtype=np.float32), 0)
+
+    expected = []
+    for row in outputs:
+        class_id = int(np.argmax(row[5:]))
+        if row[5 + class_id] > 0.5:
+            x, y, w, h = row[0] * W, row[1] * H, row[2] * W, row[3] * H
+            expected.append((x - w / 2, y - h / 2, x + w / 2, y + h / 2, row[5 + class_id], class_id))
+    assert len(expected) == len(scores) > 0
+    got = sorted(zip(*boxes.T, scores, class_ids), key=lambda row: -row[4])
+    expected.sort(key=lambda row: -row[4])
+    assert np.allclose([row[:5] for row in got], [row[:5] for row in expected], atol=1e-3)
+    assert [row[5] for row in got] == [row[5] for row in expected]
+
+    top = Decoder(score_threshold=0.5, top_k=5).candidates(outputs, np.array([W, H, W, H], dtype=np.float32), 0)[1]
+    assert sorted(top.tolist(), reverse=True) == pytest.approx([row[4] for row in expected[:5]])
+
+
+def test_finish_builds_coordinate_dicts():
+    boxes, scores, class_ids = hand_built()
+    coordinates = Decoder(score_threshold=0.3, iou_threshold=0.3, max_detections=3).finish(
+        boxes, scores, class_ids, CLASSES)
+    assert [c["confidence"] for c in coordinates] == pytest.approx([0.90, 0.85, 0.70])
+    assert coordinates[0] == {"x": 10, "y": 10, "w": 40, "h": 40, "class": 0, "class_name": "pig",
+                              "confidence": pytest.approx(0.9)}
+    assert coordinates[1]["class_name"] == "button"
+    assert Decoder().finish(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                            np.zeros(0, dtype=np.int64), CLASSES) == []
@@ -0,0 +1,168 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from decode import Decoder
+from detector_daemon import DetectorClient, DetectorDaemon
+from vision import ImageProcessor
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_daemon(tiny_net, socket_path, improc=None, **kwargs):
+    cfg, weights, names = tiny_net
+    if improc is None:
+        improc = ImageProcessor((416, 416), cfg, weights, show=False, input_size=(64, 64), names_file=names,
+                                decoder=Decoder(score_threshold=0.3, iou_threshold=0.4))
+    daemon = DetectorDaemon(improc, str(socket_path), max_batch=4, max_wait=0.02, **kwargs)
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if daemon.running and socket_path.exists():
+            break
+        time.sleep(0.01)
+    return daemon, thread
+
+
+def frames(count, size=(160, 120)):
+    rng = np.random.default_rng(1)
+    return [rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8) for _ in range(count)]
+
+
+def test_round_trip_matches_in_process_detector(tiny_net, tmp_path):
+    daemon, thread = start_daemon(tiny_net, tmp_path / "detector.sock")
+    try:
+        imgs = frames(3)
+        expected = daemon.improc.proccess_images(imgs)
+        assert any(expected), "tiny net should produce some boxes"
+
+        client = DetectorClient(str(tmp_path / "detector.sock"))
+        try:
+            for img, coordinates in zip(imgs, expected):
+                assert client.proccess_image(img) == coordinates
+            # RGB frames are converted by the daemon, not by the client
+            assert client.proccess_image(np.ascontiguousarray(imgs[0][:, :, ::-1]), "RGB") == expected[0]
+        finally:
+            client.close()
+    finally:
+        daemon.shutdown()
+        thread.join(timeout=5)
+
+
+def test_concurrent_clients_are_batched(tiny_net, tmp_path):
+    daemon, thread = start_daemon(tiny_net, tmp_path / "detector.sock")
+    try:
+        img = frames(1)[0]
+        expected = daemon.improc.proccess_images([img])[0]
+        results = []
+
+        def bot():
+            client = DetectorClient(str(tmp_path / "detector.sock"))
+            try:
+                results.extend(client.proccess_image(img) for _ in range(10))
+            finally:
+                client.close()
+
+        bots = [threading.Thread(target=bot) for _ in range(4)]
+        for b in bots:
+            b.start()
+        for b in bots:
+            b.join(timeout=30)
+        assert len(results) == 40
+        assert all(r == expected for r in results)
+        assert daemon.get_stats()["frames"] >= 40
+    finally:
+        daemon.shutdown()
+        thread.join(timeout=5)
+
+
+def test_larger_frame_replaces_the_old_segment(tiny_net, tmp_path):
+    daemon, thread = start_daemon(tiny_net, tmp_path / "detector.sock")
+    try:
+        small, large = frames(1, (64, 48))[0], frames(1, (320, 240))[0]
+        client = DetectorClient(str(tmp_path / "detector.sock"))
+        try:
+            client.proccess_image(small)
+            first = client.shm.name
+            assert client.proccess_image(large) == daemon.improc.proccess_images([large])[0]
+            assert client.shm.name != first
+            # The daemon closed its mapping of the first segment, so nothing maps it any more
+            with open("/proc/self/maps") as maps:
+                assert first.lstrip("/") not in maps.read()
+        finally:
+            client.close()
+    finally:
+        daemon.shutdown()
+        thread.join(timeout=5)
+
+
+class StuckDetector:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def proccess_images(self, imgs):
+        self.release.wait(10)
+        return [[] for _ in imgs]
+
+
+def test_stuck_batch_times_out(tiny_net, tmp_path):
+    stuck = StuckDetector()
+    daemon, thread = start_daemon(tiny_net, tmp_path / "detector.sock", improc=stuck, timeout=0.2)
+    try:
+        client = DetectorClient(str(tmp_path / "detector.sock"))
+        try:
+            start = time.perf_counter()
+            with pytest.raises(Exception, match="timeout"):
+                client.proccess_image(frames(1)[0])
+            assert time.perf_counter() - start < 2
+            assert client.get_stats()["timeouts"] == 1
+            stuck.release.set()
+            # The connection is still usable once the detector recovers
+            assert client.proccess_image(frames(1)[0]) == []
+        finally:
+            client.close()
+    finally:
+        stuck.release.set()
+        daemon.shutdown()
+        thread.join(timeout=5)
+
+
+def test_daemon_subprocess_serves_clients(tiny_net, tmp_path):
+    cfg, weights, _ = tiny_net
+    socket_path = tmp_path / "detector.sock"
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO, "detector_daemon.py"), "--socket", str(socket_path),
+         "serve", "--cfg", cfg, "--weights", weights, "--max-batch", "4", "--threads", "1"],
+        cwd=REPO, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        for _ in range(300):
+            if socket_path.exists() or process.poll() is not None:
+                break
+            time.sleep(0.05)
+        assert socket_path.exists(), process.stdout.read() if process.poll() is not None else "no socket"
+
+        # The CLI builds the same detector with its defaults (416 input, obj.names next to the cfg)
+        imgs = frames(2)
+        expected = ImageProcessor((416, 416), cfg, weights, show=False).proccess_images(imgs)
+        client = DetectorClient(str(socket_path))
+        try:
+            assert [client.proccess_image(img) for img in imgs] == expected
+            assert client.get_stats()["frames"] == 2
+        finally:
+            client.close()
+
+        process.send_signal(signal.SIGINT)
+        assert process.wait(timeout=10) == 0
+        assert not socket_path.exists()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
@@ -0,0 +1,73 @@
+import cv2 as cv
+import numpy as np
+
+from framecache import CachedImageProcessor, DetectionCache, frame_hash, hamming
+from scenegate import SceneGate
+
+
+class CountingDetector:
+    show = False
+
+    def __init__(self):
+        self.calls = 0
+
+    def proccess_image(self, img, channel_order="BGR"):
+        self.calls += 1
+        return [{"class": 0, "class_name": "pig", "x": self.calls, "y": 0, "w": 1, "h": 1}]
+
+
+def gameplay_screen(seed=0, size=(800, 600)):
+    rng = np.random.default_rng(seed)
+    screen = np.full((size[1], size[0], 3), (70, 140, 96), dtype=np.uint8)
+    for _ in range(30):
+        x, y = (int(v) for v in rng.integers(0, 700, 2))
+        cv.rectangle(screen, (x, y), (x + 60, y + 40), rng.integers(0, 255, 3).tolist(), -1)
+    return screen
+
+
+def test_same_screen_is_served_from_the_cache():
+    detector = CountingDetector()
+    cached = CachedImageProcessor(detector, DetectionCache())
+    screen = gameplay_screen()
+    first = cached.proccess_image(screen, scene="menu")
+    assert cached.proccess_image(screen.copy(), scene="menu") == first
+    assert detector.calls == 1
+
+
+def test_new_small_sprite_is_not_answered_from_the_cache():
+    detector = CountingDetector()
+    cached = CachedImageProcessor(detector, DetectionCache())
+    screen = gameplay_screen()
+    cached.proccess_image(screen, scene="menu")
+
+    spawned = screen.copy()
+    cv.ellipse(spawned, (400, 300), (20, 14), 0, 0, 360, (180, 160, 250), -1)
+    # Close enough that the old near-match default of 8 bits took it for the same screen
+    assert 0 < hamming(frame_hash(spawned), [frame_hash(screen)])[0] <= 8
+    cached.proccess_image(spawned, scene="menu")
+    assert detector.calls == 2
+
+
+def test_gameplay_frames_always_reach_the_detector():
+    detector = CountingDetector()
+    cached = CachedImageProcessor(detector, DetectionCache())
+    screen = gameplay_screen()
+    # A sprite walking in 4 px steps: some positions hash the same, so none may be cached
+    for step in range(10):
+        frame = screen.copy()
+        cv.ellipse(frame, (300 + 4 * step, 300), (20, 14), 0, 0, 360, (180, 160, 250), -1)
+        for scene in ("gameplay", "unknown", None):
+            assert cached.proccess_image(frame, scene=scene)[0]["x"] == detector.calls
+    assert detector.calls == 30
+    assert cached.cache.get_stats()["lookups"] == 0
+
+
+def test_scene_gate_hands_its_scene_to_the_cache():
+    detector = CountingDetector()
+    scenes = iter(["shop", "shop", "gameplay", "gameplay", "menu"])
+    gate = SceneGate(CachedImageProcessor(detector, DetectionCache()), lambda img, channel_order: (next(scenes), 0.0),
+                     policy={"shop": "detect"})
+    screen = gameplay_screen()
+    results = [gate.proccess_image(screen) for _ in range(5)]
+    assert [r[0]["x"] if r else None for r in results] == [1, 1, 2, 3, None]
+    assert detector.calls == 3
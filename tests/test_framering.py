@@ -0,0 +1,127 @@
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import pytest
+
+from framering import FrameRing
+
+
+def synthetic_frame(buffer, seq):
+    """Every pixel carries the frame's sequence number, so torn reads show up"""
+    buffer[...] = seq % 251
+    buffer[0, :8, 0] = np.frombuffer(np.uint64(seq).tobytes(), dtype=np.uint8)
+
+
+def frame_seq(view):
+    return int(np.frombuffer(view[0, :8, 0].tobytes(), dtype=np.uint64)[0])
+
+
+def complete(view, seq):
+    return frame_seq(view) == seq and view[1:].min() == view[1:].max() == seq % 251
+
+
+def check_reader(name, frames, results, copy):
+    ring = FrameRing(name, shared_tracker=True)
+    out = np.empty(ring.shape, dtype=np.uint8)
+    seq = seen = torn = overwritten = 0
+    while seq < frames:
+        frame = ring.wait(seq, timeout=5)
+        if frame is not None and copy:
+            frame = ring.read_copy(out)
+        if frame is None:
+            break
+        new_seq, _, view = frame
+        if new_seq == seq:
+            time.sleep(0.0005)
+            continue
+        seq = new_seq
+        ok = complete(view, seq)
+        if not copy and not ring.valid(seq):
+            overwritten += 1
+        elif not ok:
+            torn += 1
+        seen += 1
+    results.put((seen, torn, overwritten, seq))
+    ring.close()
+
+
+@pytest.fixture
+def ring_name():
+    return f"petstar-ring-test-{os.getpid()}-{time.monotonic_ns()}"
+
+
+def test_readers_never_accept_a_torn_frame(ring_name):
+    """One writer flat out, readers in other processes both on views and copies"""
+    frames, shape = 500, (240, 320, 3)
+    ring = FrameRing(ring_name, 4, shape, create=True)
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    readers = [ctx.Process(target=check_reader, args=(ring_name, frames, results, i % 2 == 1)) for i in range(3)]
+    try:
+        for reader in readers:
+            reader.start()
+        time.sleep(1.0)
+        for seq in range(1, frames + 1):
+            synthetic_frame(ring.begin_write(), seq)
+            ring.commit()
+        outcomes = [results.get(timeout=30) for _ in readers]
+    finally:
+        for reader in readers:
+            reader.join(timeout=10)
+        ring.close()
+
+    for seen, torn, overwritten, last in outcomes:
+        assert torn == 0
+        assert seen > 0
+        assert last == frames
+
+
+def test_frame_being_written_is_not_published(ring_name):
+    ring = FrameRing(ring_name, 2, (8, 16, 3), create=True)
+    try:
+        assert ring.latest() is None
+        first = np.full((8, 16, 3), 1, dtype=np.uint8)
+        assert ring.write(first) == 1
+
+        synthetic_frame(ring.begin_write(), 2)
+        seq, _, view = ring.latest()
+        assert seq == 1 and (view == 1).all()
+        assert ring.commit() == 2
+        seq, _, view = ring.latest()
+        assert seq == 2 and complete(view, 2)
+    finally:
+        ring.close()
+
+
+def test_lapped_view_is_reported_invalid(ring_name):
+    ring = FrameRing(ring_name, 2, (8, 16, 3), create=True)
+    try:
+        for seq in range(1, 3):
+            synthetic_frame(ring.begin_write(), seq)
+            ring.commit()
+        seq, _, view = ring.latest()
+        assert ring.valid(seq)
+        # Two more frames reuse the same slot
+        for n in range(3, 5):
+            synthetic_frame(ring.begin_write(), n)
+            ring.commit()
+        assert not ring.valid(seq)
+        out = np.empty(ring.shape, dtype=np.uint8)
+        seq, _, copy = ring.read_copy(out)
+        assert seq == 4 and complete(copy, 4)
+    finally:
+        ring.close()
+
+
+def test_smaller_frames_come_back_at_their_own_size(ring_name):
+    ring = FrameRing(ring_name, 2, (8, 16, 3), create=True)
+    try:
+        ring.write(np.full((6, 10, 3), 7, dtype=np.uint8))
+        _, _, view = ring.latest()
+        assert view.shape == (6, 10, 3) and (view == 7).all()
+        with pytest.raises(Exception):
+            ring.begin_write(9, 16)
+    finally:
+        ring.close()
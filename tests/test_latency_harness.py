@@ -0,0 +1,43 @@
+import json
+
+import cv2 as cv
+import numpy as np
+
+from config import build_detector, load_config
+from latency_harness import BACKGROUND, WINDOW_SIZE, draw_pig, summarize
+
+
+def test_template_only_bot_finds_the_pig(tmp_path, monkeypatch):
+    """The detector the harness runs the bot with, on a frame of the synthetic window"""
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    sprite = draw_pig()
+    cv.imwrite(str(templates / "pig.png"), sprite)
+    monkeypatch.chdir(tmp_path)
+    config = load_config(None, [], ["model.weights=none", f"model.templates={json.dumps(str(templates))}",
+                                    "bot.show=false"])
+
+    improc = build_detector(config, WINDOW_SIZE)
+    frame = np.full((WINDOW_SIZE[1], WINDOW_SIZE[0], 3), BACKGROUND, dtype=np.uint8)
+    frame[300:348, 500:548] = sprite
+    coordinates = improc.proccess_image(np.ascontiguousarray(frame[:, :, ::-1]), "RGB")
+    assert [(c["class_name"], c["x"], c["y"]) for c in coordinates] == [("pig", 500, 300)]
+
+    empty = np.full_like(frame, BACKGROUND)
+    assert improc.proccess_image(empty) == []
+
+
+def test_summarize():
+    events = [
+        {"type": "spawn", "id": 0, "t": 10.0, "x": 0, "y": 0, "w": 48, "h": 48},
+        {"type": "click", "t": 10.2, "x": 5, "y": 5, "hit": 0},
+        {"type": "hit", "id": 0, "t": 10.25},
+        {"type": "spawn", "id": 1, "t": 12.0, "x": 0, "y": 0, "w": 48, "h": 48},
+        {"type": "click", "t": 12.5, "x": 300, "y": 300, "hit": None},
+        {"type": "expire", "id": 1, "t": 16.0},
+        {"type": "spawn", "id": 2, "t": 17.0, "x": 0, "y": 0, "w": 48, "h": 48},
+    ]
+    report = summarize(events)
+    assert report["spawned"] == 3 and report["hit"] == 1 and report["missed"] == 1
+    assert report["hit_rate"] == 0.5 and report["wasted_clicks"] == 1
+    assert abs(report["latency_ms_p50"] - 250) < 1e-6
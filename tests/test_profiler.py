@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+from profiler import Profiler, send_command
+
+
+class Capture:
+    def get_screenshot(self, raw=False):
+        time.sleep(0.002)
+        return raw
+
+
+def run_frames(profiler, capture, frames):
+    for _ in range(frames):
+        profiler.frame()
+        capture.get_screenshot(raw=True)
+
+
+def test_stage_timers_and_reports(tmp_path):
+    profiler = Profiler(interval=0.001, output_dir=str(tmp_path))
+    capture = profiler.instrument(Capture(), ["get_screenshot", "missing"])
+    profiler.start()
+    run_frames(profiler, capture, 20)
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            time.sleep(0.005)
+    base = profiler.stop()
+
+    assert len(profiler.stage_times["Capture.get_screenshot"]) == 20
+    assert profiler.stage_self["outer"] < profiler.stage_times["outer"][0]
+    assert os.path.exists(base + ".folded") and os.path.exists(base + ".txt")
+    with open(base + ".folded") as file:
+        assert any("run_frames" in line for line in file)
+    with open(base + ".txt") as file:
+        assert "Capture.get_screenshot" in file.read()
+
+
+def test_idle_profiler_records_nothing(tmp_path):
+    profiler = Profiler(output_dir=str(tmp_path))
+    capture = profiler.instrument(Capture(), ["get_screenshot"])
+    run_frames(profiler, capture, 5)
+    assert not profiler.stage_times and profiler.frames == 0
+    assert profiler.stop() is None
+
+
+def test_frame_budget_exports_off_the_bot_thread(tmp_path):
+    profiler = Profiler(interval=0.001, output_dir=str(tmp_path))
+    exported_on = []
+    export = profiler.export
+
+    def slow_export():
+        exported_on.append(threading.current_thread())
+        time.sleep(0.5)
+        return export()
+
+    profiler.export = slow_export
+    capture = profiler.instrument(Capture(), ["get_screenshot"])
+    profiler.start(frames=10)
+    start = time.perf_counter()
+    frames = 0
+    while profiler.active:
+        profiler.frame()
+        capture.get_screenshot(raw=True)
+        frames += 1
+    # The frame that ran the budget out returned without waiting for the report
+    profiler.frame()
+    assert time.perf_counter() - start < 0.3
+    assert frames == 11
+    assert not profiler.start(), "a new run must wait for the pending export"
+
+    profiler.close(timeout=5)
+    assert exported_on and exported_on[0] is not threading.main_thread()
+    assert profiler.last_report and os.path.exists(profiler.last_report + ".txt")
+    assert profiler.start()
+    profiler.close()
+
+
+def test_control_socket(tmp_path):
+    socket_path = str(tmp_path / "profiler.sock")
+    profiler = Profiler(interval=0.001, output_dir=str(tmp_path))
+    server = profiler.serve(socket_path)
+    try:
+        assert send_command("start", socket_path, frames=None) == {"started": True}
+        assert send_command("status", socket_path)["active"]
+        report = send_command("stop", socket_path)["report"]
+        assert os.path.exists(report + ".folded")
+        assert not send_command("status", socket_path)["active"]
+        assert "error" in send_command("bogus", socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,241 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from prune import choose_channels, model_stats, prunable_layers, prune, read_cfg, read_weights, score_drift, trace
+
+BN_CFG = """[net]
+width=64
+height=64
+channels=3
+
+# 0
+[convolutional]
+batch_normalize=1
+size=3
+stride=1
+pad=1
+filters=16
+activation=leaky
+
+# 1
+[convolutional]
+batch_normalize=1
+size=3
+stride=2
+pad=1
+filters=32
+activation=leaky
+
+# 2: second half of layer 1
+[route]
+layers=-1
+groups=2
+group_id=1
+
+# 3
+[convolutional]
+batch_normalize=1
+size=3
+stride=1
+pad=1
+filters=16
+activation=leaky
+
+# 4
+[convolutional]
+batch_normalize=1
+size=3
+stride=1
+pad=1
+filters=16
+activation=leaky
+
+# 5: layers 4 and 3
+[route]
+layers=-1,-2
+
+# 6
+[convolutional]
+batch_normalize=1
+size=1
+stride=1
+pad=1
+filters=32
+activation=leaky
+
+# 7: layers 1 and 6
+[route]
+layers=-6,-1
+
+# 8
+[maxpool]
+size=2
+stride=2
+
+# 9
+[convolutional]
+batch_normalize=1
+size=3
+stride=1
+pad=1
+filters=32
+activation=leaky
+
+# 10
+[convolutional]
+batch_normalize=1
+size=3
+stride=1
+pad=1
+filters=32
+activation=linear
+
+# 11: layers 10 + 9
+[shortcut]
+from=-2
+activation=linear
+
+# 12
+[convolutional]
+batch_normalize=1
+size=1
+stride=1
+pad=1
+filters=32
+activation=leaky
+
+# 13
+[convolutional]
+size=1
+stride=1
+pad=1
+filters=18
+activation=linear
+
+# 14
+[yolo]
+mask=0,1,2
+anchors=10,14, 23,27, 37,58
+classes=1
+num=3
+"""
+
+# conv layer -> (filters, input channels, kernel size, batch normalized)
+CONVS = {
+    0: (16, 3, 3, True),
+    1: (32, 16, 3, True),
+    3: (16, 16, 3, True),
+    4: (16, 16, 3, True),
+    6: (32, 32, 1, True),
+    9: (32, 64, 3, True),
+    10: (32, 32, 3, True),
+    12: (32, 32, 1, True),
+    13: (18, 32, 1, False),
+}
+PRUNABLE = [0, 1, 3, 4, 6, 12]
+
+
+@pytest.fixture
+def bn_net(tmp_path):
+    """(cfg, weights, unimportant channels) of a batch-normalized network with a
+    grouped route, concats, a maxpool and a shortcut. Half of every prunable
+    layer's channels (half of each group in layer 1) have a near-zero gamma."""
+    rng = np.random.default_rng(3)
+    cfg, weights = tmp_path / "bn.cfg", tmp_path / "bn.weights"
+    cfg.write_text(BN_CFG)
+    unimportant = {}
+    with open(weights, "wb") as file:
+        file.write(np.array([0, 2, 5], dtype=np.int32).tobytes() + np.array([0], dtype=np.int64).tobytes())
+        for index, (filters, channels, k, bn) in CONVS.items():
+            beta = rng.normal(0, 0.2, filters)
+            parts = []
+            if bn:
+                gamma = rng.uniform(0.5, 1.5, filters) * rng.choice([-1, 1], filters)
+                if index in PRUNABLE:
+                    halves = 2 if index == 1 else 1
+                    part = filters // halves
+                    tiny = np.concatenate([p * part + rng.choice(part, part // 2, replace=False)
+                                           for p in range(halves)])
+                    gamma[tiny] = rng.uniform(1e-7, 1e-6, len(tiny))
+                    # Layer 4 only feeds a 1x1 conv, where its constant output folds in
+                    # exactly; elsewhere zero padding would make the folding approximate
+                    beta[tiny] = rng.normal(0, 1.0, len(tiny)) if index == 4 else 0
+                    unimportant[index] = set(tiny.tolist())
+                parts = [gamma, rng.normal(0, 0.1, filters), rng.uniform(0.5, 1.5, filters)]
+            kernel = rng.normal(0, 0.3 / np.sqrt(channels * k * k), filters * channels * k * k)
+            for values in [beta] + parts + [kernel]:
+                file.write(values.astype(np.float32).tobytes())
+    return str(cfg), str(weights), unimportant
+
+
+def load(cfg_file):
+    _, sections = read_cfg(cfg_file)
+    layers = sections[1:]
+    inputs, outputs, sizes = trace(layers, 3, (64, 64))
+    return layers, inputs, outputs, sizes
+
+
+def forward(cfg_file, weights_file, blob):
+    net = cv.dnn.readNetFromDarknet(cfg_file, weights_file)
+    names = net.getLayerNames()
+    net.setInput(blob)
+    return np.vstack(net.forward([names[i - 1] for i in net.getUnconnectedOutLayers()]))
+
+
+def test_route_and_shortcut_bookkeeping(bn_net):
+    cfg, _, _ = bn_net
+    layers, inputs, outputs, sizes = load(cfg)
+    assert outputs[2] == [(1, c) for c in range(16, 32)]
+    assert outputs[5] == [(4, c) for c in range(16)] + [(3, c) for c in range(16)]
+    assert inputs[9] == [(1, c) for c in range(32)] + [(6, c) for c in range(32)]
+    assert outputs[11] == [(10, c) for c in range(32)]
+    assert sizes[8] == (16, 16) and sizes[13] == (16, 16)
+
+    prunable, split = prunable_layers(layers, outputs)
+    # 9 and 10 are added together by the shortcut, 13 feeds the yolo layer
+    assert prunable == PRUNABLE
+    assert split == {1: 2}
+
+
+def test_channels_are_ranked_by_gamma(bn_net):
+    cfg, weights, unimportant = bn_net
+    layers, inputs, outputs, _ = load(cfg)
+    _, params = read_weights(weights, layers, inputs)
+    prunable, split = prunable_layers(layers, outputs)
+
+    masks = choose_channels(params, prunable, split, 0.5)
+    for index in prunable:
+        assert set(masks[index].tolist()) == set(range(CONVS[index][0])) - unimportant[index]
+    assert (masks[1] < 16).sum() == (masks[1] >= 16).sum() == 8
+
+    # Past the unimportant half, every layer still keeps its strongest quarter
+    masks = choose_channels(params, prunable, split, 0.9, min_keep=0.25, multiple=1)
+    for index in prunable:
+        gamma = np.abs(params[index]["scale"])
+        kept = masks[index]
+        assert len(kept) >= CONVS[index][0] // 4
+        assert gamma[kept].min() >= np.delete(gamma, kept).max() or index in split
+
+
+def test_pruned_model_reloads_and_matches(bn_net, tmp_path, capsys):
+    cfg, weights, _ = bn_net
+    pruned_cfg, pruned_weights = prune(cfg, weights, 0.5, str(tmp_path / "pruned"))
+
+    layers, inputs, _, _ = load(pruned_cfg)
+    filters = {i: int(layer["options"]["filters"]) for i, layer in enumerate(layers) if "filters" in layer["options"]}
+    assert filters == {0: 8, 1: 16, 3: 8, 4: 8, 6: 16, 9: 32, 10: 32, 12: 16, 13: 18}
+    assert len(inputs[9]) == 32 and len(inputs[3]) == 8
+    # The rewritten weights are exactly as long as the rewritten cfg needs
+    read_weights(pruned_weights, layers, inputs)
+    assert "unused values" not in capsys.readouterr().out
+
+    blob = np.random.default_rng(0).random((1, 3, 64, 64), dtype=np.float32)
+    original, slim = forward(cfg, weights, blob), forward(pruned_cfg, pruned_weights, blob)
+    assert slim.shape == original.shape == (16 * 16 * 3, 6)
+    assert np.allclose(slim, original, atol=1e-5)
+    assert score_drift((cfg, weights), (pruned_cfg, pruned_weights), (64, 64), str(tmp_path / "none.png")) < 1e-5
+
+    gflops, params, _ = model_stats(cfg)
+    pruned_gflops, pruned_params, _ = model_stats(pruned_cfg)
+    assert pruned_gflops < 0.75 * gflops and pruned_params < params
@@ -0,0 +1,36 @@
+import resources
+import supervisor
+from resources import ResourceConfig, parse_cpu_list, split_cpus
+
+
+def test_cpu_lists_and_splits():
+    assert parse_cpu_list("0-3,6") == [0, 1, 2, 3, 6]
+    assert split_cpus(3, cpus=[0, 1, 2, 3, 4]) == [[0, 1], [2, 3], [4]]
+    assert split_cpus(3, 2, cpus=[0, 1, 2, 3]) == [[0, 1], [2, 3], [0, 1]]
+
+
+def test_refused_renice_is_not_retried(monkeypatch):
+    calls = []
+
+    def set_niceness(nice, tid=0):
+        calls.append(nice)
+        # Raising is allowed, lowering again is not
+        return nice >= 10
+
+    monkeypatch.setattr(resources, "set_niceness", set_niceness)
+    config = ResourceConfig(nice=0, idle_nice=10)
+    config.set_idle(True)
+    assert config.idle and calls == [10]
+    config.set_idle(False)
+    assert config.idle_nice is None and calls == [10, 0]
+    for _ in range(5):
+        config.set_idle(False)
+        config.set_idle(True)
+    assert calls == [10, 0]
+
+
+def test_supervisor_drops_idle_nice_it_could_not_undo(monkeypatch):
+    monkeypatch.setattr(supervisor, "may_lower_niceness", lambda nice: False)
+    boss = supervisor.BotSupervisor(lambda size: None, slots=1, nice=0, idle_nice=10)
+    assert boss.idle_nice is None and boss.resources_for(0).idle_nice is None
+    boss.executor.shutdown()
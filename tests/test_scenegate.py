@@ -0,0 +1,115 @@
+import cv2 as cv
+import numpy as np
+
+from scenegate import UNKNOWN, SceneClassifier, SceneGate
+from templates import TemplateDetector
+from vision import ImageProcessor
+
+SIZE = (320, 240)
+
+
+def synthetic_scene(scene, seed):
+    """Frames that look alike per scene but differ in their details"""
+    rng = np.random.default_rng(seed)
+    w, h = SIZE
+    if scene in ("gameplay", "dialog"):
+        img = np.full((h, w, 3), (70, 140, 96), dtype=np.uint8)
+        for _ in range(12):
+            x, y = int(rng.integers(0, w - 30)), int(rng.integers(0, h - 20))
+            cv.rectangle(img, (x, y), (x + 30, y + 20), rng.integers(0, 255, 3).tolist(), -1)
+        if scene == "dialog":
+            cv.rectangle(img, (60, 50), (260, 190), (200, 225, 240), -1)
+            cv.rectangle(img, (130, 150), (190, 175), (40, 160, 40), -1)
+    elif scene == "menu":
+        img = np.full((h, w, 3), (90, 40, 20), dtype=np.uint8)
+        for row in range(4):
+            shade = int(rng.integers(170, 210))
+            cv.rectangle(img, (100, 30 + row * 50), (220, 60 + row * 50), (shade, shade, shade), -1)
+    else:
+        img = np.zeros((h, w, 3), dtype=np.uint8)
+        cv.rectangle(img, (40, 200), (40 + int(rng.integers(10, 240)), 210), (255, 255, 255), -1)
+    noise = rng.integers(-3, 4, img.shape)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+class CountingDetector:
+    show = False
+    templates = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def proccess_image(self, img, channel_order="BGR"):
+        self.calls += 1
+        return [{"class": 0, "class_name": "pig", "x": 1, "y": 2, "w": 3, "h": 4}]
+
+
+def fixed_scenes(*scenes):
+    scenes = iter(scenes)
+    return lambda img, channel_order="BGR": (next(scenes), 0.0)
+
+
+def test_classifier_trains_and_predicts_synthetic_scenes(tmp_path):
+    scenes = ("gameplay", "dialog", "menu", "loading")
+    for scene in scenes:
+        folder = tmp_path / "scenes" / scene
+        folder.mkdir(parents=True)
+        for seed in range(6):
+            cv.imwrite(str(folder / f"{seed}.png"), synthetic_scene(scene, seed))
+
+    classifier = SceneClassifier.train(str(tmp_path / "scenes"))
+    assert classifier.names == sorted(scenes)
+    assert classifier.max_distance is not None
+    for scene in scenes:
+        for seed in range(100, 103):
+            frame = synthetic_scene(scene, seed)
+            assert classifier(frame)[0] == scene
+            assert classifier(np.ascontiguousarray(frame[:, :, ::-1]), "RGB")[0] == scene
+
+    # Nothing like any of the examples
+    magenta = np.full((SIZE[1], SIZE[0], 3), (255, 0, 255), dtype=np.uint8)
+    assert classifier(magenta)[0] == UNKNOWN
+
+    classifier.save(str(tmp_path / "scenes.npz"))
+    loaded = SceneClassifier.load(str(tmp_path / "scenes.npz"))
+    assert loaded.max_distance == classifier.max_distance
+    assert loaded(synthetic_scene("menu", 200))[0] == "menu"
+
+
+def test_gate_dispatches_on_the_policy():
+    detector = CountingDetector()
+    gate = SceneGate(detector, fixed_scenes("gameplay", "menu", "dialog", "unknown", "shop"), policy={"shop": "skip"})
+    frame = synthetic_scene("gameplay", 0)
+    results = [gate.proccess_image(frame) for _ in range(5)]
+
+    assert [bool(r) for r in results] == [True, False, False, True, False]
+    # detect for gameplay and for scenes the classifier does not know, ui without
+    # templates finds nothing, skip never reaches the detector
+    assert detector.calls == 2
+    assert gate.action == "skip" and gate.scene == "shop"
+    stats = gate.get_stats()
+    assert stats["actions"] == {"detect": 2, "skip": 2, "ui": 1}
+    assert stats["forward_passes_avoided"] == 0.6
+
+
+def test_ui_scenes_match_templates_inside_the_roi(tmp_path):
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    frame = synthetic_scene("dialog", 0)
+    button = frame[140:185, 120:200].copy()
+    cv.imwrite(str(templates / "ok_button.png"), button)
+
+    # The ROI covers the lower right of the window; the button sits inside it but not at its corner
+    improc = ImageProcessor(SIZE, "unused.cfg", None, show=False, templates=TemplateDetector(str(templates)),
+                            roi=[0.25, 0.5, 0.75, 0.5])
+    gate = SceneGate(improc, fixed_scenes("dialog", "dialog"))
+    coordinates = gate.proccess_image(frame)
+    assert [(c["class_name"], c["x"], c["y"]) for c in coordinates] == [("ok_button", 120, 140)]
+    assert gate.action == "ui"
+    # Exactly what the full detector reports for the same frame
+    assert improc.proccess_image(frame) == coordinates
+
+    # The ROI is applied: the same button outside it is not found
+    moved = np.full_like(frame, (70, 140, 96))
+    moved[10:55, 10:90] = button
+    assert gate.proccess_image(moved) == []
@@ -0,0 +1,48 @@
+import numpy as np
+
+from screens import CoordinateSpace, _dpi_scale
+
+LEFT = {"name": "DP-1", "primary": True, "x": 0, "y": 0, "w": 1920, "h": 1080, "scale": 1.0}
+RIGHT_2X = {"name": "HDMI-1", "primary": False, "x": 1920, "y": 0, "w": 1920, "h": 1080, "scale": 2.0}
+
+
+def test_dpi_scale_from_xrandr_millimeters():
+    assert _dpi_scale(1920, 527) == 1.0
+    assert _dpi_scale(3840, 344) == 3.0
+    assert _dpi_scale(1920, 0) == 1.0
+
+
+def test_window_on_2x_monitor_with_logical_root():
+    space = CoordinateSpace((2020, 100, 400, 300), [LEFT, RIGHT_2X], logical_root=True)
+    # Screenshots of a logical 400x300 region come back at 800x600
+    assert space.detector_size == (800, 600)
+    assert space.detector_to_root((200, 100)) == (2120, 150)
+    assert space.detector_to_root((799, 599)) == (2020 + 399.5, 100 + 299.5)
+    assert space.root_to_detector((2120, 150)) == (200, 100)
+    assert space.detector_to_window((200, 100)) == (100, 50)
+
+
+def test_device_pixel_root_follows_the_grabbed_frame():
+    space = CoordinateSpace((2020, 100, 400, 300), [LEFT, RIGHT_2X])
+    assert space.detector_size == (400, 300)
+    assert space.detector_to_root((200, 100)) == (2220, 200)
+
+    # A 2x screenshot of the same region
+    assert space.check_frame(np.zeros((600, 800, 3), dtype=np.uint8))
+    assert not space.check_frame(np.zeros((600, 800, 3), dtype=np.uint8))
+    assert space.detector_to_root((200, 100)) == (2120, 150)
+
+    # The observed scale survives the region changing (calibration insets)
+    space.update((2030, 130, 380, 260))
+    assert space.detector_size == (760, 520)
+    assert space.detector_to_root((0, 0)) == (2030, 130)
+    assert space.detector_to_root((760, 520)) == (2410, 390)
+
+
+def test_window_across_two_heads_is_clipped_to_its_main_monitor():
+    space = CoordinateSpace((1800, 0, 400, 300), [LEFT, RIGHT_2X], logical_root=True)
+    assert space.monitor is RIGHT_2X
+    assert space.capture == (1920, 0, 280, 300)
+    assert space.detector_size == (560, 600)
+    assert space.detector_to_window((0, 0)) == (120, 0)
+    assert space.detector_to_root((560, 600)) == (2200, 300)
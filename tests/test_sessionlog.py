@@ -0,0 +1,50 @@
+import glob
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sessionlog import CLICK_SCHEMA, DETECTION_SCHEMA, SessionLogger, load
+
+PIG = {"class": 0, "class_name": "pig", "x": 10, "y": 20, "w": 30, "h": 40, "confidence": 0.9}
+BUTTON = {"class": 1, "class_name": "button", "x": 5, "y": 6, "w": 7, "h": 8, "confidence": 0.75}
+
+
+def test_detections_and_clicks_round_trip(tmp_path):
+    log_dir = str(tmp_path / "logs")
+    logger = SessionLogger(log_dir, window_id="0x42", flush_interval=60, rotate_interval=0)
+    for frame in range(10):
+        logger.log_detections(frame, 1000.0 + frame, [PIG, BUTTON] if frame % 2 else [PIG], t_detect=1000.5 + frame)
+        if frame % 3 == 0:
+            logger.log_click(frame, 1000.0 + frame, PIG, (110.4, 220.6), t_click=1000.7 + frame)
+        if frame == 4:
+            # Rotation starts a new file on every flush
+            logger.flush()
+    logger.log_detections(10, 1010.0, [])
+    logger.close()
+
+    detection_files = glob.glob(os.path.join(log_dir, "detections", "date=*", f"{logger.session}-*.parquet"))
+    click_files = glob.glob(os.path.join(log_dir, "clicks", "date=*", f"{logger.session}-*.parquet"))
+    assert len(detection_files) == 2 and len(click_files) == 2
+    for path in detection_files:
+        assert pq.read_schema(path).equals(DETECTION_SCHEMA)
+    for path in click_files:
+        assert pq.read_schema(path).equals(CLICK_SCHEMA)
+
+    detections = pa.concat_tables(pq.read_table(path) for path in sorted(detection_files))
+    assert detections.num_rows == 15
+    assert detections.column("class_name").to_pylist().count("button") == 5
+    assert set(detections.column("window_id").to_pylist()) == {"0x42"}
+    assert sorted(set(detections.column("frame").to_pylist())) == list(range(10))
+
+    clicks = pa.concat_tables(pq.read_table(path) for path in sorted(click_files))
+    assert clicks.num_rows == 4
+    assert sorted(clicks.column("frame").to_pylist()) == [0, 3, 6, 9]
+    assert set(zip(clicks.column("screen_x").to_pylist(), clicks.column("screen_y").to_pylist())) == {(110, 220)}
+    assert logger.rows_written == 19
+
+    # The query helper sees the same rows, filtered while scanning
+    table = load(log_dir, "detections", columns=["frame", "class_name"], since=1005.0, window_id="0x42")
+    assert table.column_names == ["frame", "class_name"]
+    assert table.num_rows == 8
+    assert load(log_dir, "clicks", session="someone-else").num_rows == 0
@@ -0,0 +1,96 @@
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from screens import CoordinateSpace
+from streamcapture import StreamCapture
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+
+class Window:
+    """Stands in for WindowCapture: a fixed region and a recognisable pulled frame"""
+
+    def __init__(self, region=(0, 0, 64, 48)):
+        self.space = CoordinateSpace(region, monitors=[])
+        self.pulls = 0
+
+    def get_screenshot(self, raw=False):
+        self.pulls += 1
+        return np.zeros((self.space.capture[3], self.space.capture[2], 3), dtype=np.uint8)
+
+
+class ColorStream(StreamCapture):
+    """Real ffmpeg and the real pipe framing, fed a solid red lavfi source"""
+
+    def input_args(self, region):
+        return ["-re", "-f", "lavfi", "-i", f"color=c=red:size={region[2]}x{region[3]}:rate={self.fps}"]
+
+
+class NoisyStream(StreamCapture):
+    """Logs a line per frame at a high frame rate, enough to fill an unread stderr pipe"""
+
+    def command(self, region):
+        return [self.ffmpeg, "-hide_banner", "-nostdin", "-re", "-f", "lavfi",
+                "-i", f"testsrc2=size={region[2]}x{region[3]}:rate={self.fps}", "-vf", "showinfo",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+
+
+def test_frames_are_rgb_and_timestamped():
+    stream = ColorStream(Window((10, 20, 64, 48)), fps=30)
+    try:
+        before = time.time()
+        rgb = stream.get_screenshot(raw=True)
+        assert rgb.shape == (48, 64, 3)
+        r, g, b = (int(v) for v in rgb[0, 0])
+        assert r > 240 and g < 16 and b < 16
+        assert before - 1 < stream.last_frame_time <= time.time()
+        assert (stream.get_screenshot()[0, 0] == rgb[0, 0, ::-1]).all()
+
+        _, _, first = stream.get_frame()
+        img, frame_time, index = stream.get_frame(newer_than=first + 5, timeout=2)
+        assert index > first + 5 and img is not None
+        assert stream.restarts == 0 and stream.fallbacks == 0 and stream.wincap.pulls == 0
+    finally:
+        stream.close()
+
+
+def test_noisy_ffmpeg_keeps_streaming():
+    stream = NoisyStream(Window(), fps=300)
+    try:
+        stream.get_screenshot(raw=True)
+        time.sleep(3)
+        _, _, index = stream.get_frame()
+        assert stream.get_frame(newer_than=index, timeout=1)[0] is not None
+        assert index > 300
+        assert any("showinfo" in line for line in stream.messages)
+    finally:
+        stream.close()
+
+
+def test_dead_ffmpeg_is_restarted_with_its_error(capsys):
+    stream = StreamCapture(Window(), fps=30, display=":199", stale_after=0.5)
+    try:
+        img = stream.get_screenshot(raw=True)
+        # Nothing to grab on a display that does not exist: pulled the old way
+        assert img.shape == (48, 64, 3) and stream.fallbacks == 1
+        deadline = time.time() + 5
+        while stream.process.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+        stream.get_screenshot(raw=True)
+        assert stream.restarts == 1
+        assert "exited with code" in capsys.readouterr().out
+    finally:
+        stream.close()
+
+
+def test_stop_ends_ffmpeg_promptly():
+    stream = ColorStream(Window(), fps=30)
+    stream.get_screenshot(raw=True)
+    process = stream.process
+    start = time.time()
+    stream.close()
+    assert process.poll() is not None
+    assert time.time() - start < 3
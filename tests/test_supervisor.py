@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+import supervisor
+from supervisor import BotSupervisor, BotWorker, FrameScheduler
+
+WINDOW = {"title": "PetStar", "window_id": "0x1"}
+
+
+class FakeCapture:
+    def __init__(self, frame):
+        self.frame = frame
+
+    def get_window_size(self):
+        return (64, 48)
+
+    def get_screenshot(self, raw=False):
+        return self.frame()
+
+
+class FakeDetector:
+    def __init__(self, hang=None):
+        self.hang = hang
+        self.closed = False
+
+    def proccess_image(self, img, channel_order="BGR"):
+        if self.hang is not None:
+            self.hang.wait(10)
+        return []
+
+    def close(self):
+        self.closed = True
+
+
+class FakeWorker(BotWorker):
+    """A bot whose window is a frame function and whose runs are timestamped"""
+
+    def __init__(self, frame, make_detector, scheduler, **kwargs):
+        super().__init__(WINDOW, make_detector, scheduler, asyncio.Lock(), click=False, **kwargs)
+        self.frame = frame
+        self.run_starts = []
+
+    def open_capture(self):
+        self.run_starts.append(time.monotonic())
+        return FakeCapture(self.frame)
+
+
+def make_supervisor(**kwargs):
+    return BotSupervisor(lambda size: FakeDetector(), slots=1, **kwargs)
+
+
+def test_scheduler_grants_slots_earliest_deadline_first():
+    async def scenario():
+        scheduler = FrameScheduler(1)
+        await scheduler.acquire(0.0)
+        order = []
+
+        async def bot(deadline):
+            await scheduler.acquire(deadline)
+            order.append(deadline)
+            scheduler.release()
+
+        tasks = [asyncio.create_task(bot(deadline)) for deadline in (3.0, 1.0, 2.0)]
+        await asyncio.sleep(0.01)
+        assert order == [], "the only slot is taken"
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        assert scheduler.free == 1
+        return order
+
+    assert asyncio.run(scenario()) == [1.0, 2.0, 3.0]
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    async def scenario():
+        scheduler = FrameScheduler(1)
+        await scheduler.acquire(0.0)
+        waiter = asyncio.create_task(scheduler.acquire(1.0))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+        scheduler.release()
+        return scheduler.free
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_stalled_capture_restarts_with_backoff(monkeypatch):
+    monkeypatch.setattr(supervisor.random, "uniform", lambda a, b: 1.0)
+    detectors = []
+
+    def make_detector(size):
+        detectors.append(FakeDetector())
+        return detectors[-1]
+
+    async def scenario():
+        boss = make_supervisor(backoff_base=0.1, backoff_max=5.0)
+        # Black frames only, so every run ends in StalledCapture
+        worker = FakeWorker(lambda: np.zeros((48, 64, 3), dtype=np.uint8), make_detector, boss.scheduler,
+                            fps=200, stall_frames=3)
+        task = asyncio.create_task(boss.supervise(worker))
+        while len(worker.run_starts) < 4:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        boss.executor.shutdown()
+        return worker
+
+    worker = asyncio.run(scenario())
+    assert worker.restarts >= 3 and worker.frames == 0
+    gaps = np.diff(worker.run_starts[:4])
+    # 0.1, 0.2 and 0.4 s of backoff, plus the three frames it takes to stall
+    assert np.allclose(gaps, [0.1, 0.2, 0.4], atol=0.06)
+    assert all(detector.closed for detector in detectors)
+
+
+def test_missing_heartbeat_restarts_the_worker():
+    hang = threading.Event()
+    detectors = []
+
+    def make_detector(size):
+        # Only the first run hangs in detection
+        detectors.append(FakeDetector(hang if not detectors else None))
+        return detectors[-1]
+
+    async def scenario():
+        boss = make_supervisor(heartbeat_timeout=0.2, backoff_base=0.05)
+        worker = FakeWorker(lambda: np.full((48, 64, 3), 255, dtype=np.uint8), make_detector, boss.scheduler,
+                            fps=50)
+        boss.workers[WINDOW["window_id"]] = worker
+        worker.task = asyncio.create_task(boss.supervise(worker))
+        deadline = time.monotonic() + 5
+        while worker.frames < 5 and time.monotonic() < deadline:
+            boss.check_heartbeats()
+            await asyncio.sleep(0.02)
+        worker.task.cancel()
+        await asyncio.gather(worker.task, return_exceptions=True)
+        boss.executor.shutdown()
+        return worker
+
+    try:
+        worker = asyncio.run(scenario())
+    finally:
+        hang.set()
+    assert worker.restarts == 1
+    assert worker.frames >= 5, "the restarted run should be processing frames"
+    assert detectors[0].closed
+
+
+def test_workers_take_the_lowest_free_cpu_set():
+    boss = make_supervisor()
+    boss.cpu_sets = [[0], [1], [2]]
+    boss.workers = {"a": SimpleNamespace(slot=0), "c": SimpleNamespace(slot=2)}
+    assert boss.free_slot() == 1
+    assert boss.resources_for(boss.free_slot()).cpus == [1]
+    boss.workers["b"] = SimpleNamespace(slot=1)
+    assert boss.free_slot() == 3
+    # A closed window gives its CPU set back
+    boss.workers.pop("a")
+    assert boss.free_slot() == 0
+    boss.executor.shutdown()
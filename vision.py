@@ -0,0 +1,341 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+import cv2 as cv
+import numpy as np
+
+from decode import Decoder
+
+# Network input channel (R, G, B) -> source channel, per capture layout
+CHANNEL_MAPS = {
+    "BGR": (2, 1, 0),
+    "BGRA": (2, 1, 0),
+    "RGB": (0, 1, 2),
+    "RGBA": (0, 1, 2),
+}
+BGR_CONVERSIONS = {
+    "BGRA": cv.COLOR_BGRA2BGR,
+    "RGB": cv.COLOR_RGB2BGR,
+    "RGBA": cv.COLOR_RGBA2BGR,
+}
+DNN_BACKENDS = {
+    "opencv": cv.dnn.DNN_BACKEND_OPENCV,
+    "cuda": cv.dnn.DNN_BACKEND_CUDA,
+    "openvino": cv.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+    "vulkan": cv.dnn.DNN_BACKEND_VKCOM,
+}
+DNN_TARGETS = {
+    "cpu": cv.dnn.DNN_TARGET_CPU,
+    "opencl": cv.dnn.DNN_TARGET_OPENCL,
+    "opencl_fp16": cv.dnn.DNN_TARGET_OPENCL_FP16,
+    "cuda": cv.dnn.DNN_TARGET_CUDA,
+    "cuda_fp16": cv.dnn.DNN_TARGET_CUDA_FP16,
+    "vulkan": cv.dnn.DNN_TARGET_VULKAN,
+}
+
+
+# ====================================================================
+# PREPROCESSING
+# ====================================================================
+class BlobPreprocessor:
+    """Builds the NCHW float blob straight from capture memory.
+
+    Replaces cv.resize + blobFromImage (two resizes, two channel swaps and a
+    fresh blob every frame) with one resize into a persistent canvas and a
+    scaled channel copy into a persistent blob. Buffers are only reallocated
+    when the frame size or channel count changes.
+    """
+
+    def __init__(self, input_size=(416, 416), letterbox=False, pad_value=127):
+        self.input_size = input_size
+        self.letterbox = letterbox
+        self.pad_value = pad_value
+        self.scale = np.float32(1 / 255.0)
+        self.blob = np.zeros((1, 3, input_size[1], input_size[0]), dtype=np.float32)
+        self.layout = None
+
+    def prepare(self, shape):
+        """Allocate the canvas and work out where the frame lands in it"""
+        h, w, channels = shape
+        in_w, in_h = self.input_size
+        if self.letterbox:
+            ratio = min(in_w / w, in_h / h)
+            new_w, new_h = round(w * ratio), round(h * ratio)
+        else:
+            new_w, new_h = in_w, in_h
+        left, top = (in_w - new_w) // 2, (in_h - new_h) // 2
+
+        self.canvas = np.full((in_h, in_w, channels), self.pad_value, dtype=np.uint8)
+        self.region = self.canvas[top:top + new_h, left:left + new_w]
+        self.new_size = (new_w, new_h)
+        # Normalized network coordinates -> frame pixels
+        self.frame_scale = (in_w / new_w * w, in_h / new_h * h)
+        self.frame_offset = (-left / new_w * w, -top / new_h * h)
+        self.layout = shape
+
+    def __call__(self, img, channel_order="BGR"):
+        if img.shape != self.layout:
+            self.prepare(img.shape)
+
+        cv.resize(img, self.new_size, dst=self.region, interpolation=cv.INTER_LINEAR)
+        for dst, src in enumerate(CHANNEL_MAPS[channel_order]):
+            np.multiply(self.canvas[..., src], self.scale, out=self.blob[0, dst])
+        return self.blob
+
+    def box_transform(self, size):
+        """Scale and offset mapping normalized (x, y, w, h) boxes to pixels of a
+        window of `size`, which may differ from the captured frame size"""
+        h, w = self.layout[:2]
+        sx, sy = size[0] / w, size[1] / h
+        scale = np.array([self.frame_scale[0] * sx, self.frame_scale[1] * sy,
+                          self.frame_scale[0] * sx, self.frame_scale[1] * sy], dtype=np.float32)
+        offset = np.array([self.frame_offset[0] * sx, self.frame_offset[1] * sy, 0, 0], dtype=np.float32)
+        return scale, offset
+
+
+def tile_grid(w, h, tile, overlap):
+    """(x, y, w, h) of tiles covering a w x h frame, overlapping by at least
+    `overlap` pixels and spread evenly from edge to edge"""
+    def starts(length):
+        if length <= tile:
+            return [0]
+        count = -(-(length - overlap) // (tile - overlap))
+        return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+    tw, th = min(tile, w), min(tile, h)
+    return [(x, y, tw, th) for y in starts(h) for x in starts(w)]
+
+
+# ====================================================================
+# IMAGE PROCESSOR (YOLO)
+# ====================================================================
+def default_names_file(cfg_file):
+    """obj.names next to the cfg, falling back to the repo layout"""
+    candidate = os.path.join(os.path.dirname(cfg_file), "obj.names")
+    return candidate if os.path.exists(candidate) else "yolov4-tiny/obj.names"
+
+
+class ImageProcessor:
+    def __init__(self, img_size, cfg_file, weights_file, show=True, letterbox=False, decoder=None, templates=None,
+                 tile_size=None, tile_overlap=64, input_size=(416, 416), names_file=None,
+                 backend="opencv", target="cpu", roi=None):
+        np.random.seed(42)
+        if input_size[0] % 32 or input_size[1] % 32:
+            raise Exception(f"Network input size must be a multiple of 32, got {input_size[0]}x{input_size[1]}")
+        # No weights: only the templates run (UI-only bots, the latency harness)
+        self.net = None
+        if weights_file:
+            self.net = cv.dnn.readNetFromDarknet(cfg_file, weights_file)
+            self.net.setPreferableBackend(DNN_BACKENDS[backend])
+            self.net.setPreferableTarget(DNN_TARGETS[target])
+            self.ln = self.net.getLayerNames()
+            self.ln = [self.ln[i - 1] for i in self.net.getUnconnectedOutLayers()]
+        elif templates is None:
+            raise Exception("Without network weights there is nothing to detect; add UI templates")
+        self.W = img_size[0]
+        self.H = img_size[1]
+        self.show = show
+        self.input_size = tuple(input_size)
+        self.preprocess = BlobPreprocessor(self.input_size, letterbox)
+        # Part of the window to search, as fractions (x, y, w, h); None searches all of it
+        self.roi = roi
+        self.decoder = decoder or Decoder(score_threshold=0.5, iou_threshold=0.4, per_class=True)
+
+        # Tiled mode: frame pixels per tile edge (None squashes the whole frame into one blob)
+        if tile_size is not None and not 0 <= tile_overlap < tile_size:
+            raise Exception(f"Tile overlap must be smaller than the tile size ({tile_overlap} >= {tile_size})")
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+
+        self.classes = {}
+        if self.net is not None or names_file:
+            with open(names_file or default_names_file(cfg_file), "r") as file:
+                lines = file.readlines()
+            self.classes = {i: line.strip() for i, line in enumerate(lines)}
+
+        # Optional templates.TemplateDetector for fixed UI widgets; its hits join the same stream
+        self.templates = templates
+        if templates is not None:
+            templates.set_class_offset(len(self.classes))
+            self.classes.update(templates.classes)
+
+        # If you plan to utilize more than six classes, please include additional colors in this list.
+        self.colors = [
+            (0, 0, 255), (0, 255, 0), (255, 0, 0),
+            (255, 255, 0), (255, 0, 255), (0, 255, 255),
+        ]
+
+    def proccess_image(self, img, channel_order="BGR"):
+        """Detect objects in a raw capture frame (BGR, BGRA, RGB or RGBA).
+
+        Coordinates are in window pixels (img_size), even when the frame was
+        captured at a different resolution.
+        """
+        frame = img
+        img, origin, size = self.crop_roi(img)
+
+        if self.net is None:
+            coordinates = []
+        elif self.tile_size:
+            coordinates = self.proccess_tiles(img, channel_order, origin, size)
+        else:
+            blob = self.preprocess(img, channel_order)
+            self.net.setInput(blob)
+            outputs = self.net.forward(self.ln)
+            outputs = np.vstack(outputs)
+
+            scale, offset = self.preprocess.box_transform(size)
+            offset = offset + np.array([origin[0], origin[1], 0, 0], dtype=np.float32)
+            coordinates = self.get_coordinates(outputs, transform=(scale, offset))
+        if self.templates is not None:
+            coordinates += self.match_templates(img, channel_order, origin, size)
+        if self.show:
+            self.draw_identified_objects(self.display_image(frame, channel_order), coordinates)
+        return coordinates
+
+    def match_templates(self, img, channel_order, origin, size):
+        """UI templates in an ROI view from crop_roi, in window pixels"""
+        coordinates = self.templates(img, channel_order, size)
+        for c in coordinates:
+            c["x"] += int(origin[0])
+            c["y"] += int(origin[1])
+        return coordinates
+
+    def crop_roi(self, img):
+        """View of the ROI part of the frame (the whole frame without an ROI),
+        with its origin and size in window pixels"""
+        if self.roi is None:
+            return img, (0, 0), (self.W, self.H)
+        h, w = img.shape[:2]
+        rx, ry, rw, rh = self.roi
+        x1, y1 = int(rx * w), int(ry * h)
+        x2, y2 = min(w, int((rx + rw) * w)), min(h, int((ry + rh) * h))
+        sx, sy = self.W / w, self.H / h
+        return img[y1:y2, x1:x2], (x1 * sx, y1 * sy), (round((x2 - x1) * sx), round((y2 - y1) * sy))
+
+    def display_image(self, img, channel_order):
+        """BGR copy of the frame at window size, only needed for the preview"""
+        if channel_order in BGR_CONVERSIONS:
+            img = cv.cvtColor(img, BGR_CONVERSIONS[channel_order])
+        if img.shape[1] != self.W or img.shape[0] != self.H:
+            img = cv.resize(img, (self.W, self.H))
+        return img
+
+    def proccess_images(self, imgs):
+        """Run several frames (of any size) through the network in one forward pass"""
+        if len(imgs) == 0:
+            return []
+        if self.net is None:
+            return [self.templates(img) for img in imgs]
+
+        blob = cv.dnn.blobFromImages(imgs, 1/255.0, self.input_size, swapRB=True, crop=False)
+        self.net.setInput(blob)
+        outputs = self.net.forward(self.ln)
+
+        results = []
+        for i, img in enumerate(imgs):
+            # A batch of one comes back as (rows, cols), larger batches as (N, rows, cols)
+            per_image = [out[i] if out.ndim == 3 else out for out in outputs]
+            size = (img.shape[1], img.shape[0])
+            coordinates = self.get_coordinates(np.vstack(per_image), size)
+            if self.templates is not None:
+                coordinates += self.templates(img)
+            results.append(coordinates)
+        return results
+
+    def proccess_tiles(self, img, channel_order="BGR", origin=(0, 0), size=None):
+        """Detect small objects on large frames.
+
+        Overlapping tiles at (up to) full resolution plus the whole frame, for
+        objects bigger than a tile, go through the network as one batch. Boxes
+        cut by an inner tile edge are dropped since a neighbouring tile (or the
+        whole-frame pass) sees them complete, then NMS runs across all tiles.
+        """
+        if channel_order in BGR_CONVERSIONS:
+            img = cv.cvtColor(img, BGR_CONVERSIONS[channel_order])
+        h, w = img.shape[:2]
+        grid = tile_grid(w, h, self.tile_size, self.tile_overlap)
+        if len(grid) > 1:
+            grid.append((0, 0, w, h))
+
+        tiles = [img[y:y + th, x:x + tw] for x, y, tw, th in grid]
+        blob = cv.dnn.blobFromImages(tiles, 1/255.0, self.input_size, swapRB=True, crop=False)
+        self.net.setInput(blob)
+        outputs = self.net.forward(self.ln)
+
+        margin = self.tile_overlap // 4
+        all_boxes, all_scores, all_ids = [], [], []
+        for i, (x, y, tw, th) in enumerate(grid):
+            per_tile = np.vstack([out[i] if out.ndim == 3 else out for out in outputs])
+            scale = np.array([tw, th, tw, th], dtype=np.float32)
+            offset = np.array([x, y, 0, 0], dtype=np.float32)
+            boxes, scores, class_ids = self.decoder.candidates(per_tile, scale, offset)
+            if (tw, th) != (w, h):
+                cut = ((x > 0) & (boxes[:, 0] < x + margin)) \
+                    | ((y > 0) & (boxes[:, 1] < y + margin)) \
+                    | ((x + tw < w) & (boxes[:, 2] > x + tw - margin)) \
+                    | ((y + th < h) & (boxes[:, 3] > y + th - margin))
+                boxes, scores, class_ids = boxes[~cut], scores[~cut], class_ids[~cut]
+            all_boxes.append(boxes)
+            all_scores.append(scores)
+            all_ids.append(class_ids)
+
+        # Frame pixels -> window pixels
+        size = size or (self.W, self.H)
+        boxes = np.concatenate(all_boxes) * np.array([size[0] / w, size[1] / h] * 2, dtype=np.float32)
+        boxes += np.array([origin[0], origin[1]] * 2, dtype=np.float32)
+        return self.decoder.finish(boxes, np.concatenate(all_scores), np.concatenate(all_ids), self.classes)
+
+    def get_coordinates(self, outputs, size=None, transform=None):
+        if transform is None:
+            W, H = size if size is not None else (self.W, self.H)
+            transform = (np.array([W, H, W, H], dtype=np.float32), 0)
+        scale, offset = transform
+        return self.decoder(outputs, scale, offset, self.classes)
+
+    def draw_identified_objects(self, img, coordinates):
+        for coord in coordinates:
+            x, y, w, h = coord["x"], coord["y"], coord["w"], coord["h"]
+            color = self.colors[coord["class"] % len(self.colors)]
+
+            cv.rectangle(img, (x, y), (x+w, y+h), color, 2)
+            cv.putText(img, coord["class_name"], (x, y-10),
+                      cv.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        cv.imshow(f"Game Window - Press 'q' to quit", img)
+
+
+def preprocess_benchmark(size=(800, 600), channel_order="BGRA", frames=200, letterbox=False):
+    """Compare the old resize + blobFromImage path with BlobPreprocessor"""
+    channels = len(channel_order)
+    img = np.random.default_rng(0).integers(0, 255, (size[1], size[0], channels), dtype=np.uint8)
+    preprocess = BlobPreprocessor((416, 416), letterbox)
+
+    def legacy():
+        frame = cv.cvtColor(img, BGR_CONVERSIONS[channel_order]) if channel_order in BGR_CONVERSIONS else img
+        return cv.dnn.blobFromImage(frame, 1/255.0, (416, 416), swapRB=True, crop=False)
+
+    for name, step in (("cvtColor + blobFromImage", legacy),
+                       ("BlobPreprocessor", lambda: preprocess(img, channel_order))):
+        step()
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(frames):
+            step()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<24} {elapsed / frames * 1000:6.2f} ms/frame | peak allocation {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark frame preprocessing")
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    parser.add_argument("--channel-order", default="BGRA", choices=sorted(CHANNEL_MAPS))
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--letterbox", action="store_true")
+    args = parser.parse_args()
+
+    preprocess_benchmark(tuple(args.size), args.channel_order, args.frames, args.letterbox)